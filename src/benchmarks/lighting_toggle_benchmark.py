@@ -0,0 +1,80 @@
+"""
+Measures the latency of the lighting and indicator toggles.
+
+Each toggle is timed on its own and together with the frame that follows it,
+since state changes can also cost time in Cull. Run from the ``src`` directory:
+
+    python -m benchmarks.lighting_toggle_benchmark --iterations 200
+"""
+
+import argparse
+import statistics
+import sys
+import time
+
+
+def _time_toggle(engine, toggle, iterations, with_frame):
+    timings = []
+    for _iteration in range(iterations):
+        start = time.perf_counter()
+        toggle()
+        if with_frame:
+            engine.taskMgr.step()
+        timings.append((time.perf_counter() - start) * 1000)
+    return sorted(timings)
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    from direct.showbase.ShowBaseGlobal import globalClock
+    from panda3d.core import ClockObject
+    from PySide6.QtWidgets import QApplication
+
+    from engine.core.engine_base import EngineBase
+
+    app = QApplication(sys.argv)  # noqa: F841
+    engine = EngineBase(fps_cap=1000)
+    globalClock.setMode(ClockObject.MNormal)
+    engine.update_window_size(1280, 720)
+    lighting_system = engine.lighting_system
+
+    state = {"lighting": True, "indicators": True}
+
+    def toggle_lighting():
+        state["lighting"] = not state["lighting"]
+        if state["lighting"]:
+            lighting_system.enable_lighting()
+        else:
+            lighting_system.disable_lighting()
+
+    def toggle_indicators():
+        state["indicators"] = not state["indicators"]
+        if state["indicators"]:
+            lighting_system.enable_indicators()
+        else:
+            lighting_system.disable_indicators()
+
+    for _frame in range(10):
+        engine.taskMgr.step()
+
+    print(f"{'toggle':<22} {'mean ms':>9} {'p95 ms':>9} {'max ms':>9}")
+    for name, toggle in [
+        ("lighting", toggle_lighting),
+        ("indicators", toggle_indicators),
+    ]:
+        for with_frame in (False, True):
+            timings = _time_toggle(engine, toggle, args.iterations, with_frame)
+            label = f"{name} + frame" if with_frame else name
+            print(
+                f"{label:<22} {statistics.fmean(timings):>9.3f} "
+                f"{timings[int(len(timings) * 0.95) - 1]:>9.3f} {timings[-1]:>9.3f}"
+            )
+
+    engine.graphicsEngine.syncFrame()
+
+
+if __name__ == "__main__":
+    _main()
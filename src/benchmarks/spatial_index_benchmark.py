@@ -0,0 +1,129 @@
+"""
+Measures spatial index query times against a linear scan, by object count.
+
+Objects are random boxes in a cube. Box, view frustum and ray queries go
+through the BVH and through a vectorized test of every box; updates move 1% of
+the objects and include the refit before the next query. Run from the ``src``
+directory:
+
+    python -m benchmarks.spatial_index_benchmark --counts 1000 10000 100000
+"""
+
+import argparse
+import statistics
+import time
+
+import numpy as np
+
+WORLD_SIZE = 1000.0
+MAX_OBJECT_SIZE = 10.0
+
+
+def _median_ms(function, iterations):
+    timings = []
+    for _iteration in range(iterations):
+        start = time.perf_counter()
+        function()
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings)
+
+
+def _frustum_planes():
+    from panda3d.core import Mat4, PerspectiveLens
+
+    lens = PerspectiveLens()
+    lens.setFov(60)
+    lens.setNearFar(1, WORLD_SIZE / 2)
+    frustum = lens.makeBounds()
+    frustum.xform(Mat4.translateMat(WORLD_SIZE / 2, 0, WORLD_SIZE / 2))
+    return np.array([list(frustum.getPlane(index)) for index in range(6)])
+
+
+def _scan_box(lows, highs, low, high):
+    return np.flatnonzero(np.all((lows <= high) & (highs >= low), axis=1))
+
+
+def _scan_planes(lows, highs, planes):
+    normals, offsets = planes[:, :3], planes[:, 3]
+    inside = np.ones(len(lows), dtype=bool)
+    for normal, offset in zip(normals, offsets):
+        nearest = np.where(normal > 0, lows, highs)
+        inside &= nearest @ normal + offset <= 0
+    return np.flatnonzero(inside)
+
+
+def _scan_ray(lows, highs, origin, direction):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        first = (lows - origin) / direction
+        second = (highs - origin) / direction
+    near = np.maximum(np.nan_to_num(np.minimum(first, second), nan=-np.inf).max(1), 0)
+    far = np.nan_to_num(np.maximum(first, second), nan=np.inf).min(axis=1)
+    hits = np.flatnonzero(near <= far)
+    return hits[np.argsort(near[hits])]
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--counts", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    from engine.utils.bvh import BoundingVolumeHierarchy
+
+    rng = np.random.default_rng(0)
+    planes = _frustum_planes()
+    box_low, box_high = np.full(3, 450.0), np.full(3, 550.0)
+    origin, direction = np.zeros(3), np.array([1.0, 0.8, 0.6])
+
+    print(
+        f"{'objects':>8} {'query':<8} {'results':>8} "
+        f"{'BVH ms':>9} {'scan ms':>9} {'speedup':>8}"
+    )
+    for count in args.counts:
+        lows = rng.uniform(0, WORLD_SIZE, (count, 3))
+        highs = lows + rng.uniform(0.1, MAX_OBJECT_SIZE, (count, 3))
+        bvh = BoundingVolumeHierarchy()
+
+        build_ms = _median_ms(lambda: bvh.build(lows, highs), 3)
+        print(f"{count:>8} {'build':<8} {'':>8} {build_ms:>9.3f}")
+
+        queries = [
+            (
+                "box",
+                lambda: bvh.query_box(box_low, box_high),
+                lambda: _scan_box(lows, highs, box_low, box_high),
+            ),
+            (
+                "frustum",
+                lambda: bvh.query_planes(planes),
+                lambda: _scan_planes(lows, highs, planes),
+            ),
+            (
+                "ray",
+                lambda: bvh.query_ray(origin, direction)[0],
+                lambda: _scan_ray(lows, highs, origin, direction),
+            ),
+        ]
+        for name, query, scan in queries:
+            results = len(query())
+            assert results == len(scan()), name
+            bvh_ms = _median_ms(query, args.iterations)
+            scan_ms = _median_ms(scan, args.iterations)
+            print(
+                f"{count:>8} {name:<8} {results:>8} "
+                f"{bvh_ms:>9.3f} {scan_ms:>9.3f} {scan_ms / bvh_ms:>7.1f}x"
+            )
+
+        moved = rng.choice(count, max(1, count // 100), replace=False)
+
+        def move_and_query():
+            offsets = rng.uniform(-1, 1, (len(moved), 3))
+            bvh.update(moved, lows[moved] + offsets, highs[moved] + offsets)
+            bvh.query_box(box_low, box_high)
+
+        update_ms = _median_ms(move_and_query, args.iterations)
+        print(f"{count:>8} {'update':<8} {len(moved):>8} {update_ms:>9.3f}")
+
+
+if __name__ == "__main__":
+    _main()
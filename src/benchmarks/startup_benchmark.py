@@ -0,0 +1,86 @@
+"""
+Measures engine startup with loose resources against mounted asset packs.
+
+Every start runs in a fresh process, from importing the engine to the first
+rendered frame, alternating between both setups. The packs are built into a
+temporary directory first. Run from the ``src`` directory:
+
+    python -m benchmarks.startup_benchmark --runs 10
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+SETUPS = ("loose", "packed")
+
+
+def _run_startup(setup, packs_dir):
+    start = time.perf_counter()
+    from PySide6.QtWidgets import QApplication
+
+    from engine.core.engine_base import EngineBase
+    from engine.utils.asset_packs import mount_asset_packs
+
+    imported = time.perf_counter()
+    app = QApplication(sys.argv)  # noqa: F841
+    if setup == "packed":
+        mount_asset_packs(packs_dir)
+    engine = EngineBase(use_asset_packs=False)
+    constructed = time.perf_counter()
+    engine.taskMgr.step()
+    engine.graphicsEngine.syncFrame()
+    first_frame = time.perf_counter()
+    return {
+        "import_ms": (imported - start) * 1000,
+        "engine_ms": (constructed - imported) * 1000,
+        "first_frame_ms": (first_frame - constructed) * 1000,
+        "total_ms": (first_frame - start) * 1000,
+    }
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--setup", choices=SETUPS)
+    parser.add_argument("--packs-dir")
+    args = parser.parse_args()
+
+    if args.setup:
+        print(json.dumps(_run_startup(args.setup, args.packs_dir)))
+        return
+
+    from engine.utils.asset_packs import build_resources_pack
+
+    results = {setup: [] for setup in SETUPS}
+    with tempfile.TemporaryDirectory() as packs_dir:
+        build_resources_pack(packs_dir)
+        for _run in range(args.runs):
+            for setup in SETUPS:
+                output = subprocess.run(
+                    [sys.executable, "-m", "benchmarks.startup_benchmark"]
+                    + ["--setup", setup, "--packs-dir", packs_dir],
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+                results[setup].append(json.loads(output.strip().splitlines()[-1]))
+
+    print(
+        f"{'setup':<8} {'import ms':>10} {'engine ms':>10} "
+        f"{'frame ms':>10} {'total ms':>10}"
+    )
+    for setup, runs in results.items():
+        medians = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+        print(
+            f"{setup:<8} {medians['import_ms']:>10.1f} {medians['engine_ms']:>10.1f} "
+            f"{medians['first_frame_ms']:>10.1f} {medians['total_ms']:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,116 @@
+"""
+Compares frame times of the supported threading models on a heavy scene.
+
+Every model runs in its own process, since the threading model is fixed once
+the engine's output has been created. Run from the ``src`` directory:
+
+    python -m benchmarks.threading_benchmark --objects 400 --frames 300
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+
+from engine.core.engine_base import THREADING_MODELS
+
+
+def _build_heavy_scene(engine, objects):
+    """Fill the scene with many independent copies to load Cull and Draw."""
+    model = engine.loader.loadModel("models/panda")
+    side = max(1, round(objects**0.5))
+    for index in range(objects):
+        instance = model.copyTo(engine.scene_manager.scene_objects)
+        instance.setScale(0.05)
+        instance.setPos((index % side - side / 2) * 1.5, (index // side) * 1.5, 0)
+
+
+def _simulate_app_work(milliseconds):
+    """Busy-wait to stand in for per-frame Python work on the App thread."""
+    deadline = time.perf_counter() + milliseconds / 1000
+    while time.perf_counter() < deadline:
+        pass
+
+
+def _run_model(threading_model, objects, frames, warmup, app_work):
+    from direct.showbase.ShowBaseGlobal import globalClock
+    from panda3d.core import ClockObject
+    from PySide6.QtWidgets import QApplication
+
+    from engine.core.engine_base import EngineBase
+
+    app = QApplication(sys.argv)  # noqa: F841
+    engine = EngineBase(fps_cap=1000, threading_model=threading_model)
+    globalClock.setMode(ClockObject.MNormal)
+    engine.update_window_size(1280, 720)
+    engine.camera_controller.update_rotation_speed(30)
+    engine.camera_controller.start_rotation()
+    _build_heavy_scene(engine, objects)
+
+    frame_times = []
+    for frame in range(warmup + frames):
+        start = time.perf_counter()
+        _simulate_app_work(app_work)
+        engine.taskMgr.step()
+        engine.screen_texture.getRamImage()
+        if frame >= warmup:
+            frame_times.append((time.perf_counter() - start) * 1000)
+
+    engine.graphicsEngine.syncFrame()
+    return frame_times
+
+
+def _summarize(threading_model, frame_times):
+    frame_times = sorted(frame_times)
+    mean = statistics.fmean(frame_times)
+    return {
+        "model": threading_model,
+        "mean_ms": mean,
+        "p95_ms": frame_times[int(len(frame_times) * 0.95) - 1],
+        "fps": 1000 / mean,
+    }
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--objects", type=int, default=400)
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument(
+        "--app-work",
+        type=float,
+        default=4.0,
+        help="Milliseconds of simulated Python work per frame",
+    )
+    parser.add_argument("--model", choices=list(THREADING_MODELS))
+    args = parser.parse_args()
+
+    if args.model:
+        frame_times = _run_model(
+            args.model, args.objects, args.frames, args.warmup, args.app_work
+        )
+        print(json.dumps(_summarize(args.model, frame_times)))
+        return
+
+    print(f"{'model':<10} {'mean ms':>9} {'p95 ms':>9} {'fps':>8}")
+    for threading_model in THREADING_MODELS:
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.threading_benchmark"]
+            + ["--model", threading_model]
+            + ["--objects", str(args.objects), "--frames", str(args.frames)]
+            + ["--warmup", str(args.warmup), "--app-work", str(args.app_work)],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(
+            f"{result['model']:<10} {result['mean_ms']:>9.2f} "
+            f"{result['p95_ms']:>9.2f} {result['fps']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    _main()
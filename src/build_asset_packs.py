@@ -0,0 +1,46 @@
+"""
+Bundles the resources, and optionally asset libraries, into asset packs that
+the engine mounts at startup. Run again after changing any packed asset:
+
+    python build_asset_packs.py --library path/to/library
+"""
+
+import argparse
+import logging
+import os
+
+from engine.utils.asset_packs import PACKS_DIR, build_pack, build_resources_pack
+
+
+def _main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--library",
+        nargs="+",
+        default=[],
+        metavar="DIR",
+        help="Asset library directories to pack, each mounted as /assets/<name>",
+    )
+    parser.add_argument("--packs-dir", default=PACKS_DIR)
+    parser.add_argument(
+        "--no-texture-compression",
+        action="store_true",
+        help="Store textures uncompressed, for drivers without DXT support",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+    compress_textures = not args.no_texture_compression
+
+    build_resources_pack(args.packs_dir, compress_textures)
+    for library_dir in args.library:
+        name = os.path.basename(os.path.normpath(library_dir))
+        build_pack(
+            library_dir,
+            os.path.join(args.packs_dir, f"{name}.mf"),
+            compress_textures,
+        )
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,200 @@
+import logging
+
+from direct.actor.Actor import Actor
+from panda3d.core import Point3
+
+logger = logging.getLogger(__name__)
+
+# Closer than this the actors animate every frame; at the far distance only
+# every ``delay`` seconds, and less often beyond it.
+DEFAULT_ANIMATION_LOD = {"near": 20.0, "far": 120.0, "delay": 0.25}
+DEFAULT_CROSSFADE_TIME = 0.3
+
+
+def _control_effect(actor, animation):
+    # -1 for an animation that isn't part of the blend.
+    effect = actor.getPartBundle("modelRoot").getControlEffect(
+        actor.getAnimControl(animation)
+    )
+    return max(effect, 0.0)
+
+
+class _Crossfade:
+    def __init__(self, actor, from_animations, to_animation, duration):
+        self.actor = actor
+        self.from_weights = {
+            name: _control_effect(actor, name) for name in from_animations
+        }
+        self.to_animation = to_animation
+        self.to_weight = _control_effect(actor, to_animation)
+        self.duration = duration
+        self.elapsed = 0.0
+
+
+class ActorManager:
+    """
+    Animated characters, skinned on the GPU when the GSG can run the shader
+    generator's skinning shaders and on the CPU otherwise.
+
+    Poses are evaluated by Panda3D in C++ during culling, so actors outside
+    the view are not evaluated at all, and with animation LOD distant actors
+    are evaluated at a lower rate. Python does no per-actor work per frame
+    except for actors that are crossfading, which one task advances together.
+    """
+
+    def __init__(self, engine, parent):
+        self.engine = engine
+        self.root = parent
+        self.actors = []
+        self.animation_lod = dict(DEFAULT_ANIMATION_LOD)
+        self._crossfades = []
+
+        self.engine.taskMgr.add(self._crossfade_task, "_actor_crossfade", sort=45)
+
+    @property
+    def hardware_skinning(self):
+        gsg = self.engine.win.getGsg() if self.engine.win is not None else None
+        return gsg is not None and gsg.getSupportsBasicShaders()
+
+    def add_actor(self, model_path, animations, pos=(0, 0, 0), hpr=(0, 0, 0), scale=1):
+        """
+        Add a character with its animations, a dict of name to animation
+        path. The model comes through the model cache. Returns the Actor.
+        """
+        model = self.engine.model_cache.load_model(model_path)
+        actor = Actor(model, animations)
+        actor.reparentTo(self.root)
+        actor.setPosHprScale(pos, hpr, (scale, scale, scale))
+        # The shader generator skins on the GPU with hardware-animated-vertices;
+        # without shader support Panda3D skins on the CPU.
+        if self.hardware_skinning:
+            actor.setShaderAuto()
+        actor.enableBlend()
+        self._apply_animation_lod(actor)
+        self.actors.append(actor)
+        return actor
+
+    def remove_actor(self, actor):
+        self._crossfades = [
+            fade for fade in self._crossfades if fade.actor is not actor
+        ]
+        self.actors.remove(actor)
+        actor.cleanup()
+        actor.removeNode()
+
+    def clear(self):
+        for actor in list(self.actors):
+            self.remove_actor(actor)
+
+    def play(self, actor, animation, loop=True, rate=1.0):
+        """Play one animation at full weight, stopping the others."""
+        self._crossfades = [
+            fade for fade in self._crossfades if fade.actor is not actor
+        ]
+        actor.stop()
+        for name in actor.getAnimNames():
+            actor.setControlEffect(name, 1.0 if name == animation else 0.0)
+        actor.setPlayRate(rate, animation)
+        if loop:
+            actor.loop(animation)
+        else:
+            actor.play(animation)
+
+    def blend(self, actor, weights):
+        """Play several animations at once, weighted by a dict of name to weight."""
+        self._crossfades = [
+            fade for fade in self._crossfades if fade.actor is not actor
+        ]
+        for name in actor.getAnimNames():
+            weight = weights.get(name, 0.0)
+            actor.setControlEffect(name, weight)
+            if weight > 0 and not actor.getAnimControl(name).isPlaying():
+                actor.loop(name)
+
+    def crossfade(self, actor, animation, duration=DEFAULT_CROSSFADE_TIME):
+        """
+        Fade from whatever the actor plays to looping ``animation``, starting
+        from its current weight. A duration of 0 switches right away.
+        """
+        if duration <= 0:
+            self.play(actor, animation)
+            return
+        self._crossfades = [
+            fade for fade in self._crossfades if fade.actor is not actor
+        ]
+        playing = [
+            name
+            for name in actor.getAnimNames()
+            if name != animation and _control_effect(actor, name) > 0
+        ]
+        if not actor.getAnimControl(animation).isPlaying():
+            actor.setControlEffect(animation, 0.0)
+            actor.loop(animation)
+        self._crossfades.append(_Crossfade(actor, playing, animation, duration))
+
+    def _crossfade_task(self, task):
+        if not self._crossfades:
+            return task.cont
+
+        dt = self.engine.clock.getDt()
+        active = []
+        for fade in self._crossfades:
+            fade.elapsed += dt
+            progress = min(fade.elapsed / fade.duration, 1.0)
+            for name, weight in fade.from_weights.items():
+                fade.actor.setControlEffect(name, weight * (1 - progress))
+            fade.actor.setControlEffect(
+                fade.to_animation,
+                fade.to_weight + (1 - fade.to_weight) * progress,
+            )
+            if progress < 1.0:
+                active.append(fade)
+            else:
+                for name in fade.from_weights:
+                    fade.actor.stop(name)
+        self._crossfades = active
+        return task.cont
+
+    def set_animation_lod(self, near, far, delay):
+        """
+        Animate actors closer than ``near`` every frame, at ``far`` every
+        ``delay`` seconds, and in between at a linearly interpolated rate.
+        """
+        self.animation_lod = {"near": near, "far": far, "delay": delay}
+        for actor in self.actors:
+            self._apply_animation_lod(actor)
+
+    def clear_animation_lod(self):
+        self.animation_lod = None
+        for actor in self.actors:
+            for character in actor.findAllMatches("**/+Character"):
+                character.node().clearLodAnimation()
+
+    def _apply_animation_lod(self, actor):
+        if self.animation_lod is None:
+            return
+        for character in actor.findAllMatches("**/+Character"):
+            character.node().setLodAnimation(
+                Point3(0, 0, 0),
+                self.animation_lod["far"],
+                self.animation_lod["near"],
+                self.animation_lod["delay"],
+            )
+
+    @staticmethod
+    def _is_playing(actor):
+        return any(
+            actor.getAnimControl(name).isPlaying() for name in actor.getAnimNames()
+        )
+
+    def is_animating(self):
+        return any(self._is_playing(actor) for actor in self.actors)
+
+    def get_statistics(self):
+        return {
+            "actors": len(self.actors),
+            "animating": sum(1 for actor in self.actors if self._is_playing(actor)),
+            "crossfading": len(self._crossfades),
+            "hardware_skinning": self.hardware_skinning,
+            "animation_lod": self.animation_lod,
+        }
@@ -0,0 +1,129 @@
+import logging
+import os
+
+from panda3d.core import Filename
+from PySide6.QtCore import QFileSystemWatcher, QTimer, Slot
+
+logger = logging.getLogger(__name__)
+
+# Set on every scene object to the path it was loaded from.
+MODEL_PATH_TAG = "model_path"
+# Editors write a file in several steps, wait for them to settle.
+RELOAD_DELAY = 200
+
+
+def _os_path(fullpath):
+    """
+    The real file behind a resolved Panda3D path, or None for files that are
+    not on disk, such as ones in a mounted asset pack.
+    """
+    path = Filename(fullpath).toOsSpecific()
+    # The virtual file system reads "model.egg" from "model.egg.pz" as well.
+    for candidate in (path, f"{path}.pz"):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+class AssetWatcher:
+    """
+    Watches the files of the loaded scene models and their textures, and the
+    directories holding them. A changed texture is reloaded in place, which
+    updates every user of it; a changed model is reloaded by the scene
+    manager for the objects loaded from it only.
+    """
+
+    def __init__(self, engine, scene_manager):
+        self.engine = engine
+        self.scene_manager = scene_manager
+        self.reloads = 0
+
+        # Path on disk -> model path as loaded, or the texture.
+        self._models = {}
+        self._textures = {}
+        self._signatures = {}
+
+        self._watcher = QFileSystemWatcher()
+        self._watcher.fileChanged.connect(self._schedule_check)
+        self._watcher.directoryChanged.connect(self._schedule_check)
+        self._check_timer = QTimer()
+        self._check_timer.setSingleShot(True)
+        self._check_timer.setInterval(RELOAD_DELAY)
+        self._check_timer.timeout.connect(self._check_changes)
+
+    def watch(self, scene_objects):
+        """Watch the files the given scene objects were loaded from."""
+        models, textures = {}, {}
+        for scene_object in scene_objects:
+            model_path = scene_object.getTag(MODEL_PATH_TAG)
+            if model_path:
+                fullpath = self.engine.model_cache.make_key(model_path)[0]
+                path = _os_path(fullpath)
+                if path is not None:
+                    models[path] = model_path
+            for texture in scene_object.findAllTextures():
+                source_path = self.engine.texture_manager.get_source_path(texture)
+                path = _os_path(source_path)
+                if path is not None:
+                    textures[path] = texture
+
+        self._models, self._textures = models, textures
+        self._signatures = {path: _file_signature(path) for path in self._paths()}
+
+        watched = self._watcher.files() + self._watcher.directories()
+        if watched:
+            self._watcher.removePaths(watched)
+        directories = {os.path.dirname(path) for path in self._signatures}
+        if self._signatures:
+            self._watcher.addPaths(list(self._signatures) + sorted(directories))
+        logger.debug(
+            "Watching %i models and %i textures in %i directories.",
+            len(models),
+            len(textures),
+            len(directories),
+        )
+
+    def get_model_signatures(self):
+        """Model path -> modification time and size of each watched model file."""
+        return {
+            model_path: list(self._signatures[path])
+            for path, model_path in self._models.items()
+            if self._signatures[path] is not None
+        }
+
+    def _paths(self):
+        return list(self._models) + list(self._textures)
+
+    @Slot(str)
+    def _schedule_check(self, _path):
+        self._check_timer.start()
+
+    @Slot()
+    def _check_changes(self):
+        """
+        Compare the watched files with what was loaded. Saving through a
+        temporary file replaces the watched file, so its path is added again.
+        """
+        watched_files = set(self._watcher.files())
+        for path in self._paths():
+            signature = _file_signature(path)
+            if signature is None or signature == self._signatures[path]:
+                continue
+            self._signatures[path] = signature
+            if path not in watched_files:
+                self._watcher.addPath(path)
+
+            if path in self._textures:
+                self.engine.texture_manager.reload_texture(self._textures[path])
+                logger.info("Texture reloaded: %s", path)
+            else:
+                self.scene_manager.reload_model(self._models[path])
+            self.reloads += 1
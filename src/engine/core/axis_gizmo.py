@@ -0,0 +1,138 @@
+import logging
+
+from panda3d.core import (
+    Camera,
+    CardMaker,
+    ColorBlendAttrib,
+    FrameBufferProperties,
+    GraphicsOutput,
+    GraphicsPipe,
+    NodePath,
+    OrthographicLens,
+    Texture,
+    TransparencyAttrib,
+    WindowProperties,
+)
+
+logger = logging.getLogger(__name__)
+
+GIZMO_SIZE = 128
+# Half the width of the view around the indicator, whose markers reach out to
+# about 1.2 of its units.
+VIEW_RADIUS = 1.25
+# Where the gizmo sits in aspect2d, and the size of one indicator unit there.
+GIZMO_POSITION = (1.1, 0, 0.8)
+GIZMO_SCALE = 0.125
+
+
+class AxisGizmo:
+    """
+    Shows the axis indicator in a corner of the viewport, turned with the
+    camera gimbal. The indicator is rendered into a small texture in its own
+    offscreen buffer, again only when the gimbal has turned, so on other
+    frames the overlay costs one textured quad. Without offscreen buffers it
+    is drawn in ``aspect2d`` every frame.
+    """
+
+    def __init__(self, engine, axis_indicator, size=GIZMO_SIZE):
+        self.engine = engine
+        self.axis_indicator = axis_indicator
+        self.size = size
+        self.renders = 0
+        self._quat = None
+
+        self._buffer = self._make_buffer()
+        if self._buffer is None:
+            logger.warning("No offscreen buffer for the axis gizmo, drawn directly.")
+            self.overlay = self.engine.aspect2d.attachNewNode("axis_gizmo")
+            self.axis_indicator.reparentTo(self.overlay)
+        else:
+            self.overlay = self._setup_scene()
+        self.overlay.setPos(GIZMO_POSITION)
+        self.overlay.setScale(GIZMO_SCALE)
+
+        # After the camera rotation task, which has the same sort.
+        self.engine.taskMgr.add(
+            self._update_task, "_axis_gizmo_update", sort=49, priority=-1
+        )
+
+    def _make_buffer(self):
+        fb_props = FrameBufferProperties()
+        fb_props.setRgbColor(True)
+        fb_props.setRgbaBits(8, 8, 8, 8)
+        fb_props.setDepthBits(16)
+
+        return self.engine.graphicsEngine.makeOutput(
+            self.engine.pipe,
+            "axis_gizmo_buffer",
+            -30,
+            fb_props,
+            WindowProperties.size(self.size, self.size),
+            GraphicsPipe.BFRefuseWindow,
+            self.engine.win.getGsg(),
+            self.engine.win,
+        )
+
+    def _setup_scene(self):
+        texture = Texture("axis_gizmo")
+        self._buffer.addRenderTexture(
+            texture, GraphicsOutput.RTM_bind_or_copy, GraphicsOutput.RTP_color
+        )
+        self._buffer.setClearColor((0, 0, 0, 0))
+        # The engine renders inverted, so frames read back come out top down
+        # for Qt. This texture is drawn on a card, which expects it upright.
+        self._buffer.setInverted(False)
+        self._buffer.setOneShot(True)
+
+        root = NodePath("axis_gizmo_scene")
+        # Blended into the cleared buffer, the colors come out premultiplied
+        # by the coverage the alpha channel accumulates.
+        root.setAttrib(
+            ColorBlendAttrib.make(
+                ColorBlendAttrib.M_add,
+                ColorBlendAttrib.O_incoming_alpha,
+                ColorBlendAttrib.O_one_minus_incoming_alpha,
+                ColorBlendAttrib.M_add,
+                ColorBlendAttrib.O_one,
+                ColorBlendAttrib.O_one_minus_incoming_alpha,
+            )
+        )
+        self.axis_indicator.reparentTo(root)
+
+        lens = OrthographicLens()
+        lens.setFilmSize(VIEW_RADIUS * 2)
+        lens.setNearFar(1, 20)
+        camera = root.attachNewNode(Camera("axis_gizmo_camera", lens))
+        camera.setY(-10)
+        display_region = self._buffer.makeDisplayRegion()
+        display_region.setCamera(camera)
+
+        card_maker = CardMaker("axis_gizmo")
+        card_maker.setFrame(-VIEW_RADIUS, VIEW_RADIUS, -VIEW_RADIUS, VIEW_RADIUS)
+        overlay = self.engine.aspect2d.attachNewNode(card_maker.generate())
+        overlay.setTexture(texture)
+        overlay.setTransparency(TransparencyAttrib.MPremultipliedAlpha)
+        return overlay
+
+    def _update_task(self, task):
+        if self.overlay.isHidden():
+            # Rendered again once shown.
+            self._quat = None
+            return task.cont
+
+        # The indicator turns with the gimbal, as if viewed by the camera.
+        quat = self.engine.camera_controller.gimbal.getQuat(self.engine.render)
+        if self._quat is not None and quat.almostEqual(self._quat):
+            return task.cont
+        self._quat = quat
+        self.axis_indicator.setQuat(quat)
+        if self._buffer is not None:
+            self._buffer.setOneShot(True)
+            self.renders += 1
+        return task.cont
+
+    def show(self):
+        self.overlay.show()
+
+    def hide(self):
+        self.overlay.hide()
@@ -0,0 +1,80 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = 2
+
+
+class _Job:
+    """A function running on a worker thread, delivered to its callback once."""
+
+    def __init__(self, future, callback, args):
+        self.future = future
+        self.callback = callback
+        self.args = args
+        self._done = False
+
+    def deliver(self):
+        self._done = True
+        if self.callback is not None:
+            self.callback(self.future, *self.args)
+
+    def done(self):
+        return self._done
+
+    def cancel(self):
+        """Drop the result; the function still completes if it has started."""
+        self.future.cancel()
+        self._done = True
+
+
+class BackgroundWorker:
+    """
+    Runs blocking work, such as processing meshes or reading whole files, on
+    worker threads so the main thread keeps rendering. The functions must
+    not touch the scene graph or Qt objects. Each finished job's callback is
+    called on the main thread, by a task, with its future, whose ``result()``
+    returns the value or raises the error of the function.
+    """
+
+    def __init__(self, engine, max_workers=DEFAULT_MAX_WORKERS):
+        self.engine = engine
+        self._executor = ThreadPoolExecutor(
+            max_workers, thread_name_prefix="background_worker"
+        )
+        self._jobs = []
+
+    def submit(self, function, *args, callback=None, extraArgs=[]):
+        """
+        Run ``function(*args)`` on a worker thread. ``callback`` gets the
+        future followed by ``extraArgs``. Returns a job that supports
+        ``done()`` and ``cancel()``, like a loader request.
+        """
+        job = _Job(self._executor.submit(function, *args), callback, list(extraArgs))
+        self._jobs.append(job)
+        if not self.engine.taskMgr.hasTaskNamed("_background_worker_deliver"):
+            self.engine.taskMgr.add(
+                self._deliver_task, "_background_worker_deliver", sort=46
+            )
+        return job
+
+    def _deliver_task(self, task):
+        finished = [job for job in self._jobs if job.done() or job.future.done()]
+        if finished:
+            self._jobs = [job for job in self._jobs if job not in finished]
+            for job in finished:
+                if job.done():
+                    continue
+                try:
+                    job.deliver()
+                except Exception:  # One bad callback mustn't drop the others
+                    logger.exception("Background job callback failed.")
+        return task.cont if self._jobs else task.done
+
+    def shutdown(self):
+        """Drop the jobs that haven't started, without waiting for the others."""
+        for job in self._jobs:
+            job.cancel()
+        self._jobs.clear()
+        self._executor.shutdown(wait=False, cancel_futures=True)
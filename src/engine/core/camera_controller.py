@@ -133,6 +133,31 @@ class CameraController:
             self.camera.setHpr(h, p, r)
         logger.debug("Camera orientation set to: H=%i, P=%i, R=%i", h, p, r)
 
+    def set_pose(self, position=None, orientation=None):
+        """Set the camera's position and orientation in one call."""
+        if position is not None:
+            self.set_position(*position)
+        if orientation is not None:
+            self.set_orientation(*orientation)
+
+    def get_state(self):
+        """The mode, pose and field of view, as plain values for saving."""
+        return {
+            "mode": self.mode.name,
+            "gimbal_hpr": list(self.gimbal.getHpr()),
+            "position": list(self.camera.getPos()),
+            "orientation": list(self.camera.getHpr()),
+            "fov": self.camera.node().getLens().getFov()[0],
+        }
+
+    def set_state(self, state):
+        """Restore a state returned by ``get_state``."""
+        self.set_mode(CameraMode[state["mode"]])
+        self.gimbal.setHpr(*state["gimbal_hpr"])
+        self.camera.setPos(*state["position"])
+        self.camera.setHpr(*state["orientation"])
+        self.update_fov(state["fov"])
+
     def get_orientation(self):
         """Get the camera's current orientation (heading, pitch, roll)."""
         if self.mode == CameraMode.ORBIT:
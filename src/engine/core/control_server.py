@@ -0,0 +1,441 @@
+"""
+Local JSON-RPC 2.0 control server for scripting the engine.
+
+Requests are newline-delimited JSON objects, or arrays of them for batches.
+Every request received is queued and applied in one go right before the next
+frame renders, so a batch can set a full camera pose and capture it without
+intermediate frames.
+
+Batches are applied all or nothing as far as the camera goes. If a call
+fails, the camera is put back the way it was before the batch, the rest of
+the batch is skipped and its captures are not taken. Those calls, and the
+earlier camera calls that were undone, answer with a BATCH_ABORTED error
+naming the failed request. Other calls that succeeded before the failure,
+such as loading objects, stay applied and keep their results.
+"""
+
+import json
+import logging
+from functools import partial
+
+from panda3d.core import LVecBase3f
+from PySide6.QtCore import Slot
+from PySide6.QtGui import QImage
+from PySide6.QtNetwork import QAbstractSocket, QLocalServer, QLocalSocket
+
+from .camera_controller import CameraMode
+from .engine_base import PIPELINE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SERVER_NAME = "pandaqt-control"
+SERVER_PROBE_TIMEOUT_MS = 500
+
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+BATCH_ABORTED = -32000
+
+# Public method name -> (engine attribute, method name)
+METHODS = {
+    "camera.set_position": ("camera_controller", "set_position"),
+    "camera.set_orientation": ("camera_controller", "set_orientation"),
+    "camera.set_pose": ("camera_controller", "set_pose"),
+    "camera.get_position": ("camera_controller", "get_position"),
+    "camera.get_orientation": ("camera_controller", "get_orientation"),
+    "camera.set_mode": ("camera_controller", "set_mode"),
+    "camera.update_fov": ("camera_controller", "update_fov"),
+    "camera.update_rotation_speed": ("camera_controller", "update_rotation_speed"),
+    "camera.start_rotation": ("camera_controller", "start_rotation"),
+    "camera.stop_rotation": ("camera_controller", "stop_rotation"),
+    "scene.load_objects": ("scene_manager", "load_objects"),
+    "scene.unload_objects": ("scene_manager", "unload_objects"),
+    "scene.clear": ("scene_manager", "clear_scene"),
+    "scene.optimize": ("scene_manager", "optimize_scene"),
+    "scene.restore": ("scene_manager", "restore_scene"),
+    "scene.get_statistics": ("scene_manager", "get_scene_statistics"),
+    "scene.set_coarse_culling": ("scene_manager", "set_coarse_culling"),
+    "scene.get_spatial_index_statistics": (
+        "scene_manager",
+        "get_spatial_index_statistics",
+    ),
+    "scene.set_animation_lod": ("scene_manager", "set_animation_lod"),
+    "scene.get_actor_statistics": ("scene_manager", "get_actor_statistics"),
+    "scene.save_snapshot": ("scene_manager", "save_snapshot"),
+    "scene.show_grid": ("scene_manager", "show_grid"),
+    "scene.hide_grid": ("scene_manager", "hide_grid"),
+    "scene.is_grid_visible": ("scene_manager", "is_grid_visible"),
+    "scene.show_axis_indicator": ("scene_manager", "show_axis_indicator"),
+    "scene.hide_axis_indicator": ("scene_manager", "hide_axis_indicator"),
+    "lighting.enable_lighting": ("lighting_system", "enable_lighting"),
+    "lighting.disable_lighting": ("lighting_system", "disable_lighting"),
+    "lighting.enable_indicators": ("lighting_system", "enable_indicators"),
+    "lighting.disable_indicators": ("lighting_system", "disable_indicators"),
+    "lighting.get_light_statistics": ("lighting_system", "get_light_statistics"),
+    "lighting.set_shadow_map_size": ("lighting_system", "set_shadow_map_size"),
+    "lighting.get_shadow_statistics": ("lighting_system", "get_shadow_statistics"),
+    "profile.use_preview_profile": ("profile_manager", "use_preview_profile"),
+    "profile.use_export_profile": ("profile_manager", "use_export_profile"),
+    "profile.restore_profile": ("profile_manager", "restore_profile"),
+    "cache.stats": ("model_cache", "stats"),
+    "lod.set_bias": ("lod_manager", "set_lod_bias"),
+    "lod.get_bias": ("lod_manager", "get_lod_bias"),
+    "lod.get_statistics": ("lod_manager", "get_statistics"),
+    "textures.set_budget": ("texture_manager", "set_memory_budget"),
+    "textures.get_statistics": ("texture_manager", "get_statistics"),
+    "textures.get_report": ("texture_manager", "get_texture_report"),
+    "thumbnails.request": ("thumbnail_service", "request_thumbnail"),
+    "thumbnails.get_statistics": ("thumbnail_service", "get_statistics"),
+    "stream.get_statistics": ("geometry_streamer", "get_statistics"),
+    "selection.select_at": ("object_picker", "select_at"),
+    "selection.select_rect": ("object_picker", "select_rect"),
+    "selection.clear": ("object_picker", "clear_selection"),
+    "selection.get": ("object_picker", "get_selection_names"),
+    "engine.update_window_size": (None, "update_window_size"),
+}
+CAPTURE_METHOD = "capture.frame"
+# Methods that answer through a callback, once the next frame is read back.
+DEFERRED_METHODS = {"selection.select_at", "selection.select_rect"}
+
+
+class RpcError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+
+class _Batch:
+    """A set of requests received together and answered together."""
+
+    def __init__(self, socket, requests, is_batch):
+        self.socket = socket
+        self.requests = requests
+        self.is_batch = is_batch
+        self.responses = []
+        self.captures = []
+        self.target_frame = None
+        # Deferred calls still waiting for their callback.
+        self.deferred = set()
+        self.applied = False
+
+
+class ControlServer:
+    def __init__(self, engine, server_name=DEFAULT_SERVER_NAME):
+        self.engine = engine
+        self.server_name = server_name
+        self.pending_batches = []
+        self.capturing_batches = []
+        self._buffers = {}
+
+        self._setup_server()
+        self.engine.taskMgr.add(self._apply_batches_task, "_control_apply", sort=45)
+        self.engine.taskMgr.add(
+            self._complete_captures_task, "_control_captures", sort=55
+        )
+
+    def _setup_server(self):
+        self.server = QLocalServer()
+        listening = self.server.listen(self.server_name)
+        if (
+            not listening
+            and self.server.serverError()
+            == QAbstractSocket.SocketError.AddressInUseError
+            and not _server_answers(self.server_name)
+        ):
+            # Left behind by an instance that didn't shut down cleanly.
+            QLocalServer.removeServer(self.server_name)
+            listening = self.server.listen(self.server_name)
+        if not listening:
+            raise RuntimeError(
+                f"Control server could not listen on {self.server_name}: "
+                f"{self.server.errorString()}"
+            )
+        self.server.newConnection.connect(self._on_new_connection)
+        logger.info("Control server listening on %s", self.server.fullServerName())
+
+    @Slot()
+    def _on_new_connection(self):
+        while self.server.hasPendingConnections():
+            socket = self.server.nextPendingConnection()
+            self._buffers[socket] = b""
+            socket.readyRead.connect(lambda socket=socket: self._on_ready_read(socket))
+            socket.disconnected.connect(lambda socket=socket: self._drop(socket))
+            logger.debug("Control client connected.")
+
+    def _drop(self, socket):
+        self._buffers.pop(socket, None)
+        socket.deleteLater()
+        logger.debug("Control client disconnected.")
+
+    def _on_ready_read(self, socket):
+        self._buffers[socket] += socket.readAll().data()
+        *lines, self._buffers[socket] = self._buffers[socket].split(b"\n")
+        for line in lines:
+            if line.strip():
+                self._queue_message(socket, line)
+
+    def _queue_message(self, socket, line):
+        try:
+            message = json.loads(line)
+        except ValueError as error:
+            self._send(socket, _error_response(None, PARSE_ERROR, str(error)))
+            return
+
+        is_batch = isinstance(message, list)
+        requests = message if is_batch else [message]
+        if not requests:
+            self._send(socket, _error_response(None, INVALID_REQUEST, "Empty batch"))
+            return
+        self.pending_batches.append(_Batch(socket, requests, is_batch))
+
+    def _apply_batches_task(self, task):
+        """Runs before the frame is rendered, so no frame sees a partial batch."""
+        batches, self.pending_batches = self.pending_batches, []
+        for batch in batches:
+            try:
+                self._apply_batch(batch)
+            except Exception as error:  # No client input may stop the render loop
+                logger.exception("Control batch failed.")
+                self._send(
+                    batch.socket,
+                    _error_response(
+                        _first_id(batch.requests), INTERNAL_ERROR, repr(error)
+                    ),
+                )
+        return task.cont
+
+    def _apply_batch(self, batch):
+        try:
+            calls = [self._resolve(request) for request in batch.requests]
+        except RpcError as error:
+            # All or nothing: a batch with an invalid request applies nothing.
+            self._send(
+                batch.socket,
+                _error_response(_first_id(batch.requests), error.code, error.message),
+            )
+            return
+
+        camera_state = self._get_camera_state()
+        for index, (request_id, method, target, params) in enumerate(calls):
+            if method == CAPTURE_METHOD:
+                batch.captures.append((request_id, params))
+                continue
+            try:
+                if method in DEFERRED_METHODS:
+                    batch.deferred.add(index)
+                    callback = partial(
+                        self._on_deferred_result, batch, index, request_id
+                    )
+                    _invoke(target, params, callback=callback)
+                    continue
+                result = _to_json(_invoke(target, params))
+            except Exception as error:
+                batch.deferred.discard(index)
+                if isinstance(error, RpcError):
+                    code, message = error.code, error.message
+                else:  # Reported back to the client
+                    logger.exception("Control call %s failed.", method)
+                    code, message = INTERNAL_ERROR, repr(error)
+                self._abort_batch(batch, calls, index, camera_state)
+                if request_id is not None:
+                    batch.responses.append(_error_response(request_id, code, message))
+                break
+            if request_id is not None:
+                batch.responses.append(
+                    {"jsonrpc": "2.0", "id": request_id, "result": result}
+                )
+
+        if batch.captures:
+            batch.target_frame = (
+                self.engine.screen_texture.getImageModified().getSeq()
+                + PIPELINE_DEPTH[self.engine.threading_model]
+            )
+            self.capturing_batches.append(batch)
+        batch.applied = True
+        self._respond_when_done(batch)
+
+    def _on_deferred_result(self, batch, index, request_id, result):
+        batch.deferred.discard(index)
+        if request_id is not None:
+            batch.responses.append(
+                {"jsonrpc": "2.0", "id": request_id, "result": _to_json(result)}
+            )
+        self._respond_when_done(batch)
+
+    def _respond_when_done(self, batch):
+        if batch.applied and not batch.deferred and batch not in self.capturing_batches:
+            self._respond(batch)
+
+    def _get_camera_state(self):
+        camera_controller = self.engine.camera_controller
+        return (
+            camera_controller.get_state(),
+            camera_controller.rotation_paused,
+            camera_controller.rotation_speed,
+        )
+
+    def _set_camera_state(self, camera_state):
+        state, rotation_paused, rotation_speed = camera_state
+        camera_controller = self.engine.camera_controller
+        camera_controller.set_state(state)
+        camera_controller.update_rotation_speed(rotation_speed)
+        if rotation_paused:
+            camera_controller.stop_rotation()
+        else:
+            camera_controller.start_rotation()
+
+    def _abort_batch(self, batch, calls, failed, camera_state):
+        """Undo the batch's camera calls and answer for the calls that won't run."""
+        self._set_camera_state(camera_state)
+        failed_id = calls[failed][0]
+        message = f"Batch aborted: request {failed_id} failed"
+
+        undone = [
+            request_id
+            for request_id, method, _, _ in calls[:failed]
+            if method.startswith("camera.") or method == CAPTURE_METHOD
+        ]
+        skipped = [request_id for request_id, *_ in calls[failed + 1 :]]
+        batch.responses = [
+            response for response in batch.responses if response["id"] not in undone
+        ]
+        for request_id in undone + skipped:
+            if request_id is not None:
+                batch.responses.append(
+                    _error_response(request_id, BATCH_ABORTED, message)
+                )
+        batch.captures.clear()
+
+    def _resolve(self, request):
+        if not isinstance(request, dict) or request.get("jsonrpc") != "2.0":
+            raise RpcError(INVALID_REQUEST, "Not a JSON-RPC 2.0 request")
+
+        method = request.get("method")
+        params = request.get("params", {})
+        if not isinstance(params, (list, dict)):
+            raise RpcError(INVALID_PARAMS, "Params must be an array or an object")
+
+        if method == CAPTURE_METHOD:
+            if not isinstance(params, dict) or not isinstance(params.get("path"), str):
+                raise RpcError(INVALID_PARAMS, "capture.frame needs a 'path'")
+            return request.get("id"), method, None, params
+
+        if method not in METHODS:
+            raise RpcError(METHOD_NOT_FOUND, f"Unknown method: {method}")
+
+        attribute, name = METHODS[method]
+        owner = self.engine if attribute is None else getattr(self.engine, attribute)
+        if method == "camera.set_mode":
+            params = _convert_camera_mode(params)
+        return request.get("id"), method, getattr(owner, name), params
+
+    def _complete_captures_task(self, task):
+        """Runs after the frame is rendered and writes out pending captures."""
+        if not self.capturing_batches:
+            return task.cont
+
+        image_modified = self.engine.screen_texture.getImageModified().getSeq()
+        waiting = []
+        for batch in self.capturing_batches:
+            if image_modified < batch.target_frame:
+                waiting.append(batch)
+                continue
+            for request_id, params in batch.captures:
+                response = self._capture(request_id, params["path"])
+                if request_id is not None:
+                    batch.responses.append(response)
+        done = [batch for batch in self.capturing_batches if batch not in waiting]
+        self.capturing_batches = waiting
+        for batch in done:
+            self._respond_when_done(batch)
+        return task.cont
+
+    def _capture(self, request_id, path):
+        """Save the current frame, in the same layout the viewport receives."""
+        texture = self.engine.screen_texture
+        width, height = texture.getXSize(), texture.getYSize()
+        image_data = texture.getRamImage().getData()
+        if len(image_data) != width * height * 4:
+            return _error_response(request_id, INTERNAL_ERROR, "No frame available")
+
+        q_image = QImage(image_data, width, height, width * 4, QImage.Format_ARGB32)
+        if not q_image.save(path):
+            return _error_response(request_id, INTERNAL_ERROR, f"Cannot save {path}")
+
+        logger.info("Frame captured to %s", path)
+        result = {"path": path, "width": width, "height": height}
+        return {"jsonrpc": "2.0", "id": request_id, "result": result}
+
+    def _respond(self, batch):
+        if not batch.responses:
+            return
+        # Captures answer last; JSON-RPC matches batch replies by id, not order.
+        self._send(
+            batch.socket, batch.responses if batch.is_batch else batch.responses[0]
+        )
+
+    def _send(self, socket, payload):
+        if socket not in self._buffers:
+            return
+        socket.write(json.dumps(payload).encode() + b"\n")
+        socket.flush()
+
+    def close(self):
+        self.engine.taskMgr.remove("_control_apply")
+        self.engine.taskMgr.remove("_control_captures")
+        self.server.close()
+        logger.info("Control server closed.")
+
+
+def _invoke(target, params, **kwargs):
+    try:
+        if isinstance(params, dict):
+            return target(**params, **kwargs)
+        return target(*params, **kwargs)
+    except TypeError as error:
+        raise RpcError(INVALID_PARAMS, str(error)) from error
+
+
+def _server_answers(server_name):
+    socket = QLocalSocket()
+    socket.connectToServer(server_name)
+    answered = socket.waitForConnected(SERVER_PROBE_TIMEOUT_MS)
+    socket.abort()
+    return answered
+
+
+def _first_id(requests):
+    for request in requests:
+        if isinstance(request, dict) and "id" in request:
+            return request["id"]
+    return None
+
+
+def _convert_camera_mode(params):
+    if isinstance(params, dict) and "mode" in params:
+        mode = params["mode"]
+    elif isinstance(params, list) and params:
+        mode = params[0]
+    else:
+        raise RpcError(INVALID_PARAMS, "camera.set_mode needs a 'mode'")
+    try:
+        return [CameraMode[str(mode).upper()]]
+    except KeyError as error:
+        raise RpcError(INVALID_PARAMS, f"Unknown camera mode: {mode}") from error
+
+
+def _to_json(result):
+    if isinstance(result, LVecBase3f):
+        return list(result)
+    return result
+
+
+def _error_response(request_id, code, message):
+    return {
+        "jsonrpc": "2.0",
+        "id": request_id,
+        "error": {"code": code, "message": message},
+    }
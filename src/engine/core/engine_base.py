@@ -7,8 +7,10 @@ from panda3d.core import (
     FrameBufferProperties,
     GraphicsOutput,
     GraphicsPipe,
+    GraphicsThreadingModel,
     OrthographicLens,
     Texture,
+    Thread,
     WindowProperties,
     loadPrcFileData,
 )
@@ -16,16 +18,46 @@ from PySide6.QtCore import QObject, QTimer, Signal, Slot
 from PySide6.QtGui import QImage
 from PySide6.QtWidgets import QMessageBox
 
+from ..utils.asset_packs import mount_asset_packs
+from ..utils.tile_diff import compute_dirty_tiles
+from .background_worker import BackgroundWorker
 from .camera_controller import CameraController
+from .frame_recorder import DEFAULT_MAX_FRAMES, FrameRecorder
+from .geometry_streamer import GeometryStreamer
 from .lighting_system import LightingSystem
+from .lod_manager import LodManager
+from .model_cache import ModelCache
+from .object_picker import ObjectPicker
 from .profile_manager import ProfileManager
 from .scene_manager import SceneManager
+from .scene_snapshot import SceneSnapshot
+from .texture_manager import TextureManager
+from .thumbnail_service import ThumbnailService
 
 logger = logging.getLogger(__name__)
 
+# Maps the supported pipeline configurations to Panda3D threading models.
+# "single" runs App, Cull and Draw serially on the main thread, "draw" moves
+# Draw to its own thread and "cull-draw" runs App, Cull and Draw on three.
+THREADING_MODELS = {
+    "single": "",
+    "draw": "/Draw",
+    "cull-draw": "Cull/Draw",
+}
+# Frames the readback trails the App stage by, per threading model.
+PIPELINE_DEPTH = {"single": 1, "draw": 2, "cull-draw": 3}
+
 
 class EngineBaseNotifier(QObject):
+    """
+    Qt signals of the engine, always emitted from the main (App) thread.
+    The Cull and Draw threads never touch Qt objects.
+    """
+
     frame_captured = Signal(QImage)
+    # Same frame plus the (x, y, width, height) tiles that changed since the
+    # previous one, for consumers that only need to repaint or send those.
+    frame_updated = Signal(QImage, list)
     fps_updated = Signal(float)
 
     def __init__(self, engine):
@@ -34,10 +66,19 @@ class EngineBaseNotifier(QObject):
 
 
 class EngineBase(ShowBase):
-    def __init__(self, fps_cap=60, enable_hd_renderer=False):
+    def __init__(
+        self,
+        fps_cap=60,
+        enable_hd_renderer=False,
+        threading_model="single",
+        use_asset_packs=True,
+        snapshot_path=None,
+    ):
         super().__init__(windowType="none")
         loadPrcFileData("", "copy-texture-inverted 1")
         loadPrcFileData("", "framebuffer-srgb true")
+        # Skin actors in the shader generator's shaders rather than on the CPU.
+        loadPrcFileData("", "hardware-animated-vertices true")
 
         self.notifier = EngineBaseNotifier(self)
         self.previous_image_data = None
@@ -45,6 +86,8 @@ class EngineBase(ShowBase):
         self.pipe = None
         self.image_data = None
         self.capture_timer = None
+        self.previous_image_modified = None
+        self.frame_recorder = None
 
         globalClock.setFrameRate(self.fps_cap)
         globalClock.setMode(self.clock.MLimited)
@@ -61,6 +104,7 @@ class EngineBase(ShowBase):
         flags |= GraphicsPipe.BFResizeable
 
         self.makeDefaultPipe()
+        self._setup_threading_model(threading_model)
 
         self.win = self.graphicsEngine.makeOutput(
             self.pipe,
@@ -89,9 +133,26 @@ class EngineBase(ShowBase):
         aspect2d_region.setCamera(self.cam2d)
         aspect2d_region.setSort(20)
 
-        self.scene_manager = SceneManager(self)
+        # Before anything loads resources, so they come from the packs.
+        if use_asset_packs:
+            mount_asset_packs()
+
+        self.background_worker = BackgroundWorker(self)
+        self.model_cache = ModelCache(self)
+        self.texture_manager = TextureManager(self)
+        self.lod_manager = LodManager(self)
+        self.geometry_streamer = GeometryStreamer(self)
+        # Restarting from a snapshot replaces building the scene.
+        snapshot = None
+        if snapshot_path is not None:
+            snapshot = SceneSnapshot.read(snapshot_path, self.texture_manager)
+        self.scene_manager = SceneManager(self, snapshot)
         self.camera_controller = CameraController(self)
-        self.lighting_system = LightingSystem(self)
+        self.lighting_system = LightingSystem(self, snapshot)
+        if snapshot is not None:
+            self.camera_controller.set_state(snapshot.metadata["camera"])
+        self.object_picker = ObjectPicker(self)
+        self.thumbnail_service = ThumbnailService(self)
         self.profile_manager = ProfileManager(self)
         self.profile_manager.use_preview_profile()
 
@@ -100,6 +161,28 @@ class EngineBase(ShowBase):
 
         self._setup_timer()
 
+    def _setup_threading_model(self, threading_model):
+        """Must run before the output is made, it picks up the model on creation."""
+        if threading_model not in THREADING_MODELS:
+            raise ValueError(
+                f"Invalid threading model: {threading_model}. "
+                f"Valid values are {list(THREADING_MODELS)}."
+            )
+
+        if threading_model != "single" and not Thread.isThreadingSupported():
+            logger.warning(
+                "Threading model '%s' unavailable: Panda3D was built without "
+                "threading support, falling back to single-threaded.",
+                threading_model,
+            )
+            threading_model = "single"
+
+        self.threading_model = threading_model
+        self.graphicsEngine.setThreadingModel(
+            GraphicsThreadingModel(THREADING_MODELS[threading_model])
+        )
+        logger.info("Threading model: %s", threading_model)
+
     def _setup_hd_pipeline(self):
         try:
             import simplepbr
@@ -135,17 +218,21 @@ class EngineBase(ShowBase):
     def _capture_current_frame(self):
         self.notifier.fps_updated.emit(round(self.clock.getAverageFrameRate()))
 
+        # The Draw thread publishes each readback as a new RAM image, so the
+        # modification counter tells whether a frame arrived since the last
+        # capture, and the array we copy from can't change underneath us.
+        image_modified = self.screen_texture.getImageModified()
+        if image_modified == self.previous_image_modified:
+            logger.debug("Frame from buffer skipped: No new frame rendered")
+            return
+        self.previous_image_modified = image_modified
+
         tex_xsize = self.screen_texture.getXSize()
         tex_ysize = self.screen_texture.getYSize()
         width, height = tex_xsize, tex_ysize
 
         image_data = self.screen_texture.getRamImage().getData()
 
-        if image_data == self.previous_image_data:
-            logger.debug("Frame from buffer skipped: No changes")
-            self.previous_image_data = image_data
-            return
-
         expected_size = width * height * 4
         if len(image_data) != expected_size:
             logger.debug(
@@ -153,6 +240,16 @@ class EngineBase(ShowBase):
             )
             return
 
+        dirty_tiles = compute_dirty_tiles(
+            image_data, self.previous_image_data, width, height
+        )
+        if not dirty_tiles:
+            logger.debug("Frame from buffer skipped: No changes")
+            return
+
+        if self.frame_recorder is not None:
+            self._record_frame(image_data, width, height)
+
         q_image = QImage(
             image_data,
             width,
@@ -162,8 +259,35 @@ class EngineBase(ShowBase):
         )
 
         self.notifier.frame_captured.emit(q_image)
+        self.notifier.frame_updated.emit(q_image, dirty_tiles)
         self.previous_image_data = image_data
-        logger.debug("Frame from buffer captured: Size %i x %i", width, height)
+        logger.debug(
+            "Frame from buffer captured: Size %i x %i, %i dirty tiles",
+            width,
+            height,
+            len(dirty_tiles),
+        )
+
+    def _record_frame(self, image_data, width, height):
+        if not self.frame_recorder.append(image_data, width, height):
+            if self.frame_recorder.is_full:
+                logger.warning("Recording is full, stopping it.")
+                self.stop_recording()
+
+    def start_recording(self, path, max_frames=DEFAULT_MAX_FRAMES):
+        """Record captured frames, sized for the current resolution."""
+        self.stop_recording()
+        self.frame_recorder = FrameRecorder(
+            path, max_frames, self.win.getXSize(), self.win.getYSize()
+        )
+
+    def stop_recording(self):
+        """Stop recording and return the number of frames recorded."""
+        if self.frame_recorder is None:
+            return 0
+        frame_count = self.frame_recorder.close()
+        self.frame_recorder = None
+        return frame_count
 
     @Slot()
     def start_frame_capture(self):
@@ -185,6 +309,9 @@ class EngineBase(ShowBase):
 
     def stop(self):
         self.stop_frame_capture()
+        self.stop_recording()
+        self.background_worker.shutdown()
+        self.graphicsEngine.syncFrame()
         self.screen_texture.clearRamImage()
         self.graphicsEngine.removeWindow(self.win)
         self.finalizeExit()
@@ -0,0 +1,256 @@
+"""
+Raw frame recording into a memory-mapped file, grown in preallocated segments.
+
+File layout:
+    header   64 bytes, see ``RECORDING_HEADER``
+    index    ``max_frames`` entries of ``INDEX_DTYPE``
+    frames   up to ``max_frames`` slots of ``max_width * max_height * 4``
+             bytes, as many as were recorded once the recording is closed
+
+Frames are stored exactly as ``EngineBase._capture_current_frame`` reads them:
+top-down rows of 8-bit BGRA pixels, i.e. ``QImage.Format_ARGB32``. Only the
+first ``width * height * 4`` bytes of a slot are used by a smaller frame.
+"""
+
+import logging
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+RECORDING_MAGIC = b"PQRAW001"
+# Magic, max frames, max width, max height, slot size, frame count.
+RECORDING_HEADER = struct.Struct("<8sQIIQQ")
+HEADER_SIZE = 64
+INDEX_DTYPE = np.dtype([("timestamp", "<f8"), ("width", "<u4"), ("height", "<u4")])
+FRAME_COUNT_OFFSET = RECORDING_HEADER.size - 8
+DEFAULT_MAX_FRAMES = 600
+# Frames the file grows by at a time, about a second of recording.
+SEGMENT_FRAMES = 30
+
+
+def _reserve_space(path, offset, length):
+    """Allocate the disk space of a range of the file, so writing it can't fail."""
+    try:
+        descriptor = os.open(path, os.O_RDWR)
+        try:
+            os.posix_fallocate(descriptor, offset, length)
+        finally:
+            os.close(descriptor)
+    except (AttributeError, OSError):
+        # Not available on this platform or file system, the range stays sparse.
+        logger.debug("Could not reserve recording space in %s.", path)
+
+
+class FrameRecorder:
+    """
+    Appends raw frames to a recording without ever waiting on the disk. The
+    file grows a segment of frames at a time, always one segment ahead of
+    writing: a background thread extends the file, reserves the space and
+    maps it, and appending only swaps in the finished mapping. A frame that
+    arrives before its segment is ready is dropped and counted.
+    """
+
+    def __init__(
+        self, path, max_frames, max_width, max_height, segment_frames=SEGMENT_FRAMES
+    ):
+        self.path = path
+        self.max_frames = max_frames
+        self.max_width = max_width
+        self.max_height = max_height
+        self.slot_size = max_width * max_height * 4
+        self.segment_frames = segment_frames
+        self.frame_count = 0
+        self.dropped_frames = 0
+        self._data_offset = HEADER_SIZE + max_frames * INDEX_DTYPE.itemsize
+        self._mapped_frames = 0
+        # The growing thread, and the (frames, mapping) it hands over.
+        self._growing = None
+        self._grown = None
+        self._retired = []
+
+        open(path, "wb").close()
+        first_segment = min(segment_frames, max_frames)
+        self._set_mapping(first_segment, self._map_file(0, first_segment))
+        RECORDING_HEADER.pack_into(
+            self._header,
+            0,
+            RECORDING_MAGIC,
+            max_frames,
+            max_width,
+            max_height,
+            self.slot_size,
+            0,
+        )
+        self._grow(first_segment + segment_frames)
+        logger.info(
+            "Recording to %s: up to %i frames of %i x %i, %.1f MiB per segment.",
+            path,
+            max_frames,
+            max_width,
+            max_height,
+            segment_frames * self.slot_size / 2**20,
+        )
+
+    def _map_file(self, reserved_frames, frames):
+        """
+        Size the file for this many frames, reserve the space of the ones
+        after ``reserved_frames`` and map all of it.
+        """
+        file_size = self._data_offset + frames * self.slot_size
+        os.truncate(self.path, file_size)
+        reserved_size = self._data_offset + reserved_frames * self.slot_size
+        if reserved_frames:
+            _reserve_space(self.path, reserved_size, file_size - reserved_size)
+        # Dirty pages are written back by the OS, the render loop only copies.
+        return np.memmap(self.path, dtype=np.uint8, mode="r+", shape=(file_size,))
+
+    def _set_mapping(self, frames, mapping):
+        self._file = mapping
+        self._header = mapping[:HEADER_SIZE]
+        self.index = mapping[HEADER_SIZE : self._data_offset].view(INDEX_DTYPE)
+        self.frames = mapping[self._data_offset :].reshape(frames, self.slot_size)
+        self._mapped_frames = frames
+
+    def _grow(self, frames):
+        """Map up to ``frames`` frames on a background thread."""
+        frames = min(frames, self.max_frames)
+        if frames <= self._mapped_frames or self._growing is not None:
+            return
+        # Unmapping a large range takes a while too, so old mappings are
+        # dropped by the thread.
+        retired, self._retired = self._retired, []
+        self._growing = threading.Thread(
+            target=self._grow_file,
+            args=(self._mapped_frames, frames, retired),
+            name="frame_recorder_grow",
+            daemon=True,
+        )
+        self._growing.start()
+
+    def _grow_file(self, reserved_frames, frames, retired):
+        retired.clear()
+        self._grown = (frames, self._map_file(reserved_frames, frames))
+
+    def _take_grown(self):
+        """Swap in the mapping of a growing thread that has finished."""
+        if self._growing is None or self._growing.is_alive():
+            return
+        self._growing = None
+        if self._grown is None:
+            # The thread failed, the next segment is requested again.
+            return
+        frames, mapping = self._grown
+        self._grown = None
+        self._retired.append(self._file)
+        self._set_mapping(frames, mapping)
+
+    @property
+    def is_full(self):
+        return self.frame_count >= self.max_frames
+
+    def append(self, image_data, width, height, timestamp=None):
+        """Copy one frame into the next slot. Returns False if it was dropped."""
+        size = width * height * 4
+        if self.is_full:
+            return False
+        if size > self.slot_size or len(image_data) != size:
+            logger.debug("Frame not recorded: Larger than the recording size")
+            return False
+
+        slot = self.frame_count
+        self._take_grown()
+        if slot >= self._mapped_frames:
+            self._grow(slot + self.segment_frames)
+            self.dropped_frames += 1
+            logger.debug("Frame not recorded: Its segment isn't mapped yet")
+            return False
+        self.frames[slot, :size] = np.frombuffer(image_data, dtype=np.uint8)
+        self.index[slot] = (
+            time.perf_counter() if timestamp is None else timestamp,
+            width,
+            height,
+        )
+        self.frame_count += 1
+        struct.pack_into("<Q", self._header, FRAME_COUNT_OFFSET, self.frame_count)
+        if slot % self.segment_frames == 0:
+            # Writing entered a segment, prepare the one after it while the
+            # render loop works on the next frame.
+            self._grow(slot + 2 * self.segment_frames)
+        return True
+
+    def close(self):
+        """Release the mapping, leaving write-back to the OS. Returns the frame count."""
+        if self._growing is not None:
+            self._growing.join()
+            self._growing = None
+        # Dropping the last references unmaps the file.
+        self.index = self.frames = self._header = self._file = None
+        self._grown = None
+        self._retired.clear()
+        # Reserved segments no frame reached are given back.
+        os.truncate(self.path, self._data_offset + self.frame_count * self.slot_size)
+        logger.info(
+            "Recording closed: %i frames in %s, %i dropped",
+            self.frame_count,
+            self.path,
+            self.dropped_frames,
+        )
+        return self.frame_count
+
+
+class FrameRecording:
+    """Read-only view of a recording, backed by NumPy memmaps."""
+
+    def __init__(self, path):
+        with open(path, "rb") as file:
+            header = file.read(RECORDING_HEADER.size)
+        (
+            magic,
+            self.max_frames,
+            self.max_width,
+            self.max_height,
+            self.slot_size,
+            self.frame_count,
+        ) = RECORDING_HEADER.unpack(header)
+        if magic != RECORDING_MAGIC:
+            raise ValueError(f"{path} is not a PandaQt raw recording.")
+
+        index_offset = HEADER_SIZE
+        data_offset = index_offset + self.max_frames * INDEX_DTYPE.itemsize
+        if self.frame_count == 0:
+            self.index = np.empty(0, dtype=INDEX_DTYPE)
+            self.frames = np.empty((0, self.slot_size), dtype=np.uint8)
+            return
+
+        self.index = np.memmap(
+            path,
+            dtype=INDEX_DTYPE,
+            mode="r",
+            offset=index_offset,
+            shape=(self.frame_count,),
+        )
+        self.frames = np.memmap(
+            path,
+            dtype=np.uint8,
+            mode="r",
+            offset=data_offset,
+            shape=(self.frame_count, self.slot_size),
+        )
+
+    @property
+    def timestamps(self):
+        return self.index["timestamp"]
+
+    def __len__(self):
+        return self.frame_count
+
+    def __getitem__(self, frame):
+        """Returns the frame as a (height, width, 4) BGRA array view."""
+        entry = self.index[frame]
+        width, height = int(entry["width"]), int(entry["height"])
+        return self.frames[frame, : width * height * 4].reshape(height, width, 4)
@@ -0,0 +1,295 @@
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import numpy as np
+from panda3d.core import BoundingBox, Filename, Point3
+from platformdirs import user_cache_dir
+
+from ..utils.bvh import BoundingVolumeHierarchy
+from ..utils.spatial_chunks import DEFAULT_CHUNK_DIVISIONS, split_model
+from .model_cache import estimate_model_size
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_STREAMING_BUDGET = 256 * 1024 * 1024
+DEFAULT_STREAMING_DIR = os.path.join(user_cache_dir("PandaQt"), "streams")
+MAX_CONCURRENT_LOADS = 4
+# Bumped whenever the chunk layout changes, to invalidate prepared assets.
+STREAMING_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+
+
+class StreamedAsset:
+    """A model split into chunk files, of which only some are in memory."""
+
+    def __init__(self, name, directory, manifest, parent):
+        self.name = name
+        self.directory = directory
+        self.cell_size = manifest["cell_size"]
+        chunks = manifest["chunks"]
+        self.files = [chunk["file"] for chunk in chunks]
+        self.sizes = np.array([chunk["size"] for chunk in chunks], dtype=np.int64)
+        self.file_sizes = [chunk["file_size"] for chunk in chunks]
+        self.lows = np.array([chunk["low"] for chunk in chunks]).reshape(-1, 3)
+        self.highs = np.array([chunk["high"] for chunk in chunks]).reshape(-1, 3)
+        self.bvh = BoundingVolumeHierarchy()
+        self.bvh.build(self.lows, self.highs)
+
+        self.chunk_nodes = [None] * len(chunks)
+        self.requests = {}
+
+        # The whole asset's bounds, whichever chunks happen to be loaded, so
+        # culling, picking and the spatial index see all of it.
+        self.root = parent.attachNewNode(name)
+        if len(chunks):
+            self.root.node().setBounds(
+                BoundingBox(
+                    Point3(*self.lows.min(axis=0)), Point3(*self.highs.max(axis=0))
+                )
+            )
+            self.root.node().setFinal(True)
+
+    def __len__(self):
+        return len(self.files)
+
+    def chunk_path(self, index):
+        return Filename.fromOsSpecific(os.path.join(self.directory, self.files[index]))
+
+
+class GeometryStreamer:
+    """
+    Streams assets too large to keep in memory at once. Assets are split once
+    into spatial chunks stored as BAM files; chunks in view or around the
+    camera are loaded in the background, nearest first, and chunks that are
+    no longer needed are evicted, least recently used first, to stay within
+    the memory budget.
+    """
+
+    def __init__(
+        self,
+        engine,
+        memory_budget=DEFAULT_STREAMING_BUDGET,
+        cache_dir=DEFAULT_STREAMING_DIR,
+        max_concurrent_loads=MAX_CONCURRENT_LOADS,
+    ):
+        self.engine = engine
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.max_concurrent_loads = max_concurrent_loads
+        self.assets = []
+        self.memory_used = 0
+        self.bytes_streamed = 0
+        self.chunks_loaded = 0
+        self.evictions = 0
+
+        # (asset, chunk index) -> memory size, least recently needed first.
+        self._resident = OrderedDict()
+        self._queue = []
+
+        # After the camera tasks, which have the same sort, so chunks follow
+        # the camera of the frame about to render.
+        self.engine.taskMgr.add(
+            self._update_task, "_geometry_streamer_update", sort=49, priority=-2
+        )
+
+    def prepare(self, model_path, divisions=DEFAULT_CHUNK_DIVISIONS):
+        """
+        Split a model into chunk files unless that was done for this version
+        of the model already. Returns the directory holding them.
+        """
+        key = self.engine.model_cache.make_key(
+            model_path, variant=("stream", STREAMING_VERSION, divisions)
+        )
+        directory = os.path.join(
+            self.cache_dir, hashlib.sha1(repr(key).encode()).hexdigest()
+        )
+        if os.path.exists(os.path.join(directory, MANIFEST_NAME)):
+            return directory
+
+        start = time.perf_counter()
+        model = self.engine.loader.loadModel(model_path, noCache=True)
+        chunks, cell_size = split_model(model, divisions)
+        model.removeNode()
+
+        os.makedirs(directory, exist_ok=True)
+        manifest = {"source": key[0], "cell_size": cell_size, "chunks": []}
+        for index, (chunk, low, high) in enumerate(chunks):
+            file_name = f"chunk_{index}.bam"
+            chunk_path = os.path.join(directory, file_name)
+            if not chunk.writeBamFile(Filename.fromOsSpecific(chunk_path)):
+                raise OSError(f"Could not write chunk file: {chunk_path}")
+            manifest["chunks"].append(
+                {
+                    "file": file_name,
+                    "low": low.tolist(),
+                    "high": high.tolist(),
+                    # Chunks share the textures, loaded once through the
+                    # texture pool, so only their geometry counts.
+                    "size": estimate_model_size(chunk, include_textures=False),
+                    "file_size": os.path.getsize(chunk_path),
+                }
+            )
+            chunk.removeNode()
+
+        # Written last, so an interrupted split is redone.
+        temp_path = os.path.join(directory, f"{MANIFEST_NAME}.tmp")
+        with open(temp_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file)
+        os.replace(temp_path, os.path.join(directory, MANIFEST_NAME))
+        logger.info(
+            "Split %s into %i chunks in %.2f s.",
+            model_path,
+            len(chunks),
+            time.perf_counter() - start,
+        )
+        return directory
+
+    def stream(self, model_path, parent, divisions=DEFAULT_CHUNK_DIVISIONS):
+        """Start streaming a model under ``parent``. Returns the StreamedAsset."""
+        directory = self.prepare(model_path, divisions)
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            manifest = json.load(manifest_file)
+
+        asset = StreamedAsset(
+            Filename(model_path).getBasename(), directory, manifest, parent
+        )
+        self.assets.append(asset)
+        logger.info("Streaming %s: %i chunks.", model_path, len(asset))
+        return asset
+
+    def remove(self, asset):
+        """Stop streaming an asset and release its chunks."""
+        for request in asset.requests.values():
+            request.cancel()
+        asset.requests.clear()
+        for index in range(len(asset)):
+            self._evict(asset, index)
+        self.assets.remove(asset)
+        self._queue = [entry for entry in self._queue if entry[1] is not asset]
+        asset.root.removeNode()
+
+    def clear(self):
+        for asset in list(self.assets):
+            self.remove(asset)
+
+    def _wanted_chunks(self, asset, camera):
+        """
+        Chunks in the view frustum or within a cell of the camera, with their
+        distance to the camera, in asset space.
+        """
+        frustum = camera.node().getLens().makeBounds()
+        frustum.xform(camera.getMat(asset.root))
+        planes = [list(frustum.getPlane(index)) for index in range(6)]
+        position = np.array(camera.getPos(asset.root))
+
+        nearby = asset.bvh.query_box(
+            position - asset.cell_size, position + asset.cell_size
+        )
+        wanted = np.union1d(asset.bvh.query_planes(planes), nearby)
+        closest = np.clip(position, asset.lows[wanted], asset.highs[wanted])
+        return wanted, np.linalg.norm(closest - position, axis=1)
+
+    def _update_task(self, task):
+        camera_controller = getattr(self.engine, "camera_controller", None)
+        if not self.assets or camera_controller is None:
+            return task.cont
+
+        queue, wanted_keys = [], set()
+        for asset in self.assets:
+            wanted, distances = self._wanted_chunks(asset, camera_controller.camera)
+            for index, distance in zip(wanted.tolist(), distances.tolist()):
+                key = (asset, index)
+                wanted_keys.add(key)
+                if key in self._resident:
+                    self._resident.move_to_end(key)
+                elif index not in asset.requests:
+                    queue.append((distance, asset, index))
+        queue.sort(key=lambda entry: entry[0])
+        self._queue = queue
+
+        loading = sum(len(asset.requests) for asset in self.assets)
+        while self._queue and loading < self.max_concurrent_loads:
+            _distance, asset, index = self._queue[0]
+            if not self._make_room(asset.sizes[index], wanted_keys):
+                break
+            self._queue.pop(0)
+            self._load_chunk(asset, index)
+            loading += 1
+        return task.cont
+
+    def _make_room(self, size, wanted_keys):
+        """
+        Evict chunks no longer wanted, least recently used first, until
+        ``size`` more bytes fit the budget. Evicts nothing if they can't.
+        """
+        reserved = sum(
+            int(asset.sizes[index]) for asset in self.assets for index in asset.requests
+        )
+        excess = self.memory_used + reserved + size - self.memory_budget
+        evictable = [key for key in self._resident if key not in wanted_keys]
+        if excess > sum(self._resident[key] for key in evictable):
+            return False
+
+        for key in evictable:
+            if excess <= 0:
+                break
+            excess -= self._resident[key]
+            self._evict(*key)
+            self.evictions += 1
+        return True
+
+    def _load_chunk(self, asset, index):
+        asset.requests[index] = self.engine.loader.loadModel(
+            asset.chunk_path(index),
+            noCache=True,
+            callback=self._on_chunk_loaded,
+            extraArgs=[asset, index],
+        )
+
+    def _on_chunk_loaded(self, chunk, asset, index):
+        if asset.requests.pop(index, None) is None or asset not in self.assets:
+            if chunk is not None:
+                chunk.removeNode()
+            return
+        if chunk is None:
+            logger.error("Could not load chunk %i of %s.", index, asset.name)
+            return
+
+        chunk.reparentTo(asset.root)
+        asset.chunk_nodes[index] = chunk
+        self._resident[(asset, index)] = int(asset.sizes[index])
+        self.memory_used += int(asset.sizes[index])
+        self.bytes_streamed += asset.file_sizes[index]
+        self.chunks_loaded += 1
+        self._report_changed(asset)
+
+    def _evict(self, asset, index):
+        size = self._resident.pop((asset, index), None)
+        if size is None:
+            return
+        asset.chunk_nodes[index].removeNode()
+        asset.chunk_nodes[index] = None
+        self.memory_used -= size
+        self._report_changed(asset)
+
+    def _report_changed(self, asset):
+        """Tell the spatial index's listeners the asset's geometry changed."""
+        self.engine.scene_manager.spatial_index.update(asset.root)
+
+    def get_statistics(self):
+        return {
+            "assets": len(self.assets),
+            "chunks": sum(len(asset) for asset in self.assets),
+            "resident_chunks": len(self._resident),
+            "loading": sum(len(asset.requests) for asset in self.assets),
+            "queued": len(self._queue),
+            "memory_used": self.memory_used,
+            "memory_budget": self.memory_budget,
+            "bytes_streamed": self.bytes_streamed,
+            "chunks_loaded": self.chunks_loaded,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,240 @@
+"""
+Hardware instancing for large sets of identical objects.
+
+One copy of the model is drawn ``N`` times in a single call. The per-instance
+model matrices live in a buffer texture of four RGBA32F texels per instance,
+fetched by the vertex shader with ``gl_InstanceID``. Matrices follow Panda3D's
+row-vector convention (translation in the last row), as returned by
+``LMatrix4f`` and ``compose_matrices``.
+"""
+
+import logging
+
+import numpy as np
+from panda3d.core import (
+    BoundingBox,
+    BoundingVolume,
+    GeomEnums,
+    OmniBoundingVolume,
+    Point3,
+    Shader,
+    Texture,
+)
+
+logger = logging.getLogger(__name__)
+
+INSTANCING_VERTEX_SHADER = """
+#version 140
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform mat4 p3d_ModelViewMatrix;
+uniform mat3 p3d_NormalMatrix;
+uniform samplerBuffer instance_matrices;
+
+in vec4 p3d_Vertex;
+in vec3 p3d_Normal;
+in vec4 p3d_Color;
+in vec2 p3d_MultiTexCoord0;
+
+out vec3 view_position;
+out vec3 view_normal;
+out vec4 vertex_color;
+out vec2 texcoord;
+
+void main() {
+    int texel = gl_InstanceID * 4;
+    // Texels hold the rows of a Panda3D matrix, i.e. the GLSL columns.
+    mat4 instance_matrix = mat4(
+        texelFetch(instance_matrices, texel),
+        texelFetch(instance_matrices, texel + 1),
+        texelFetch(instance_matrices, texel + 2),
+        texelFetch(instance_matrices, texel + 3));
+
+    vec4 model_position = instance_matrix * p3d_Vertex;
+    gl_Position = p3d_ModelViewProjectionMatrix * model_position;
+    view_position = vec3(p3d_ModelViewMatrix * model_position);
+    view_normal = normalize(p3d_NormalMatrix * (mat3(instance_matrix) * p3d_Normal));
+    vertex_color = p3d_Color;
+    texcoord = p3d_MultiTexCoord0;
+}
+"""
+
+INSTANCING_FRAGMENT_SHADER = """
+#version 140
+
+uniform sampler2D p3d_Texture0;
+uniform vec4 p3d_ColorScale;
+uniform struct {
+    vec4 ambient;
+} p3d_LightModel;
+uniform struct {
+    vec4 color;
+    vec4 position;
+} p3d_LightSource[4];
+
+in vec3 view_position;
+in vec3 view_normal;
+in vec4 vertex_color;
+in vec2 texcoord;
+
+out vec4 fragment_color;
+
+void main() {
+    vec3 normal = normalize(view_normal);
+    vec3 light = p3d_LightModel.ambient.rgb;
+    for (int index = 0; index < p3d_LightSource.length(); ++index) {
+        vec4 light_position = p3d_LightSource[index].position;
+        vec3 light_direction = normalize(
+            light_position.xyz - view_position * light_position.w);
+        light += p3d_LightSource[index].color.rgb
+            * max(dot(normal, light_direction), 0.0);
+    }
+
+    vec4 base_color = texture(p3d_Texture0, texcoord) * vertex_color * p3d_ColorScale;
+    fragment_color = vec4(base_color.rgb * light, base_color.a);
+}
+"""
+
+
+def compose_matrices(positions, hprs=None, scales=None):
+    """
+    Builds (N, 4, 4) model matrices from position, HPR (degrees) and scale
+    arrays, matching ``TransformState.makePosHprScale(...).getMat()``.
+    Scales may be (N,) for uniform or (N, 3) for per-axis scaling.
+    """
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    count = len(positions)
+    matrices = np.zeros((count, 4, 4), dtype=np.float32)
+    matrices[:, 3, :3] = positions
+    matrices[:, 3, 3] = 1
+
+    if hprs is None:
+        rotation = np.broadcast_to(np.eye(3, dtype=np.float32), (count, 3, 3))
+    else:
+        heading, pitch, roll = np.radians(
+            np.asarray(hprs, dtype=np.float64).reshape(-1, 3)
+        ).T
+        ch, sh = np.cos(heading), np.sin(heading)
+        cp, sp = np.cos(pitch), np.sin(pitch)
+        cr, sr = np.cos(roll), np.sin(roll)
+        # Row-vector form of roll about Y, then pitch about X, then heading about Z.
+        rotation = np.empty((count, 3, 3), dtype=np.float64)
+        rotation[:, 0, 0] = cr * ch - sr * sp * sh
+        rotation[:, 0, 1] = cr * sh + sr * sp * ch
+        rotation[:, 0, 2] = -sr * cp
+        rotation[:, 1, 0] = -cp * sh
+        rotation[:, 1, 1] = cp * ch
+        rotation[:, 1, 2] = sp
+        rotation[:, 2, 0] = sr * ch + cr * sp * sh
+        rotation[:, 2, 1] = sr * sh - cr * sp * ch
+        rotation[:, 2, 2] = cr * cp
+
+    if scales is None:
+        matrices[:, :3, :3] = rotation
+    else:
+        scales = np.asarray(scales, dtype=np.float32)
+        scales = np.broadcast_to(scales.reshape(count, -1), (count, 3))
+        matrices[:, :3, :3] = rotation * scales[:, :, None]
+    return matrices
+
+
+class InstancedSet:
+    """Draws one model at many transforms with a single instanced draw call."""
+
+    _shader = None
+
+    def __init__(self, model, parent, matrices, name="instanced_set"):
+        matrices = _as_matrices(matrices)
+
+        # Bake the model's own transforms into its vertices, so the instance
+        # matrix is the only transform between the vertices and the parent.
+        self.root = parent.attachNewNode(name)
+        model.copyTo(self.root)
+        self.root.clearModelNodes()
+        self.root.flattenStrong()
+
+        self._local_bounds = self._compute_local_corners()
+        self.matrix_buffer = Texture(f"{name}_matrices")
+        self.matrix_buffer.setKeepRamImage(True)
+
+        self.root.setShader(self._get_shader(), 10)
+        self.root.setShaderInput("instance_matrices", self.matrix_buffer)
+        self.root.node().setBoundsType(BoundingVolume.BT_box)
+        self.root.node().setFinal(True)
+        self.update_transforms(matrices)
+
+    @classmethod
+    def _get_shader(cls):
+        if cls._shader is None:
+            cls._shader = Shader.make(
+                Shader.SL_GLSL, INSTANCING_VERTEX_SHADER, INSTANCING_FRAGMENT_SHADER
+            )
+        return cls._shader
+
+    def _compute_local_corners(self):
+        bounds = self.root.getTightBounds()
+        if bounds is None:
+            return None
+        low, high = (np.array(point, dtype=np.float32) for point in bounds)
+        corners = np.array(
+            [[x, y, z, 1] for x in (0, 1) for y in (0, 1) for z in (0, 1)],
+            dtype=np.float32,
+        )
+        corners[:, :3] = low + corners[:, :3] * (high - low)
+        return corners
+
+    @property
+    def count(self):
+        return len(self.matrices)
+
+    def update_transforms(self, matrices):
+        """Replace every instance transform, resizing the buffer if needed."""
+        self.matrices = _as_matrices(matrices)
+        count = len(self.matrices)
+
+        if self.matrix_buffer.getXSize() != max(count, 1) * 4:
+            self.matrix_buffer.setupBufferTexture(
+                max(count, 1) * 4,
+                Texture.T_float,
+                Texture.F_rgba32,
+                GeomEnums.UH_dynamic,
+            )
+        if count:
+            buffer_view = memoryview(self.matrix_buffer.modifyRamImage())
+            np.frombuffer(buffer_view, dtype=np.float32)[: count * 16] = (
+                self.matrices.reshape(-1)
+            )
+
+        # An instance count of zero would mean "not instanced", draw nothing.
+        if count:
+            self.root.setInstanceCount(count)
+            self.root.show()
+        else:
+            self.root.hide()
+        self._update_bounds()
+
+    def update_from_arrays(self, positions, hprs=None, scales=None):
+        """Replace every instance transform from position/HPR/scale arrays."""
+        self.update_transforms(compose_matrices(positions, hprs, scales))
+
+    def _update_bounds(self):
+        """One box around all instances, so culling tests the set as a whole."""
+        if self._local_bounds is None or not len(self.matrices):
+            self.root.node().setBounds(OmniBoundingVolume())
+            return
+
+        corners = np.einsum("ck,nkj->ncj", self._local_bounds, self.matrices)
+        corners = corners.reshape(-1, 4)[:, :3]
+        low, high = corners.min(axis=0), corners.max(axis=0)
+        self.root.node().setBounds(BoundingBox(Point3(*low), Point3(*high)))
+
+    def remove(self):
+        self.root.removeNode()
+        self.matrix_buffer.clear()
+
+
+def _as_matrices(matrices):
+    matrices = np.ascontiguousarray(matrices, dtype=np.float32)
+    if matrices.ndim != 3 or matrices.shape[1:] != (4, 4):
+        raise ValueError(f"Expected an (N, 4, 4) array, got {matrices.shape}.")
+    return matrices
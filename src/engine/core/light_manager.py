@@ -0,0 +1,223 @@
+import logging
+
+import numpy as np
+from panda3d.core import PerspectiveLens, PointLight, Spotlight, Vec3
+
+logger = logging.getLogger(__name__)
+
+# Fixed-function OpenGL has eight lights, three of them are taken by the
+# LightingSystem's directional lights.
+DEFAULT_MAX_LIGHTS_PER_OBJECT = 4
+# Lights are attenuated to 1 / (1 + RADIUS_FALLOFF) of their intensity at
+# their radius, beyond which they are left out.
+RADIUS_FALLOFF = 25
+# Perceived brightness of the color channels, to rank lights by.
+LUMINANCE = np.array([0.2126, 0.7152, 0.0722])
+
+
+class _ManagedLight:
+    def __init__(self, node_path, radius):
+        self.node_path = node_path
+        self.radius = radius
+        self.transform = None
+        # The world-space box of influence the objects were assigned with.
+        self.box = None
+
+
+class LightManager:
+    """
+    Point lights and spotlights in large numbers, each set only on the scene
+    objects within its radius. An object gets at most
+    ``max_lights_per_object`` lights, those brightest at its bounds, so the
+    cost of shading an object stays bounded however many lights there are.
+    Spotlights are ranked like point lights, their cones are not considered.
+
+    Assignments are kept up to date incrementally: the objects the spatial
+    index reports added or moved, and the objects around lights that were
+    added, moved or removed, are reassigned once per frame.
+    """
+
+    def __init__(self, engine, max_lights_per_object=DEFAULT_MAX_LIGHTS_PER_OBJECT):
+        self.engine = engine
+        self.root = self.engine.render.attachNewNode("managed_lights")
+        self.max_lights_per_object = max_lights_per_object
+        self.enabled = True
+        self.lights = {}
+        # Scene object -> the lights set on it, brightest first.
+        self._assigned = {}
+        self._dirty = set()
+
+        self.spatial_index = self.engine.scene_manager.spatial_index
+        self.spatial_index.add_listener(self._on_objects_changed)
+        # After the spatial index has reported the objects that moved.
+        self.engine.taskMgr.add(
+            self._update_task, "_light_manager_update", sort=49, priority=-4
+        )
+
+    def add_point_light(self, pos, color, radius):
+        """Add a point light lighting the objects within ``radius``."""
+        light = PointLight("point_light")
+        light_np = self.root.attachNewNode(light)
+        light_np.setPos(pos)
+        return self._add_light(light_np, color, radius)
+
+    def add_spotlight(self, pos, look_at, color, radius, fov=45):
+        """Add a spotlight pointed at ``look_at``, lighting objects within ``radius``."""
+        light = Spotlight("spotlight")
+        lens = PerspectiveLens()
+        lens.setFov(fov)
+        light.setLens(lens)
+        light_np = self.root.attachNewNode(light)
+        light_np.setPos(pos)
+        light_np.lookAt(look_at)
+        return self._add_light(light_np, color, radius)
+
+    def _add_light(self, light_np, color, radius):
+        light = light_np.node()
+        light.setColor(color)
+        self.lights[light_np] = _ManagedLight(light_np, radius)
+        self._set_attenuation(light_np, radius)
+        return light_np
+
+    @staticmethod
+    def _set_attenuation(light_np, radius):
+        light = light_np.node()
+        light.setAttenuation(Vec3(1, 0, RADIUS_FALLOFF / radius**2))
+        light.setMaxDistance(radius)
+
+    def set_radius(self, light_np, radius):
+        self.lights[light_np].radius = radius
+        self._set_attenuation(light_np, radius)
+        # Reassigned as if it moved.
+        self.lights[light_np].transform = None
+
+    def remove_light(self, light_np):
+        managed_light = self.lights.pop(light_np)
+        if managed_light.box is not None:
+            for node_path in self.spatial_index.objects_in_box(*managed_light.box):
+                lights = self._assigned.get(node_path, ())
+                if light_np in lights:
+                    self._set_lights(
+                        node_path, tuple(light for light in lights if light != light_np)
+                    )
+                    self._dirty.add(node_path)
+        light_np.removeNode()
+
+    def clear(self):
+        for light_np in list(self.lights):
+            self.remove_light(light_np)
+
+    def set_enabled(self, enabled):
+        """Set or clear the lights on all objects, as lighting is toggled."""
+        self.enabled = enabled
+        if enabled:
+            self._dirty.update(
+                node_path
+                for node_path in self.spatial_index.node_paths
+                if node_path is not None
+            )
+        else:
+            for node_path in list(self._assigned):
+                self._set_lights(node_path, ())
+            self._dirty.clear()
+
+    def set_max_lights_per_object(self, max_lights):
+        self.max_lights_per_object = max_lights
+        self.set_enabled(self.enabled)
+
+    def _on_objects_changed(self, changed, removed):
+        for node_path in removed:
+            self._dirty.discard(node_path)
+            if node_path in self._assigned and not node_path.isEmpty():
+                self._set_lights(node_path, ())
+            self._assigned.pop(node_path, None)
+        if self.enabled:
+            self._dirty.update(changed)
+
+    def _update_task(self, task):
+        if not self.enabled:
+            return task.cont
+
+        for managed_light in self.lights.values():
+            transform = managed_light.node_path.getNetTransform()
+            if transform == managed_light.transform:
+                continue
+            managed_light.transform = transform
+            if managed_light.box is not None:
+                self._dirty.update(
+                    self.spatial_index.objects_in_box(*managed_light.box)
+                )
+            position = np.array(managed_light.node_path.getPos(self.engine.render))
+            managed_light.box = (
+                position - managed_light.radius,
+                position + managed_light.radius,
+            )
+            self._dirty.update(self.spatial_index.objects_in_box(*managed_light.box))
+
+        if self._dirty:
+            self._assign(list(self._dirty))
+            self._dirty.clear()
+        return task.cont
+
+    def _assign(self, node_paths):
+        """Set the brightest lights at their bounds on these objects."""
+        node_paths, lows, highs = self.spatial_index.get_boxes(node_paths)
+        if not node_paths:
+            return
+        if not self.lights:
+            for node_path in node_paths:
+                self._set_lights(node_path, ())
+            return
+
+        light_nps = list(self.lights)
+        positions = np.array(
+            [light_np.getPos(self.engine.render) for light_np in light_nps]
+        )
+        radii = np.array([self.lights[light_np].radius for light_np in light_nps])
+        intensities = np.array(
+            [light_np.node().getColor().getXyz() for light_np in light_nps]
+        ).dot(LUMINANCE)
+
+        # Squared distance from each light to the nearest point of each box.
+        nearest = np.clip(positions[None], lows[:, None], highs[:, None])
+        distances = np.square(nearest - positions[None]).sum(axis=2)
+        relative = distances / np.square(radii)
+        scores = np.where(
+            relative < 1, intensities / (1 + RADIUS_FALLOFF * relative), 0
+        )
+
+        count = min(self.max_lights_per_object, len(light_nps))
+        ranked = np.argsort(-scores, axis=1)[:, :count]
+        for node_path, order, row in zip(node_paths, ranked, scores):
+            self._set_lights(
+                node_path, tuple(light_nps[index] for index in order if row[index] > 0)
+            )
+
+    def _set_lights(self, node_path, lights):
+        assigned = self._assigned.get(node_path, ())
+        for light_np in assigned:
+            if light_np not in lights:
+                node_path.clearLight(light_np)
+        for light_np in lights:
+            if light_np not in assigned:
+                node_path.setLight(light_np)
+        if lights:
+            self._assigned[node_path] = lights
+        else:
+            self._assigned.pop(node_path, None)
+
+    def get_min_radius(self):
+        """The smallest radius of the lights, None without lights."""
+        if not self.lights:
+            return None
+        return min(managed_light.radius for managed_light in self.lights.values())
+
+    def get_statistics(self):
+        objects = len(self.spatial_index)
+        assigned = sum(len(lights) for lights in self._assigned.values())
+        return {
+            "lights": len(self.lights),
+            "lit_objects": len(self._assigned),
+            "average_lights_per_object": assigned / objects if objects else 0.0,
+            "max_lights_per_object": self.max_lights_per_object,
+        }
@@ -1,21 +1,36 @@
-import os
-
 from panda3d.core import (
     AmbientLight,
     DirectionalLight,
-    Filename,
+    NodePath,
     Point3,
     Vec4,
 )
 
+from ..utils.asset_packs import resource_path
+from .light_manager import LightManager
+from .shadow_cache import ShadowCache
+
 
 class LightingSystem:
-    def __init__(self, engine):
+    """
+    Lights and their indicators are created once and stay resident; toggling
+    only changes which lights are set on render and whether the indicators
+    are shown. All indicators instance one shared indicator model. With a
+    scene snapshot, the lights and indicators are taken from it instead.
+
+    Point lights and spotlights are added through ``light_manager``, which
+    sets each only on the objects near it. Shadow maps are rendered only when
+    they change, see ``ShadowCache``.
+    """
+
+    def __init__(self, engine, snapshot=None):
         self.engine = engine
         self.indicator_model = None
         self.indicator_instances = []
+        self.light_nps = []
         self.lighting_enabled = True
         self.indicators_enabled = True
+        self.light_manager = LightManager(engine)
 
         self.light_positions = {
             "key_light": (2.5, -5, 7.5),
@@ -28,41 +43,81 @@ class LightingSystem:
             "rim_light": (0, 0, 5),
         }
 
-        self._setup_lighting()
+        if snapshot is not None:
+            self._restore_lighting(snapshot)
+        else:
+            self._setup_lighting()
+        self.shadow_cache = ShadowCache(engine, self.light_nps)
 
     def clear_lighting(self):
-        """Clear all lighting and indicator models."""
-        self.engine.render.clearLight()
-        self._clear_indicators()
+        """Turn off all lights and hide their indicators, keeping them resident."""
+        for light_np in self.light_nps:
+            self.engine.render.clearLight(light_np)
+        self.light_manager.set_enabled(False)
+        self.indicator_root.hide()
 
     def _setup_lighting(self):
-        """Initialize and configure all lighting components."""
-        if not self.lighting_enabled:
-            return
-
-        self.engine.render.clearLight()
+        """Create all lighting components once, then apply the current state."""
+        self.indicator_root = self.engine.render.attachNewNode("light_indicators")
         self._load_indicator_model()
         self._create_lights()
-        if self.indicators_enabled:
-            self._place_indicators()
+        self._place_indicators()
+
+        if self.lighting_enabled:
+            self._apply_lighting()
+        else:
+            self.clear_lighting()
+
+    def _restore_lighting(self, snapshot):
+        """Take the lights and indicators saved in a scene snapshot."""
+        state = snapshot.metadata["lighting"]
+        self.lighting_enabled = state["lighting_enabled"]
+        self.indicators_enabled = state["indicators_enabled"]
+
+        self.indicator_root = snapshot.take("light_indicators")
+        self.indicator_root.reparentTo(self.engine.render)
+        self.indicator_instances = list(self.indicator_root.getChildren())
+        if self.indicator_instances:
+            self.indicator_model = self.indicator_instances[0].getChild(0)
+        for light_np in snapshot.take("lights").getChildren():
+            light_np.reparentTo(self.engine.render)
+            self.light_nps.append(light_np)
+        self.key_light_np, self.fill_light_np, self.rim_light_np = self.light_nps[:3]
+
+        if self.lighting_enabled:
+            self._apply_lighting()
+        else:
+            self.clear_lighting()
+
+    def get_snapshot_nodes(self):
+        """The lights and indicators to save in a scene snapshot, and their state."""
+        lights = NodePath("lights")
+        for light_np in self.light_nps:
+            light_np.instanceTo(lights)
+        state = {
+            "lighting_enabled": self.lighting_enabled,
+            "indicators_enabled": self.indicators_enabled,
+        }
+        return [lights, self.indicator_root], state
+
+    def _apply_lighting(self):
+        """Set all resident lights on render and show indicators if enabled."""
+        for light_np in self.light_nps:
+            self.engine.render.setLight(light_np)
+        self.light_manager.set_enabled(True)
+        self._update_indicator_visibility()
 
-    def _clear_indicators(self):
-        """Remove all indicator models."""
-        for indicator_instance in self.indicator_instances:
-            indicator_instance.removeNode()
-        self.indicator_instances.clear()
+    def _update_indicator_visibility(self):
+        if self.lighting_enabled and self.indicators_enabled:
+            self.indicator_root.show()
+        else:
+            self.indicator_root.hide()
 
     def _load_indicator_model(self):
         """Load and configure the indicator model for visualizing lights."""
-        model_path = os.path.join(
-            os.path.dirname(
-                os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-            ),
-            "resources",
-            "DirectionalLight.glb",
+        self.indicator_model = self.engine.model_cache.load_model(
+            resource_path("DirectionalLight.glb")
         )
-        pandafile = Filename.fromOsSpecific(model_path)
-        self.indicator_model = self.engine.loader.loadModel(pandafile)
 
         self.indicator_model.setColor(239 / 255, 102 / 255, 60 / 255, 1)
         self.indicator_model.setScale(1)
@@ -91,7 +146,7 @@ class LightingSystem:
         light_np.lookAt(Point3(self.light_orientations[name]))
         light.setColor(color)
         light.setShadowCaster(shadow_caster)
-        self.engine.render.setLight(light_np)
+        self.light_nps.append(light_np)
         return light_np
 
     def _create_ambient_light(self):
@@ -99,43 +154,53 @@ class LightingSystem:
         ambient_light = AmbientLight("ambient_light")
         ambient_light.setColor(Vec4(0.3, 0.3, 0.3, 1))
         ambient_light_np = self.engine.render.attachNewNode(ambient_light)
-        self.engine.render.setLight(ambient_light_np)
+        self.light_nps.append(ambient_light_np)
 
     def _place_indicators(self):
         """Place indicators for each light."""
-        for name, light_np in [
-            ("key_light", self.key_light_np),
-            ("fill_light", self.fill_light_np),
-            ("rim_light", self.rim_light_np),
-        ]:
+        for light_np in (self.key_light_np, self.fill_light_np, self.rim_light_np):
             self._add_light_indicator(light_np)
 
     def _add_light_indicator(self, light_np):
-        """Add an indicator model to visualize the position and direction of a light."""
-        if self.indicators_enabled and self.indicator_model:
-            indicator_instance = self.indicator_model.copyTo(self.engine.render)
-            indicator_instance.setPos(light_np.getPos())
-            indicator_instance.setHpr(light_np.getHpr())
-            self.indicator_instances.append(indicator_instance)
+        """Add an instance of the indicator model at the light's position and direction."""
+        if self.indicator_model:
+            placement = self.indicator_root.attachNewNode(
+                f"{light_np.getName()}_indicator"
+            )
+            placement.setPos(light_np.getPos())
+            placement.setHpr(light_np.getHpr())
+            self.indicator_model.instanceTo(placement)
+            self.indicator_instances.append(placement)
 
     def enable_lighting(self):
-        """Enable lighting and re-setup the lighting."""
+        """Enable lighting by setting the resident lights on render."""
         self.lighting_enabled = True
-        self._setup_lighting()
+        self._apply_lighting()
 
     def disable_lighting(self):
         """Disable lighting and clear all lights."""
         self.lighting_enabled = False
         self.clear_lighting()
 
+    def get_light_statistics(self):
+        return self.light_manager.get_statistics()
+
+    def set_shadow_map_size(self, size, light_name="key_light"):
+        """Set the shadow map resolution of a shadow-casting light."""
+        light_np = next(
+            light_np for light_np in self.light_nps if light_np.getName() == light_name
+        )
+        self.shadow_cache.set_shadow_map_size(light_np, size)
+
+    def get_shadow_statistics(self):
+        return self.shadow_cache.get_statistics()
+
     def enable_indicators(self):
-        """Enable indicators and re-add them to the scene."""
+        """Enable indicators, shown while lighting is enabled."""
         self.indicators_enabled = True
-        self._clear_indicators()
-        if self.lighting_enabled:
-            self._place_indicators()
+        self._update_indicator_visibility()
 
     def disable_indicators(self):
-        """Disable indicators and remove all indicator models."""
+        """Disable indicators and hide all indicator models."""
         self.indicators_enabled = False
-        self._clear_indicators()
+        self._update_indicator_visibility()
@@ -0,0 +1,163 @@
+import logging
+import time
+
+from panda3d.core import Geom, GeomNode, LODNode, NodePath, RenderState
+
+from ..utils.geom_arrays import (
+    count_triangles,
+    make_triangles,
+    simplify_triangles,
+    triangle_indices,
+    vertex_positions,
+)
+
+logger = logging.getLogger(__name__)
+
+# Fraction of the full-detail triangles kept by each simplified level.
+DEFAULT_LOD_RATIOS = (0.5, 0.2, 0.05)
+# Distance, in bounding radii of the mesh, at which each simplified level
+# takes over from the previous one.
+LOD_SWITCH_RADII = (8, 20, 45)
+LOD_MAX_DISTANCE = 1e6
+# Meshes below this are cheap enough at full detail.
+MIN_LOD_TRIANGLES = 2000
+# Bumped whenever generated levels change, to invalidate cached models.
+LOD_VERSION = 1
+
+
+class LodManager:
+    """
+    Generates simplified levels for dense meshes at import time and switches
+    between them by distance with LODNodes. Models with generated levels are
+    cached on disk by the ModelCache, so generation runs once per model.
+    """
+
+    def __init__(
+        self, engine, ratios=DEFAULT_LOD_RATIOS, min_triangles=MIN_LOD_TRIANGLES
+    ):
+        self.engine = engine
+        self.ratios = tuple(ratios)
+        self.min_triangles = min_triangles
+        self.enabled = True
+        self.lod_bias = 1.0
+
+    @property
+    def variant(self):
+        """Model cache variant of models processed with the current settings."""
+        if not self.enabled:
+            return None
+        return ("lod", LOD_VERSION, self.ratios, self.min_triangles)
+
+    def build_lods(self, model):
+        """Replace every dense GeomNode of the model with an LODNode, in place."""
+        start = time.perf_counter()
+        lod_nodes = 0
+        for geom_node_path in model.findAllMatches("**/+GeomNode"):
+            if self._build_lod_node(geom_node_path):
+                lod_nodes += 1
+
+        if lod_nodes:
+            logger.info(
+                "Generated LODs for %i meshes of %s in %.2f s.",
+                lod_nodes,
+                model.getName(),
+                time.perf_counter() - start,
+            )
+        return model
+
+    def _build_lod_node(self, geom_node_path):
+        geom_node = geom_node_path.node()
+        previous_triangles = count_triangles(geom_node_path)
+        if geom_node.getNumChildren() or previous_triangles < self.min_triangles:
+            return False
+
+        levels = [geom_node]
+        for ratio in self.ratios:
+            level = self._simplify_geom_node(geom_node, ratio)
+            triangles = count_triangles(NodePath(level))
+            if triangles == 0 or triangles >= previous_triangles:
+                break
+            levels.append(level)
+            previous_triangles = triangles
+        if len(levels) == 1:
+            return False
+
+        lod_node = LODNode(f"{geom_node.getName()}_lod")
+        lod_node_path = geom_node_path.getParent().attachNewNode(lod_node)
+        lod_node_path.setTransform(geom_node_path.getTransform())
+        lod_node_path.setState(geom_node_path.getState())
+
+        bounds = geom_node.getBounds()
+        radius = bounds.getRadius() if not bounds.isEmpty() else 1.0
+        if not bounds.isEmpty():
+            lod_node.setCenter(bounds.getCenter())
+
+        geom_node_path.detachNode()
+        near = 0.0
+        for index, level in enumerate(levels):
+            far = (
+                radius * LOD_SWITCH_RADII[index]
+                if index < len(levels) - 1
+                else LOD_MAX_DISTANCE
+            )
+            lod_node.addSwitch(far, near)
+            level_path = lod_node_path.attachNewNode(level)
+            level_path.setName(f"{geom_node.getName()}_lod{index}")
+            near = far
+        geom_node_path.clearTransform()
+        geom_node_path.setState(RenderState.makeEmpty())
+        return True
+
+    @staticmethod
+    def _simplify_geom_node(geom_node, ratio):
+        """Copy of the node whose Geoms index fewer of the same vertices."""
+        level = GeomNode(geom_node.getName())
+        for index in range(geom_node.getNumGeoms()):
+            geom = geom_node.getGeom(index)
+            triangles = triangle_indices(geom)
+            if not len(triangles):
+                continue
+            positions = vertex_positions(geom.getVertexData())
+            simplified = simplify_triangles(positions, triangles, ratio)
+            if not len(simplified):
+                continue
+
+            # The levels share the vertex data, only the indices differ.
+            simplified_geom = Geom(geom.getVertexData())
+            simplified_geom.addPrimitive(make_triangles(simplified))
+            level.addGeom(simplified_geom, geom_node.getGeomState(index))
+        return level
+
+    def set_lod_bias(self, lod_bias):
+        """
+        Scale every switch distance: above 1 keeps detail further away for
+        quality, below 1 drops it sooner for speed.
+        """
+        self.lod_bias = max(lod_bias, 0.01)
+        # Panda3D multiplies the squared view distance by the LOD scale.
+        self.engine.camera_controller.camera.node().setLodScale(1 / self.lod_bias**2)
+        logger.info("LOD bias set to %.2f", self.lod_bias)
+
+    def get_lod_bias(self):
+        return self.lod_bias
+
+    def get_statistics(self, root=None):
+        """
+        Triangles per level, summed over every LODNode under ``root`` (the
+        scene objects by default), and the number of LODNodes.
+        """
+        if root is None:
+            root = self.engine.scene_manager.scene_objects
+
+        level_triangles = []
+        lod_node_paths = root.findAllMatches("**/+LODNode")
+        for lod_node_path in lod_node_paths:
+            for index, level_path in enumerate(lod_node_path.getChildren()):
+                if index == len(level_triangles):
+                    level_triangles.append(0)
+                level_triangles[index] += count_triangles(level_path)
+        return {
+            "lod_nodes": lod_node_paths.getNumPaths(),
+            "level_triangles": level_triangles,
+            "lod_bias": self.lod_bias,
+        }
@@ -0,0 +1,289 @@
+import hashlib
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from panda3d.core import Filename, NodePath, VirtualFileSystem, getModelPath
+from platformdirs import user_cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+DEFAULT_CACHE_DIR = os.path.join(user_cache_dir("PandaQt"), "models")
+
+
+class _CachedRequest:
+    """Stands in for a loader request when the model is already in memory."""
+
+    def __init__(self, task_manager, callback, args):
+        self._task_manager = task_manager
+        self._task = task_manager.doMethodLater(
+            0, self._deliver, "_model_cache_deliver", extraArgs=[callback, args]
+        )
+        self._done = False
+
+    def _deliver(self, callback, args):
+        self._done = True
+        callback(*args)
+
+    def done(self):
+        return self._done
+
+    def cancel(self):
+        if not self._done:
+            self._task_manager.remove(self._task)
+            self._done = True
+
+
+class ModelCache:
+    """
+    Keeps loaded models as prototypes in an in-memory LRU bounded by a memory
+    budget, backed by BAM files on disk so a cold start skips source parsing.
+    Callers always get their own copy (or an instance) of a prototype.
+    """
+
+    def __init__(
+        self, engine, memory_budget=DEFAULT_MEMORY_BUDGET, cache_dir=DEFAULT_CACHE_DIR
+    ):
+        self.engine = engine
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.memory_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+        self._prototypes = OrderedDict()
+
+    def _resolve(self, model_path):
+        """Returns the full path and timestamp of a model, as the loader finds it."""
+        filename = Filename(model_path)
+        vfs = VirtualFileSystem.getGlobalPtr()
+        for extension in ("", "egg", "bam"):
+            if vfs.resolveFilename(filename, getModelPath().getValue(), extension):
+                return filename.getFullpath(), vfs.getFile(filename).getTimestamp()
+        return str(model_path), 0
+
+    def make_key(self, model_path, loader_options=None, variant=None):
+        """
+        ``variant`` names a processed form of the model, such as one with
+        generated LODs, so it is cached apart from the plain model.
+        """
+        fullpath, timestamp = self._resolve(model_path)
+        options = (
+            (loader_options.getFlags(), loader_options.getTextureFlags())
+            if loader_options is not None
+            else None
+        )
+        return fullpath, timestamp, options, variant
+
+    def _bam_path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.bam")
+
+    def _copy(self, prototype, parent, instance):
+        if instance:
+            return prototype.instanceTo(parent)
+        return prototype.copyTo(parent if parent is not None else NodePath())
+
+    def load_model(
+        self,
+        model_path,
+        parent=None,
+        instance=False,
+        loader_options=None,
+        variant=None,
+        build=None,
+    ):
+        """
+        Load a model through the cache. Returns a copy of the cached prototype,
+        or an instance of it under ``parent`` when ``instance`` is set.
+
+        With a ``variant``, ``build`` turns a freshly loaded model into that
+        variant before it is cached, and is skipped when it is cached already.
+        """
+        key = self.make_key(model_path, loader_options, variant)
+        prototype = self._lookup(key)
+        if prototype is None:
+            bam_path = self._bam_path(key)
+            if os.path.exists(bam_path):
+                prototype = self.engine.loader.loadModel(
+                    Filename.fromOsSpecific(bam_path), noCache=True
+                )
+                self.disk_hits += 1
+            else:
+                prototype = self._load_and_build(
+                    model_path, loader_options, build, bam_path
+                )
+            self._store(key, prototype)
+        return self._copy(prototype, parent, instance)
+
+    def _load_and_build(self, model_path, loader_options, build, bam_path):
+        """Load a model from its source, build its variant and write the BAM file."""
+        prototype = self.engine.loader.loadModel(
+            model_path, loaderOptions=loader_options
+        )
+        if build is not None:
+            build(prototype)
+        self._write_bam(prototype, bam_path)
+        return prototype
+
+    def load_model_async(
+        self,
+        model_path,
+        callback,
+        extraArgs=[],
+        loader_options=None,
+        variant=None,
+        build=None,
+    ):
+        """
+        Load a model through the cache on the loader thread. ``callback`` gets
+        a copy of the prototype (or None on failure) followed by ``extraArgs``.
+        ``variant`` and ``build`` work as for ``load_model``. A model with a
+        ``build`` step is loaded and built on the background worker instead,
+        so building it doesn't stall the main thread.
+        Returns a request that supports ``done()`` and ``cancel()``.
+        """
+        key = self.make_key(model_path, loader_options, variant)
+        prototype = self._lookup(key)
+        if prototype is not None:
+            return _CachedRequest(
+                self.engine.taskMgr,
+                callback,
+                [self._copy(prototype, None, False)] + list(extraArgs),
+            )
+
+        bam_path = self._bam_path(key)
+        from_disk = os.path.exists(bam_path)
+        if build is not None and not from_disk:
+            return self.engine.background_worker.submit(
+                self._load_and_build,
+                model_path,
+                loader_options,
+                build,
+                bam_path,
+                callback=self._on_model_built,
+                extraArgs=[key, callback, list(extraArgs)],
+            )
+        return self.engine.loader.loadModel(
+            Filename.fromOsSpecific(bam_path) if from_disk else model_path,
+            loaderOptions=None if from_disk else loader_options,
+            noCache=True if from_disk else None,
+            callback=self._on_model_loaded,
+            extraArgs=[key, bam_path, from_disk, callback, list(extraArgs)],
+        )
+
+    def _on_model_loaded(self, prototype, key, bam_path, from_disk, callback, args):
+        if prototype is None:
+            callback(None, *args)
+            return
+
+        if from_disk:
+            self.disk_hits += 1
+        else:
+            self._write_bam(prototype, bam_path)
+        self._store(key, prototype)
+        callback(self._copy(prototype, None, False), *args)
+
+    def _on_model_built(self, future, key, callback, args):
+        try:
+            prototype = future.result()
+        except Exception:  # Reported to the caller like a failed load
+            logger.exception("Could not load model %s", key[0])
+            callback(None, *args)
+            return
+        self._store(key, prototype)
+        callback(self._copy(prototype, None, False), *args)
+
+    def _lookup(self, key):
+        entry = self._prototypes.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._prototypes.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def _store(self, key, prototype):
+        size = estimate_model_size(prototype)
+        if size > self.memory_budget:
+            logger.debug("Model exceeds the cache budget, not kept: %s", key[0])
+            return
+
+        # Two misses for the same key both arrive here, keep the later one.
+        previous = self._prototypes.pop(key, None)
+        if previous is not None:
+            previous[0].removeNode()
+            self.memory_used -= previous[1]
+
+        self._prototypes[key] = (prototype, size)
+        self.memory_used += size
+        while self.memory_used > self.memory_budget:
+            evicted_key, (evicted, evicted_size) = self._prototypes.popitem(last=False)
+            evicted.removeNode()
+            self.memory_used -= evicted_size
+            self.evictions += 1
+            logger.debug("Model evicted from cache: %s", evicted_key[0])
+
+    def _write_bam(self, prototype, bam_path):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Unique per thread, worker threads may write the same model at once.
+        temp_path = f"{bam_path}.{threading.get_ident()}.tmp"
+        if prototype.writeBamFile(Filename.fromOsSpecific(temp_path)):
+            os.replace(temp_path, bam_path)
+        else:
+            logger.warning("Could not write model cache file: %s", bam_path)
+
+    def invalidate(self, model_path):
+        """Forget every cached prototype of a model, in memory and on disk."""
+        fullpath, _timestamp = self._resolve(model_path)
+        for key in [key for key in self._prototypes if key[0] == fullpath]:
+            prototype, size = self._prototypes.pop(key)
+            prototype.removeNode()
+            self.memory_used -= size
+            bam_path = self._bam_path(key)
+            if os.path.exists(bam_path):
+                os.remove(bam_path)
+        logger.debug("Model cache invalidated: %s", fullpath)
+
+    def clear(self):
+        """Drop every in-memory prototype; the disk cache is kept."""
+        for prototype, _size in self._prototypes.values():
+            prototype.removeNode()
+        self._prototypes.clear()
+        self.memory_used = 0
+
+    def stats(self):
+        return {
+            "entries": len(self._prototypes),
+            "memory_used": self.memory_used,
+            "memory_budget": self.memory_budget,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+        }
+
+
+def estimate_model_size(model, include_textures=True):
+    """
+    Approximate memory held by a model's vertex, index and texture data.
+    Textures can be left out for parts of a model that share them.
+    """
+    size = 0
+    for geom_node in model.findAllMatches("**/+GeomNode"):
+        for geom in geom_node.node().getGeoms():
+            vertex_data = geom.getVertexData()
+            for index in range(vertex_data.getNumArrays()):
+                size += vertex_data.getArray(index).getDataSizeBytes()
+            for primitive in geom.getPrimitives():
+                # Non-indexed primitives only reference a range of vertices.
+                if primitive.isIndexed():
+                    size += primitive.getDataSizeBytes()
+    if include_textures:
+        for texture in model.findAllTextures():
+            size += texture.estimateTextureMemory()
+    return size
@@ -0,0 +1,457 @@
+"""
+Object selection by rendering object IDs on demand.
+
+A click or marquee renders the scene once into a small offscreen buffer that
+covers only the picked pixels, with every pickable object drawn in a flat
+color encoding its ID. The buffer renders along with the next regular frame,
+and once that frame is read back, the region's IDs resolve to objects at a
+cost independent of how many triangles the scene has. Results arrive through
+callbacks, so picking never renders frames of its own.
+"""
+
+import bisect
+import logging
+from typing import NamedTuple, Optional
+
+import numpy as np
+from panda3d.core import (
+    AntialiasAttrib,
+    Camera,
+    ColorBlendAttrib,
+    ColorWriteAttrib,
+    ConfigVariableBool,
+    FrameBufferProperties,
+    GraphicsOutput,
+    GraphicsPipe,
+    NodePath,
+    Shader,
+    Texture,
+    TransparencyAttrib,
+    Vec4,
+    WindowProperties,
+)
+
+from .spatial_index import CULL_CAMERA_MASK
+
+logger = logging.getLogger(__name__)
+
+PICK_TAG = "pick_id"
+# Pixels around the cursor that still count as a click on an object.
+CLICK_RADIUS = 2
+# IDs are the 24 bits of an RGB8 pixel, 0 means no object.
+MAX_PICK_ID = (1 << 24) - 1
+# Above any priority the scene itself uses, so the ID pass ignores its looks.
+STATE_PRIORITY = 1000
+# Tagged with this instead of an ID, a node is left out of the ID pass, such
+# as the shader grid, whose quad only lands on the ground in its shader.
+UNPICKABLE = "unpickable"
+
+PICK_INSTANCING_VERTEX_SHADER = """
+#version 140
+
+uniform mat4 p3d_ModelViewProjectionMatrix;
+uniform samplerBuffer instance_matrices;
+
+in vec4 p3d_Vertex;
+
+flat out int instance_id;
+
+void main() {
+    int texel = gl_InstanceID * 4;
+    mat4 instance_matrix = mat4(
+        texelFetch(instance_matrices, texel),
+        texelFetch(instance_matrices, texel + 1),
+        texelFetch(instance_matrices, texel + 2),
+        texelFetch(instance_matrices, texel + 3));
+    gl_Position = p3d_ModelViewProjectionMatrix * (instance_matrix * p3d_Vertex);
+    instance_id = gl_InstanceID;
+}
+"""
+
+PICK_INSTANCING_FRAGMENT_SHADER = """
+#version 140
+
+uniform vec4 pick_id_base;
+
+flat in int instance_id;
+
+out vec4 fragment_color;
+
+void main() {
+    // The base ID's bytes plus the instance index, carried into the next byte.
+    vec3 id_bytes = floor(pick_id_base.rgb * 255.0) + vec3(instance_id % 256,
+        (instance_id / 256) % 256, instance_id / 65536);
+    id_bytes.g += floor(id_bytes.r / 256.0);
+    id_bytes.r = mod(id_bytes.r, 256.0);
+    id_bytes.b += floor(id_bytes.g / 256.0);
+    id_bytes.g = mod(id_bytes.g, 256.0);
+    fragment_color = vec4((id_bytes + 0.25) / 255.0, 1.0);
+}
+"""
+
+
+class PickResult(NamedTuple):
+    node_path: NodePath
+    # Index within an instanced set, None for ordinary objects.
+    instance: Optional[int] = None
+
+    @property
+    def name(self):
+        if self.instance is None:
+            return self.node_path.getName()
+        return f"{self.node_path.getName()}[{self.instance}]"
+
+
+def _id_color(pick_id):
+    # A quarter step above each byte, so that both rounding and truncating
+    # conversions to 8 bits give the byte back.
+    return (
+        Vec4(
+            (pick_id & 0xFF) + 0.25,
+            ((pick_id >> 8) & 0xFF) + 0.25,
+            ((pick_id >> 16) & 0xFF) + 0.25,
+            255,
+        )
+        / 255
+    )
+
+
+class ObjectPicker:
+    """
+    Resolves viewport pixels to the scene objects and instances drawn there,
+    and keeps the current selection.
+
+    Pickable objects are the ones in the SceneManager's spatial index; each
+    gets an ID, instanced sets a range of IDs with one per instance.
+    """
+
+    _instancing_shader = None
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.selection = []
+        self._entries = []
+        self._bases = []
+        self._index_version = None
+        self._instance_counts = {}
+        self._buffer = None
+        self._texture = None
+        self._camera = None
+        # (region, callback) of picks waiting for the ID buffer, and the one
+        # being rendered with the frame its readback arrives in.
+        self._requests = []
+        self._rendering = None
+
+    def _setup_buffer(self, width, height):
+        """The ID buffer, with a camera that follows the main one."""
+        fb_props = FrameBufferProperties()
+        fb_props.setRgbColor(True)
+        fb_props.setRgbaBits(8, 8, 8, 8)
+        fb_props.setDepthBits(24)
+        fb_props.setSrgbColor(False)
+        fb_props.setMultisamples(0)
+
+        self._buffer = self.engine.graphicsEngine.makeOutput(
+            self.engine.pipe,
+            "pick_buffer",
+            -10,
+            fb_props,
+            WindowProperties.size(width, height),
+            GraphicsPipe.BFRefuseWindow | GraphicsPipe.BFResizeable,
+            self.engine.win.getGsg(),
+            self.engine.win,
+        )
+        self._texture = Texture("pick_ids")
+        self._buffer.addRenderTexture(
+            self._texture, GraphicsOutput.RTM_copy_ram, GraphicsOutput.RTP_color
+        )
+        self._buffer.setClearColor((0, 0, 0, 0))
+        self._buffer.setActive(False)
+
+        main_camera = self.engine.camera_controller.camera
+        camera_node = Camera("pick_camera")
+        # Objects culled by the spatial index still count, the index only
+        # catches up with the camera in the next frame.
+        camera_node.setCameraMask(
+            main_camera.node().getCameraMask() & ~CULL_CAMERA_MASK
+        )
+        camera_node.setTagStateKey(PICK_TAG)
+        camera_node.setInitialState(self._make_initial_state())
+        self._camera = main_camera.attachNewNode(camera_node)
+        self._buffer.makeDisplayRegion().setCamera(self._camera)
+
+    @staticmethod
+    def _make_initial_state():
+        """Everything renders flat black (no object) unless tagged with an ID."""
+        state = NodePath("pick_state")
+        state.setColor(_id_color(0), STATE_PRIORITY)
+        state.setColorScaleOff(STATE_PRIORITY)
+        state.setLightOff(STATE_PRIORITY)
+        state.setMaterialOff(STATE_PRIORITY)
+        state.setTextureOff(STATE_PRIORITY)
+        state.setFogOff(STATE_PRIORITY)
+        state.setShaderOff(STATE_PRIORITY)
+        state.setTransparency(TransparencyAttrib.MNone, STATE_PRIORITY)
+        state.setAntialias(AntialiasAttrib.MNone, STATE_PRIORITY)
+        state.setAttrib(ColorBlendAttrib.makeOff(), STATE_PRIORITY)
+        return state.getState()
+
+    @staticmethod
+    def _make_unpickable_state():
+        state = NodePath("unpickable_state")
+        state.setAttrib(
+            ColorWriteAttrib.make(ColorWriteAttrib.COff), STATE_PRIORITY + 1
+        )
+        state.setDepthWrite(False, STATE_PRIORITY + 1)
+        return state.getState()
+
+    @classmethod
+    def _get_instancing_shader(cls):
+        if cls._instancing_shader is None:
+            cls._instancing_shader = Shader.make(
+                Shader.SL_GLSL,
+                PICK_INSTANCING_VERTEX_SHADER,
+                PICK_INSTANCING_FRAGMENT_SHADER,
+            )
+        return cls._instancing_shader
+
+    def _sync_ids(self):
+        """Give IDs to the pickable objects, again only after the scene changed."""
+        scene_manager = self.engine.scene_manager
+        spatial_index = scene_manager.spatial_index
+        instance_counts = {
+            instanced_set.root: instanced_set.count
+            for instanced_set in scene_manager.instanced_sets
+        }
+        if (
+            spatial_index.version == self._index_version
+            and instance_counts == self._instance_counts
+        ):
+            return
+        self._index_version = spatial_index.version
+        self._instance_counts = instance_counts
+
+        camera_node = self._camera.node()
+        camera_node.clearTagStates()
+        camera_node.setTagState(UNPICKABLE, self._make_unpickable_state())
+        self._entries.clear()
+        self._bases.clear()
+
+        next_id = 1
+        for node_path in spatial_index.node_paths:
+            if node_path is None or node_path.isEmpty():
+                continue
+            count = instance_counts.get(node_path)
+            size = 1 if count is None else max(count, 1)
+            if next_id + size - 1 > MAX_PICK_ID:
+                logger.warning("Too many objects to pick, some are not pickable.")
+                break
+
+            state = NodePath("pick_state")
+            if count is None:
+                state.setColor(_id_color(next_id), STATE_PRIORITY + 1)
+            else:
+                state.setShader(self._get_instancing_shader(), STATE_PRIORITY + 1)
+                state.setShaderInput("pick_id_base", _id_color(next_id))
+            node_path.setTag(PICK_TAG, str(next_id))
+            camera_node.setTagState(str(next_id), state.getState())
+
+            self._entries.append((next_id, node_path, count))
+            self._bases.append(next_id)
+            next_id += size
+        logger.debug("Assigned pick IDs to %i objects.", len(self._entries))
+
+    def _resolve(self, pick_id):
+        index = bisect.bisect_right(self._bases, pick_id) - 1
+        if pick_id <= 0 or index < 0:
+            return None
+        base, node_path, count = self._entries[index]
+        if count is None:
+            return PickResult(node_path) if pick_id == base else None
+        instance = pick_id - base
+        return PickResult(node_path, instance) if instance < count else None
+
+    def _render_ids(self, region, callback):
+        """
+        Renders the IDs of the window region (x, y, width, height), with
+        (x, y) its top-left corner, and calls ``callback`` with them as a
+        (height, width) array once the frame is read back.
+        """
+        self._requests.append((region, callback))
+        if not self.engine.taskMgr.hasTaskNamed("_object_picker_readback"):
+            self.engine.taskMgr.add(
+                self._readback_task, "_object_picker_readback", sort=55
+            )
+        if self._rendering is None:
+            self._start_next()
+
+    def _start_next(self):
+        """Set up the ID buffer for the oldest request, to render with the next frame."""
+        from .engine_base import PIPELINE_DEPTH
+
+        region, callback = self._requests.pop(0)
+        x, y, width, height = region
+        if self._buffer is None:
+            self._setup_buffer(width, height)
+        elif (self._buffer.getXSize(), self._buffer.getYSize()) != (width, height):
+            self._buffer.setSize(width, height)
+        self._sync_ids()
+
+        # Narrow a copy of the main lens to the region, keeping its focal
+        # length so the region is a crop of the view rather than a squeeze.
+        main_camera = self.engine.camera_controller.camera.node()
+        lens = main_camera.getLens().makeCopy()
+        window_width, window_height = (
+            self.engine.win.getXSize(),
+            self.engine.win.getYSize(),
+        )
+        film_width, film_height = lens.getFilmSize()
+        offset_x, offset_y = lens.getFilmOffset()
+        lens.setFocalLength(lens.getFocalLength())
+        lens.setFilmSize(
+            film_width * width / window_width, film_height * height / window_height
+        )
+        lens.setFilmOffset(
+            offset_x + ((x + width / 2) / window_width - 0.5) * film_width,
+            offset_y + (0.5 - (y + height / 2) / window_height) * film_height,
+        )
+        self._camera.node().setLens(lens)
+        self._camera.node().setLodScale(main_camera.getLodScale())
+        self._buffer.setActive(True)
+
+        # The ID buffer is read back together with the window's frame, like
+        # the control server's captures.
+        target_frame = (
+            self.engine.screen_texture.getImageModified().getSeq()
+            + PIPELINE_DEPTH[self.engine.threading_model]
+        )
+        self._rendering = (region, callback, target_frame)
+
+    def _readback_task(self, task):
+        """Runs after the frame is rendered and hands out the picked IDs."""
+        if self._rendering is not None:
+            (_x, _y, width, height), callback, target_frame = self._rendering
+            image_modified = self.engine.screen_texture.getImageModified().getSeq()
+            if image_modified < target_frame:
+                return task.cont
+
+            self._rendering = None
+            self._buffer.setActive(False)
+            pixels = np.frombuffer(self._texture.getRamImageAs("RGB"), dtype=np.uint8)
+            pixels = pixels.reshape(height, width, 3).astype(np.int64)
+            if not ConfigVariableBool("copy-texture-inverted", False).getValue():
+                # Textures store the bottom row first.
+                pixels = pixels[::-1]
+            callback(pixels[..., 0] | pixels[..., 1] << 8 | pixels[..., 2] << 16)
+
+        if self._requests:
+            self._start_next()
+            return task.cont
+        return task.cont if self._rendering is not None else task.done
+
+    def _clamp_region(self, left, top, right, bottom):
+        window_width, window_height = (
+            self.engine.win.getXSize(),
+            self.engine.win.getYSize(),
+        )
+        left, right = sorted((int(left), int(right)))
+        top, bottom = sorted((int(top), int(bottom)))
+        left, top = max(left, 0), max(top, 0)
+        right, bottom = min(right, window_width - 1), min(bottom, window_height - 1)
+        if left > right or top > bottom:
+            return None
+        return left, top, right - left + 1, bottom - top + 1
+
+    def pick(self, x, y, callback, radius=CLICK_RADIUS):
+        """
+        Calls ``callback`` with the object under window pixel (x, y),
+        measured from the top left, or the one nearest to it within
+        ``radius`` pixels. None if there is none.
+        """
+        region = self._clamp_region(x - radius, y - radius, x + radius, y + radius)
+        if region is None:
+            callback(None)
+            return
+        left, top, _width, _height = region
+
+        def on_ids(ids):
+            rows, columns = np.nonzero(ids)
+            if not len(rows):
+                callback(None)
+                return
+            distances = (columns + left - x) ** 2 + (rows + top - y) ** 2
+            nearest = np.argmin(distances)
+            callback(self._resolve(int(ids[rows[nearest], columns[nearest]])))
+
+        self._render_ids(region, on_ids)
+
+    def pick_rect(self, left, top, right, bottom, callback):
+        """
+        Calls ``callback`` with every object visible in the window rectangle,
+        in ID order.
+        """
+        region = self._clamp_region(left, top, right, bottom)
+        if region is None:
+            callback([])
+            return
+
+        def on_ids(ids):
+            ids = np.unique(ids)
+            results = (self._resolve(int(pick_id)) for pick_id in ids[ids > 0])
+            callback([result for result in results if result is not None])
+
+        self._render_ids(region, on_ids)
+
+    def _set_selection(self, results, extend, callback):
+        if not extend:
+            self.clear_selection()
+        self.prune_selection()
+        for result in results:
+            if result.node_path.isEmpty() or result in self.selection:
+                continue
+            self.selection.append(result)
+            if result.instance is None:
+                result.node_path.showTightBounds()
+        if callback is not None:
+            callback(self.get_selection_names())
+
+    def select_at(self, x, y, extend=False, callback=None):
+        """
+        Select the object under the pixel once the next frame is read back.
+        ``callback`` gets the selected names.
+        """
+        self.pick(
+            x,
+            y,
+            lambda result: self._set_selection(
+                [result] if result is not None else [], extend, callback
+            ),
+        )
+
+    def select_rect(self, left, top, right, bottom, extend=False, callback=None):
+        """
+        Select every object visible in the rectangle once the next frame is
+        read back. ``callback`` gets the selected names.
+        """
+        self.pick_rect(
+            left,
+            top,
+            right,
+            bottom,
+            lambda results: self._set_selection(results, extend, callback),
+        )
+
+    def clear_selection(self):
+        for result in self.selection:
+            if result.instance is None and not result.node_path.isEmpty():
+                result.node_path.hideBounds()
+        self.selection.clear()
+
+    def prune_selection(self):
+        """Drop selected objects that were removed from the scene."""
+        self.selection = [
+            result for result in self.selection if not result.node_path.isEmpty()
+        ]
+
+    def get_selection_names(self):
+        return [result.name for result in self.selection]
@@ -0,0 +1,582 @@
+"""
+Out-of-process rendering for the Panda3D engine.
+
+The child process owns the ``EngineBase`` instance and publishes every rendered
+frame into a shared-memory block. The parent process talks to it through a
+command pipe and exposes a ``RemoteEngine`` with the same surface the UI uses.
+"""
+
+import itertools
+import logging
+import multiprocessing
+import struct
+from functools import partial
+from multiprocessing import shared_memory
+
+from panda3d.core import LVecBase3f, Vec3
+from PySide6.QtCore import QTimer, Slot
+from PySide6.QtGui import QImage
+
+from ..utils.tile_diff import compute_dirty_tiles
+from .camera_controller import CameraMode
+from .engine_base import EngineBaseNotifier
+from .frame_recorder import DEFAULT_MAX_FRAMES, FrameRecorder
+
+logger = logging.getLogger(__name__)
+
+# Frame counter, last applied command, width, height, camera mode, fps,
+# camera position (x, y, z) and camera orientation (h, p, r).
+FRAME_HEADER = struct.Struct("<QQIIIf6d")
+FRAME_DATA_OFFSET = 128
+INITIAL_FRAME_CAPACITY = 1920 * 1080 * 4
+QUERY_TIMEOUT = 1.0
+
+REMOTE_SUBSYSTEMS = {
+    "camera_controller",
+    "scene_manager",
+    "lighting_system",
+    "profile_manager",
+    "lod_manager",
+    "model_cache",
+    "object_picker",
+    "geometry_streamer",
+    "texture_manager",
+}
+# Queries answered through a callback, once the next frame is read back.
+DEFERRED_QUERIES = {("object_picker", "select_at"), ("object_picker", "select_rect")}
+REMOTE_ENGINE_METHODS = {
+    "update_window_size",
+    "start_frame_capture",
+    "stop_frame_capture",
+}
+
+
+class _RenderProcessHost:
+    """Runs inside the child process and serves commands from the UI process."""
+
+    def __init__(
+        self,
+        connection,
+        shm_name,
+        fps_cap,
+        enable_hd_renderer,
+        threading_model,
+        snapshot_path,
+    ):
+        from .engine_base import EngineBase
+
+        self.connection = connection
+        self.shm = None
+        self.frame_counter = 0
+        self.last_command = 0
+        self.publishing = False
+
+        self.engine = EngineBase(
+            fps_cap,
+            enable_hd_renderer,
+            threading_model,
+            snapshot_path=snapshot_path,
+        )
+        self._attach_shared_memory(shm_name)
+
+        self.engine.taskMgr.add(self._process_commands_task, "_render_commands", -100)
+        self.engine.taskMgr.add(self._publish_frame_task, "_render_publish", 55)
+
+    def _attach_shared_memory(self, shm_name):
+        if self.shm is not None:
+            self.shm.close()
+        self.frame_counter = 0
+        try:
+            self.shm = shared_memory.SharedMemory(name=shm_name)
+        except FileNotFoundError:
+            # Replaced by the UI process before we got to it, an "attach"
+            # command with the new block is already queued.
+            logger.debug("Frame buffer %s is gone, waiting for a new one.", shm_name)
+            self.shm = None
+
+    def _process_commands_task(self, task):
+        try:
+            while self.connection.poll():
+                self._handle_command(*self.connection.recv())
+        except (EOFError, OSError):
+            logger.warning("UI process went away, shutting down renderer.")
+            self.engine.stop()
+        return task.cont
+
+    def _handle_command(self, command_id, kind, target, method, args, kwargs):
+        result, error = None, None
+        try:
+            if kind == "attach":
+                self._attach_shared_memory(*args)
+            elif kind == "stop":
+                self.connection.close()
+                self.engine.stop()
+            elif kind == "query" and (target, method) in DEFERRED_QUERIES:
+                kwargs["callback"] = partial(self._reply, command_id)
+                self._dispatch(target, method, args, kwargs)
+                self.last_command = command_id
+                return
+            else:
+                result = self._dispatch(target, method, args, kwargs)
+        except Exception as exception:  # Reported back to the caller
+            logger.exception("Remote call %s.%s failed.", target, method)
+            error = repr(exception)
+
+        self.last_command = command_id
+        if kind == "query":
+            self._reply(command_id, result, error)
+
+    def _reply(self, command_id, result, error=None):
+        if isinstance(result, LVecBase3f):
+            result = tuple(result)
+        self.connection.send((command_id, result, error))
+
+    def _dispatch(self, target, method, args, kwargs):
+        if target == "engine":
+            if method not in REMOTE_ENGINE_METHODS:
+                raise AttributeError(f"Engine method not exposed: {method}")
+            if method == "start_frame_capture":
+                self.publishing = True
+                return None
+            if method == "stop_frame_capture":
+                self.publishing = False
+                return None
+            return getattr(self.engine, method)(*args, **kwargs)
+
+        if target not in REMOTE_SUBSYSTEMS or method.startswith("_"):
+            raise AttributeError(f"Remote call not exposed: {target}.{method}")
+        return getattr(getattr(self.engine, target), method)(*args, **kwargs)
+
+    def _publish_frame_task(self, task):
+        if not self.publishing or self.shm is None:
+            return task.cont
+
+        texture = self.engine.screen_texture
+        width, height = texture.getXSize(), texture.getYSize()
+        ram_image = texture.getRamImage()
+        size = width * height * 4
+        if len(ram_image) != size or FRAME_DATA_OFFSET + size > self.shm.size:
+            return task.cont
+
+        camera_controller = self.engine.camera_controller
+        if camera_controller.mode == CameraMode.ORBIT:
+            position = camera_controller.camera.getPos(camera_controller.gimbal)
+            orientation = camera_controller.gimbal.getHpr()
+        else:
+            position = camera_controller.camera.getPos()
+            orientation = camera_controller.camera.getHpr()
+
+        # Odd frame counter while writing, the reader drops torn frames.
+        buffer = self.shm.buf
+        struct.pack_into("<Q", buffer, 0, self.frame_counter + 1)
+        buffer[FRAME_DATA_OFFSET : FRAME_DATA_OFFSET + size] = memoryview(ram_image)
+        self.frame_counter += 2
+        FRAME_HEADER.pack_into(
+            buffer,
+            0,
+            self.frame_counter,
+            self.last_command,
+            width,
+            height,
+            camera_controller.mode.value,
+            self.engine.clock.getAverageFrameRate(),
+            *position,
+            *orientation,
+        )
+        return task.cont
+
+
+def _render_process_main(
+    connection, shm_name, fps_cap, enable_hd_renderer, threading_model, snapshot_path
+):
+    """Entry point of the render process."""
+    from PySide6.QtWidgets import QApplication
+
+    logging.basicConfig(format="%(levelname)s: %(message)s", level=logging.INFO)
+
+    # EngineBase may show a QMessageBox, which needs an application object.
+    app = QApplication(["PandaQt Renderer"])  # noqa: F841
+    host = _RenderProcessHost(
+        connection,
+        shm_name,
+        fps_cap,
+        enable_hd_renderer,
+        threading_model,
+        snapshot_path,
+    )
+    host.engine.run()
+
+
+class _RemoteSubsystem:
+    """Forwards method calls to a subsystem of the engine in the render process."""
+
+    QUERY_METHODS = set()
+
+    def __init__(self, remote_engine, name):
+        self._remote_engine = remote_engine
+        self._name = name
+
+    def __getattr__(self, method):
+        if method.startswith("_"):
+            raise AttributeError(method)
+
+        def _remote_call(*args, **kwargs):
+            if method in self.QUERY_METHODS:
+                return self._remote_engine.query(self._name, method, *args, **kwargs)
+            self._remote_engine.post(self._name, method, *args, **kwargs)
+
+        return _remote_call
+
+
+class _RemoteSceneManager(_RemoteSubsystem):
+    QUERY_METHODS = {
+        "is_grid_visible",
+        "is_axis_indicator_visible",
+        "is_scene_optimized",
+        "optimize_scene",
+        "get_scene_statistics",
+        "get_spatial_index_statistics",
+        "get_actor_statistics",
+        "save_snapshot",
+    }
+
+
+class _RemoteLightingSystem(_RemoteSubsystem):
+    QUERY_METHODS = {"get_light_statistics", "get_shadow_statistics"}
+
+
+class _RemoteLodManager(_RemoteSubsystem):
+    QUERY_METHODS = {"get_lod_bias", "get_statistics"}
+
+
+class _RemoteModelCache(_RemoteSubsystem):
+    QUERY_METHODS = {"stats"}
+
+
+class _RemoteObjectPicker(_RemoteSubsystem):
+    QUERY_METHODS = {"get_selection_names"}
+
+    def select_at(self, x, y, extend=False, callback=None):
+        names = self._remote_engine.query(self._name, "select_at", x, y, extend)
+        if callback is not None:
+            callback(names)
+
+    def select_rect(self, left, top, right, bottom, extend=False, callback=None):
+        names = self._remote_engine.query(
+            self._name, "select_rect", left, top, right, bottom, extend
+        )
+        if callback is not None:
+            callback(names)
+
+
+class _RemoteGeometryStreamer(_RemoteSubsystem):
+    QUERY_METHODS = {"get_statistics"}
+
+
+class _RemoteTextureManager(_RemoteSubsystem):
+    QUERY_METHODS = {"get_statistics", "get_texture_report"}
+
+
+class _RemoteCameraController(_RemoteSubsystem):
+    """
+    Camera proxy answering pose queries from the latest published frame,
+    or from the last locally requested pose until the renderer applied it.
+    """
+
+    camera_mode = CameraMode
+
+    def __init__(self, remote_engine):
+        super().__init__(remote_engine, "camera_controller")
+        self._pending = {}
+
+    @property
+    def mode(self):
+        pending = self._pending_value("mode")
+        if pending is not None:
+            return pending
+        return CameraMode(self._remote_engine.frame_state["mode"])
+
+    def set_mode(self, mode):
+        self._pending.clear()
+        self._remember(
+            "mode", mode, self._remote_engine.post(self._name, "set_mode", mode)
+        )
+
+    def set_position(self, x=None, y=None, z=None):
+        current = self.get_position()
+        position = Vec3(
+            x if x is not None else current.x,
+            y if y is not None else current.y,
+            z if z is not None else current.z,
+        )
+        command_id = self._remote_engine.post(self._name, "set_position", x, y, z)
+        self._remember("position", position, command_id)
+
+    def set_orientation(self, h=None, p=None, r=None):
+        current = self.get_orientation()
+        orientation = Vec3(
+            h if h is not None else current.x,
+            p if p is not None else current.y,
+            r if r is not None else current.z,
+        )
+        command_id = self._remote_engine.post(self._name, "set_orientation", h, p, r)
+        self._remember("orientation", orientation, command_id)
+
+    def get_position(self):
+        pending = self._pending_value("position")
+        if pending is not None:
+            return Vec3(pending)
+        return Vec3(*self._remote_engine.frame_state["position"])
+
+    def get_orientation(self):
+        pending = self._pending_value("orientation")
+        if pending is not None:
+            return Vec3(pending)
+        return Vec3(*self._remote_engine.frame_state["orientation"])
+
+    def _remember(self, key, value, command_id):
+        self._pending[key] = (value, command_id)
+
+    def _pending_value(self, key):
+        if key not in self._pending:
+            return None
+        value, command_id = self._pending[key]
+        if self._remote_engine.frame_state["last_command"] >= command_id:
+            del self._pending[key]
+            return None
+        return value
+
+
+class RemoteEngine:
+    """
+    Drop-in replacement for ``EngineBase`` that renders in a child process.
+
+    Frames arrive through shared memory and are re-emitted on the same
+    notifier signals, so the UI thread never waits on the renderer.
+    """
+
+    def __init__(
+        self,
+        fps_cap=60,
+        enable_hd_renderer=False,
+        threading_model="single",
+        snapshot_path=None,
+    ):
+        self.fps_cap = fps_cap
+        self.enable_hd_renderer = enable_hd_renderer
+        self.threading_model = threading_model
+        self.snapshot_path = snapshot_path
+        self.notifier = EngineBaseNotifier(self)
+        self.frame_state = {
+            "last_command": 0,
+            "mode": CameraMode.ORBIT.value,
+            "position": (0, -15, 3),
+            "orientation": (0, 0, 0),
+        }
+
+        self._context = multiprocessing.get_context("spawn")
+        self._command_ids = itertools.count(1)
+        self._last_frame = 0
+        self._window_size = None
+        self._capturing = False
+        self._process = None
+        self._connection = None
+        self.frame_recorder = None
+        self.previous_image_data = None
+        self.shm = shared_memory.SharedMemory(
+            create=True, size=FRAME_DATA_OFFSET + INITIAL_FRAME_CAPACITY
+        )
+
+        self.camera_controller = _RemoteCameraController(self)
+        self.scene_manager = _RemoteSceneManager(self, "scene_manager")
+        self.lighting_system = _RemoteLightingSystem(self, "lighting_system")
+        self.profile_manager = _RemoteSubsystem(self, "profile_manager")
+        self.lod_manager = _RemoteLodManager(self, "lod_manager")
+        self.model_cache = _RemoteModelCache(self, "model_cache")
+        self.object_picker = _RemoteObjectPicker(self, "object_picker")
+        self.geometry_streamer = _RemoteGeometryStreamer(self, "geometry_streamer")
+        self.texture_manager = _RemoteTextureManager(self, "texture_manager")
+
+        self._start_process()
+        self._setup_timer()
+
+    def _start_process(self):
+        self._connection, child_connection = self._context.Pipe()
+        self._process = self._context.Process(
+            target=_render_process_main,
+            args=(
+                child_connection,
+                self.shm.name,
+                self.fps_cap,
+                self.enable_hd_renderer,
+                self.threading_model,
+                self.snapshot_path,
+            ),
+            name="PandaQt Renderer",
+            daemon=True,
+        )
+        self._process.start()
+        child_connection.close()
+        self._last_frame = 0
+        logger.info("Render process started (pid %i).", self._process.pid)
+
+        if self._window_size is not None:
+            self.post("engine", "update_window_size", *self._window_size)
+        if self._capturing:
+            self.post("engine", "start_frame_capture")
+
+    def _setup_timer(self):
+        self.poll_timer = QTimer()
+        self.poll_timer.timeout.connect(self._poll_frame)
+        self.poll_timer.setInterval(round(1000 / self.fps_cap))
+
+    def _send(self, message):
+        try:
+            self._connection.send(message)
+        except (BrokenPipeError, EOFError, OSError):
+            logger.error("Render process is unreachable, restarting it.")
+            self._restart_process()
+
+    def _restart_process(self):
+        if self._process is not None and self._process.is_alive():
+            self._process.kill()
+        self._process.join(timeout=QUERY_TIMEOUT)
+        self._connection.close()
+        self._start_process()
+
+    def post(self, target, method, *args, **kwargs):
+        """Send a call to the render process without waiting for it."""
+        command_id = next(self._command_ids)
+        self._send((command_id, "post", target, method, args, kwargs))
+        return command_id
+
+    def query(self, target, method, *args, **kwargs):
+        """Send a call to the render process and wait for its result."""
+        command_id = next(self._command_ids)
+        self._send((command_id, "query", target, method, args, kwargs))
+        while self._connection.poll(QUERY_TIMEOUT):
+            reply_id, result, error = self._connection.recv()
+            if reply_id != command_id:
+                continue
+            if error is not None:
+                raise RuntimeError(f"Remote call {target}.{method} failed: {error}")
+            return result
+        raise TimeoutError(f"Remote call {target}.{method} timed out.")
+
+    @Slot()
+    def _poll_frame(self):
+        if not self._process.is_alive():
+            logger.error(
+                "Render process exited with code %s, restarting it.",
+                self._process.exitcode,
+            )
+            self._restart_process()
+            return
+
+        buffer = self.shm.buf
+        (
+            frame,
+            last_command,
+            width,
+            height,
+            mode,
+            fps,
+            *pose,
+        ) = FRAME_HEADER.unpack_from(buffer, 0)
+        if frame == self._last_frame or frame % 2:
+            return
+
+        size = width * height * 4
+        image_data = bytes(buffer[FRAME_DATA_OFFSET : FRAME_DATA_OFFSET + size])
+        if struct.unpack_from("<Q", buffer, 0)[0] != frame:
+            logger.debug("Frame from render process skipped: Torn read")
+            return
+
+        self._last_frame = frame
+        dirty_tiles = compute_dirty_tiles(
+            image_data, self.previous_image_data, width, height
+        )
+        self.frame_state.update(
+            last_command=last_command,
+            mode=mode,
+            position=tuple(pose[:3]),
+            orientation=tuple(pose[3:]),
+        )
+        self.notifier.fps_updated.emit(round(fps))
+        if not dirty_tiles:
+            return
+
+        if self.frame_recorder is not None:
+            if not self.frame_recorder.append(image_data, width, height):
+                if self.frame_recorder.is_full:
+                    logger.warning("Recording is full, stopping it.")
+                    self.stop_recording()
+
+        q_image = QImage(image_data, width, height, width * 4, QImage.Format_ARGB32)
+        self.notifier.frame_captured.emit(q_image)
+        self.notifier.frame_updated.emit(q_image, dirty_tiles)
+        self.previous_image_data = image_data
+
+    def _ensure_frame_capacity(self, width, height):
+        required = FRAME_DATA_OFFSET + width * height * 4
+        if required <= self.shm.size:
+            return
+
+        old_shm = self.shm
+        self.shm = shared_memory.SharedMemory(create=True, size=required)
+        self._send(
+            (next(self._command_ids), "attach", None, None, (self.shm.name,), {})
+        )
+        self._last_frame = 0
+        old_shm.close()
+        old_shm.unlink()
+        logger.debug("Frame buffer grown to %i bytes.", required)
+
+    @Slot()
+    def start_frame_capture(self):
+        self._capturing = True
+        self.post("engine", "start_frame_capture")
+        self.poll_timer.start()
+
+    @Slot()
+    def stop_frame_capture(self):
+        self._capturing = False
+        self.post("engine", "stop_frame_capture")
+        self.poll_timer.stop()
+
+    @Slot(int, int)
+    def update_window_size(self, width, height):
+        self._window_size = (width, height)
+        self._ensure_frame_capacity(width, height)
+        self.post("engine", "update_window_size", width, height)
+
+    def start_recording(self, path, max_frames=DEFAULT_MAX_FRAMES):
+        """Record frames as they arrive from the render process."""
+        self.stop_recording()
+        width, height = self._window_size or (1, 1)
+        self.frame_recorder = FrameRecorder(path, max_frames, width, height)
+
+    def stop_recording(self):
+        if self.frame_recorder is None:
+            return 0
+        frame_count = self.frame_recorder.close()
+        self.frame_recorder = None
+        return frame_count
+
+    def run(self):
+        """The render process runs its own loop; nothing to drive here."""
+
+    def stop(self):
+        self.poll_timer.stop()
+        self.stop_recording()
+        try:
+            self._connection.send((next(self._command_ids), "stop", None, None, (), {}))
+        except (BrokenPipeError, EOFError, OSError):
+            pass
+        self._process.join(timeout=QUERY_TIMEOUT * 2)
+        if self._process.is_alive():
+            self._process.kill()
+        self._connection.close()
+        self.shm.close()
+        self.shm.unlink()
+        logger.info("Render process stopped.")
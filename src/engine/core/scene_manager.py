@@ -1,88 +1,618 @@
 import logging
+import time
+
+from panda3d.core import NodePath
+from PySide6.QtCore import QObject, Signal
 
 from ..utils.axis_maker import AxisIndicator
+from ..utils.geom_arrays import DEFAULT_CHUNK_SIZE, make_geometry
 from ..utils.grid_maker import SceneGridMaker
+from ..utils.scene_optimizer import analyze_scene, build_optimized_scene
+from ..utils.spatial_chunks import DEFAULT_CHUNK_DIVISIONS
+from .actor_manager import ActorManager
+from .asset_watcher import MODEL_PATH_TAG, AssetWatcher
+from .axis_gizmo import AxisGizmo
+from .instancing import InstancedSet, compose_matrices
+from .object_picker import PICK_TAG, UNPICKABLE
+from .scene_snapshot import DEFAULT_SNAPSHOT_PATH, SceneSnapshot
+from .spatial_index import SpatialIndex
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_MODEL_PATH = "models/panda"
+DEFAULT_MODEL_SCALE = 0.5
+OPTIMIZATION_STATISTICS = ("nodes", "geoms", "draw_calls", "render_states", "textures")
+
+
+class SceneManagerNotifier(QObject):
+    load_started = Signal(int)
+    load_progress = Signal(int, int)
+    load_finished = Signal(list)
+    load_failed = Signal(str)
+    stream_ready = Signal(str)
+    stream_failed = Signal(str, str)
+
+
+class _PendingLoad:
+    """Models of one asynchronous load, kept apart until all have arrived."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.models = [None] * len(entries)
+        self.loaded = 0
+        self.requests = []
+
+    def cancel(self):
+        for request in self.requests:
+            if not request.done():
+                request.cancel()
+        for model in self.models:
+            if model is not None:
+                model.removeNode()
+
 
 class SceneManager:
-    def __init__(self, engine):
+    def __init__(self, engine, snapshot=None):
         self.engine = engine
+        self.notifier = SceneManagerNotifier()
         self.scene_objects = self.engine.render.attachNewNode("scene_objects")
         self.scene_objects.setBin("fixed", -5)
+        # Instanced sets live apart from the scene objects, optimizing the
+        # scene must not flatten them into ordinary geometry.
+        self.instanced_objects = self.engine.render.attachNewNode("instanced_objects")
+        self.instanced_objects.setBin("fixed", -5)
+        self.instanced_sets = []
+        # Streamed assets are loaded chunk by chunk, also kept out of optimizing.
+        self.streamed_objects = self.engine.render.attachNewNode("streamed_objects")
+        self.streamed_objects.setBin("fixed", -5)
+        self.actor_objects = self.engine.render.attachNewNode("actor_objects")
+        self.actor_objects.setBin("fixed", -5)
+        self._grid_visible = True
+        self._axis_indicator_visible = True
+        self._pending_load = None
+        self._original_objects = None
+        self.spatial_index = SpatialIndex(self.engine)
+        self.asset_watcher = AssetWatcher(self.engine, self)
+        self.actor_manager = ActorManager(self.engine, self.actor_objects)
 
-        self._setup_scene()
+        self._setup_scene(snapshot)
 
-    def _setup_scene(self):
+    def _setup_scene(self, snapshot=None):
+        # Not saved in snapshots, whether the grid can use a shader depends on
+        # the GSG it is restored with.
         self.grid_maker = SceneGridMaker()
-        self.grid = self.grid_maker.create_grid()
-        self.grid.reparentTo(self.engine.render)
-        self.grid.setLightOff()
-        self.grid.setBin("fixed", 0)
+        if self._supports_shader_grid():
+            self._setup_grid(self.grid_maker.create_shader_grid())
+        else:
+            self._setup_grid(self.grid_maker.create_grid())
+        if snapshot is not None:
+            self._restore_snapshot(snapshot)
+            return
         self._create_axis_indicator()
         self.load_objects()
 
-    def _create_axis_indicator(self):
-        self.axis_maker = AxisIndicator(loader=self.engine.loader)
-        self.axis_indicator = self.axis_maker.get_axis_node()
+    def _supports_shader_grid(self):
+        gsg = self.engine.win.getGsg() if self.engine.win is not None else None
+        return gsg is not None and gsg.getSupportsGlsl()
 
-        axis_parent_node = self.engine.aspect2d.attachNewNode("axis_parent_node")
-        axis_parent_node.setScale(0.125)
-        axis_parent_node.setPos(1.1, 0, 0.8)
-        axis_parent_node.reparentTo(self.engine.aspect2d)
+    def _setup_grid(self, grid):
+        self.grid = grid
+        self.grid.reparentTo(self.engine.render)
+        self.grid.setLightOff()
+        self.grid.setBin("fixed", 0)
+        self.grid.setTag(PICK_TAG, UNPICKABLE)
 
-        self.axis_indicator.reparentTo(axis_parent_node)
+    def _create_axis_indicator(self, axis_indicator=None):
+        if axis_indicator is None:
+            self.axis_maker = AxisIndicator(loader=self.engine.loader)
+            axis_indicator = self.axis_maker.get_axis_node()
+        self.axis_indicator = axis_indicator
         self.axis_indicator.setTransparency(True)
         self.axis_indicator.setDepthTest(True)
         self.axis_indicator.setDepthWrite(True)
+        self.axis_gizmo = AxisGizmo(self.engine, self.axis_indicator)
+
+    @staticmethod
+    def _scene_entries(model_paths):
+        """Pairs each model path with its scale, the default scene if none given."""
+        if model_paths is None:
+            return [(DEFAULT_MODEL_PATH, DEFAULT_MODEL_SCALE)]
+        return [(model_path, 1) for model_path in model_paths]
 
-        self.engine.taskMgr.doMethodLater(
-            0.25,
-            self._set_axis_compass,
-            "_set_axis_compass",
+    def _attach_models(self, entries, models):
+        for (model_path, scale), model in zip(entries, models):
+            model.reparentTo(self.scene_objects)
+            model.setScale(scale)
+            model.setPos(0, 0, 0)
+            model.setTag(MODEL_PATH_TAG, str(model_path))
+            self.engine.texture_manager.manage_model(model)
+        self._index_scene()
+        self.asset_watcher.watch(self._source_objects())
+        logger.info("Scene objects loaded.")
+
+    def _source_objects(self):
+        """The scene objects as loaded, the originals if the scene is optimized."""
+        if self._original_objects is not None:
+            return list(self._original_objects)
+        return list(self.scene_objects.getChildren())
+
+    def _index_scene(self):
+        """Rebuild the spatial index over all scene objects."""
+        self.spatial_index.rebuild(
+            list(self.scene_objects.getChildren())
+            + [instanced_set.root for instanced_set in self.instanced_sets]
+            + [asset.root for asset in self.engine.geometry_streamer.assets]
+            + list(self.actor_manager.actors)
         )
 
-    def _set_axis_compass(self, task):
-        self.axis_indicator.setCompass(self.engine.camera_controller.gimbal)
-        return
+    def _load_scene_model(self, model_path):
+        """Load a scene model with generated LODs, through the model cache."""
+        lod_manager = self.engine.lod_manager
+        return self.engine.model_cache.load_model(
+            model_path,
+            variant=lod_manager.variant,
+            build=lod_manager.build_lods if lod_manager.enabled else None,
+        )
 
-    def load_objects(self):
+    def load_objects(self, model_paths=None):
+        """Load models synchronously, replacing the current scene."""
+        self.cancel_loading()
         self.unload_objects()
 
-        panda_model = self.engine.loader.loadModel("models/panda")
-        panda_model.reparentTo(self.scene_objects)
-        panda_model.setScale(0.5)
-        panda_model.setPos(0, 0, 0)
-        logger.info("Scene objects loaded.")
+        entries = self._scene_entries(model_paths)
+        models = [self._load_scene_model(path) for path, _scale in entries]
+        self._attach_models(entries, models)
+
+    def load_objects_async(self, model_paths=None):
+        """
+        Load models on Panda3D's loader thread. The current scene keeps
+        rendering until every model has arrived, then it is swapped out.
+        """
+        self.cancel_loading()
+
+        entries = self._scene_entries(model_paths)
+        pending_load = _PendingLoad(entries)
+        self._pending_load = pending_load
+        self.notifier.load_started.emit(len(entries))
+
+        for index, (model_path, _scale) in enumerate(entries):
+            lod_manager = self.engine.lod_manager
+            request = self.engine.model_cache.load_model_async(
+                model_path,
+                callback=self._on_model_loaded,
+                extraArgs=[pending_load, index],
+                variant=lod_manager.variant,
+                build=lod_manager.build_lods if lod_manager.enabled else None,
+            )
+            pending_load.requests.append(request)
+
+    def cancel_loading(self):
+        """Drop an asynchronous load that is still in progress."""
+        if self._pending_load is not None:
+            self._pending_load.cancel()
+            self._pending_load = None
+            logger.info("Pending scene load cancelled.")
+
+    def is_loading(self):
+        return self._pending_load is not None
+
+    def _on_model_loaded(self, model, pending_load, index):
+        """Called on the main thread by the loader for every finished model."""
+        if pending_load is not self._pending_load:
+            if model is not None:
+                model.removeNode()
+            return
+
+        model_path = pending_load.entries[index][0]
+        if model is None:
+            self.cancel_loading()
+            logger.error("Could not load model: %s", model_path)
+            self.notifier.load_failed.emit(model_path)
+            return
+
+        pending_load.models[index] = model
+        pending_load.loaded += 1
+        total = len(pending_load.entries)
+        self.notifier.load_progress.emit(pending_load.loaded, total)
+        logger.debug("Model loaded (%i/%i): %s", pending_load.loaded, total, model_path)
+
+        if pending_load.loaded == total:
+            self._pending_load = None
+            self.unload_objects()
+            self._attach_models(pending_load.entries, pending_load.models)
+            self.notifier.load_finished.emit(
+                [model_path for model_path, _scale in pending_load.entries]
+            )
+
+    def reload_model(self, model_path):
+        """
+        Load a model again, bypassing the model cache, and swap it in for the
+        scene objects loaded from it, keeping their transforms, render states
+        and tags. The rest of the scene is left alone.
+        """
+        self.engine.model_cache.invalidate(model_path)
+        lod_manager = self.engine.lod_manager
+        return self.engine.model_cache.load_model_async(
+            model_path,
+            callback=self._on_model_reloaded,
+            extraArgs=[model_path, time.perf_counter()],
+            variant=lod_manager.variant,
+            build=lod_manager.build_lods if lod_manager.enabled else None,
+        )
+
+    def _on_model_reloaded(self, model, model_path, start):
+        if model is None:
+            logger.error("Could not reload model: %s", model_path)
+            self.notifier.load_failed.emit(model_path)
+            return
+
+        optimized = self._original_objects is not None
+        source_objects = self._source_objects()
+        replaced = 0
+        for index, old_object in enumerate(source_objects):
+            if old_object.getTag(MODEL_PATH_TAG) != model_path:
+                continue
+            new_object = model.copyTo(old_object.getParent())
+            self.engine.texture_manager.manage_model(new_object)
+            new_object.setName(old_object.getName())
+            new_object.setTransform(old_object.getTransform())
+            new_object.setState(old_object.getState())
+            for key in old_object.node().getTagKeys():
+                new_object.setTag(key, old_object.getTag(key))
+            if not optimized:
+                self.spatial_index.remove(old_object)
+                self.spatial_index.add(new_object)
+            self.engine.texture_manager.release_model(old_object)
+            old_object.removeNode()
+            source_objects[index] = new_object
+            replaced += 1
+        model.removeNode()
+
+        if optimized:
+            # The optimized copy has the old model flattened in.
+            self._original_objects = source_objects
+            self.optimize_scene()
+        self.engine.object_picker.prune_selection()
+        self.asset_watcher.watch(self._source_objects())
+        logger.info(
+            "Reloaded %s into %i objects in %.1f ms.",
+            model_path,
+            replaced,
+            (time.perf_counter() - start) * 1000,
+        )
+
+    def save_snapshot(self, path=DEFAULT_SNAPSHOT_PATH):
+        """
+        Save the scene objects, axis indicator, lights and camera to a
+        snapshot that ``EngineBase`` restores at startup in one read, see
+        ``SceneSnapshot``. Instanced sets, streamed models, actors and
+        managed lights are built from code or loaded on demand, and are not
+        saved.
+        """
+        start = time.perf_counter()
+        if (
+            self.instanced_sets
+            or self.engine.geometry_streamer.assets
+            or self.actor_manager.actors
+            or self.engine.lighting_system.light_manager.lights
+        ):
+            logger.warning(
+                "Instanced sets, streamed models, actors and managed lights "
+                "are not saved in scene snapshots."
+            )
+
+        lighting_system = self.engine.lighting_system
+        light_nodes, lighting_state = lighting_system.get_snapshot_nodes()
+        root = NodePath("scene_snapshot")
+        self.scene_objects.instanceTo(root)
+        if self._original_objects is not None:
+            original_objects = root.attachNewNode("original_objects")
+            for original_object in self._original_objects:
+                original_object.instanceTo(original_objects)
+        for node_path in [self.axis_indicator] + light_nodes:
+            node_path.instanceTo(root)
+
+        metadata = {
+            "models": self.asset_watcher.get_model_signatures(),
+            "textures": self.engine.texture_manager.get_sources(root.findAllTextures()),
+            "lighting": lighting_state,
+            "camera": self.engine.camera_controller.get_state(),
+        }
+        # Objects hidden by coarse culling must not be saved hidden.
+        self.spatial_index.rebuild([])
+        try:
+            SceneSnapshot(root, metadata).write(path)
+        finally:
+            for node_path in root.getChildren():
+                node_path.detachNode()
+            self._index_scene()
+        logger.info(
+            "Scene snapshot saved in %.1f ms: %s",
+            (time.perf_counter() - start) * 1000,
+            path,
+        )
+
+    def _restore_snapshot(self, snapshot):
+        """
+        Take the scene from a snapshot read at startup. Models changed since
+        it was saved are reloaded from their files afterwards.
+        """
+        self._create_axis_indicator(snapshot.take("axis_indicator"))
+
+        scene_objects = snapshot.take("scene_objects")
+        for scene_object in scene_objects.getChildren():
+            scene_object.reparentTo(self.scene_objects)
+        original_objects = snapshot.take("original_objects")
+        if original_objects is not None:
+            self._original_objects = list(original_objects.getChildren())
+            for original_object in self._original_objects:
+                original_object.detachNode()
+
+        for scene_object in self._source_objects():
+            self.engine.texture_manager.manage_model(scene_object)
+        self._index_scene()
+        self.asset_watcher.watch(self._source_objects())
+
+        signatures = self.asset_watcher.get_model_signatures()
+        for model_path, signature in snapshot.metadata["models"].items():
+            if model_path in signatures and signatures[model_path] != signature:
+                self.reload_model(model_path)
+        logger.info("Scene restored from snapshot.")
 
     def unload_objects(self):
+        """
+        Remove the loaded scene objects. Instanced sets, streamed models and
+        actors stay, ``clear_scene`` removes those too.
+        """
+        texture_manager = self.engine.texture_manager
+        for scene_object in self._source_objects():
+            texture_manager.release_model(scene_object)
+        self._original_objects = None
+        self.asset_watcher.watch([])
         if self.scene_objects.getNumChildren() > 0:
             self.scene_objects.getChildren().detach()
             logger.info("Scene objects unloaded.")
+        self._index_scene()
+
+    def clear_scene(self):
+        """Remove everything added to the scene, not only the loaded objects."""
+        self.cancel_loading()
+        self.clear_instances()
+        self.engine.geometry_streamer.clear()
+        self.actor_manager.clear()
+        self.unload_objects()
+        logger.info("Scene cleared.")
+
+    def add_instances(
+        self, model, transforms=None, positions=None, hprs=None, scales=None
+    ):
+        """
+        Place many copies of one model, drawn with hardware instancing.
+
+        ``model`` is a NodePath or a model path. Transforms are given either as
+        an (N, 4, 4) array of Panda3D matrices or as position, HPR and scale
+        arrays. Returns the InstancedSet, whose transforms can be updated in bulk.
+        """
+        if transforms is None:
+            if positions is None:
+                raise ValueError("Either transforms or positions are required.")
+            transforms = compose_matrices(positions, hprs, scales)
+        if not isinstance(model, NodePath):
+            model = self.engine.model_cache.load_model(model)
+
+        instanced_set = InstancedSet(
+            model,
+            self.instanced_objects,
+            transforms,
+            name=f"{model.getName()}_instances",
+        )
+        self.instanced_sets.append(instanced_set)
+        self.spatial_index.add(instanced_set.root)
+        logger.info("Added %i instances of %s.", instanced_set.count, model.getName())
+        return instanced_set
+
+    def remove_instances(self, instanced_set):
+        self.instanced_sets.remove(instanced_set)
+        self.spatial_index.remove(instanced_set.root)
+        instanced_set.remove()
+
+    def clear_instances(self):
+        for instanced_set in self.instanced_sets:
+            self.spatial_index.remove(instanced_set.root)
+            instanced_set.remove()
+        self.instanced_sets.clear()
+
+    def stream_model(self, model_path, divisions=DEFAULT_CHUNK_DIVISIONS):
+        """
+        Add a model too large to keep in memory, split into chunks that are
+        loaded around the camera, see ``GeometryStreamer``. Returns the
+        StreamedAsset.
+        """
+        asset = self.engine.geometry_streamer.stream(
+            model_path, self.streamed_objects, divisions
+        )
+        self.spatial_index.add(asset.root)
+        return asset
+
+    def stream_model_async(self, model_path, divisions=DEFAULT_CHUNK_DIVISIONS):
+        """
+        Like ``stream_model``, with the model split into chunk files on the
+        background worker. ``stream_ready`` is emitted with the model path
+        once it streams, or ``stream_failed`` with the path and the error.
+        """
+        return self.engine.background_worker.submit(
+            self.engine.geometry_streamer.prepare,
+            model_path,
+            divisions,
+            callback=self._on_stream_prepared,
+            extraArgs=[model_path, divisions],
+        )
+
+    def _on_stream_prepared(self, future, model_path, divisions):
+        try:
+            future.result()
+            # Finds the chunk files just written.
+            self.stream_model(model_path, divisions)
+        except Exception as error:  # Reported through stream_failed
+            logger.exception("Could not stream %s", model_path)
+            self.notifier.stream_failed.emit(model_path, str(error))
+            return
+        self.notifier.stream_ready.emit(model_path)
+
+    def remove_streamed_model(self, asset):
+        self.spatial_index.remove(asset.root)
+        self.engine.geometry_streamer.remove(asset)
+
+    def add_actor(
+        self,
+        model_path,
+        animations,
+        pos=(0, 0, 0),
+        hpr=(0, 0, 0),
+        scale=1,
+        animation=None,
+    ):
+        """
+        Add an animated character, see ``ActorManager``. ``animations`` maps
+        names to animation paths; ``animation`` names one to loop right away.
+        Returns the Actor.
+        """
+        actor = self.actor_manager.add_actor(model_path, animations, pos, hpr, scale)
+        if animation is not None:
+            self.actor_manager.play(actor, animation)
+        self.spatial_index.add(actor)
+        return actor
+
+    def remove_actor(self, actor):
+        self.spatial_index.remove(actor)
+        self.actor_manager.remove_actor(actor)
+
+    def set_animation_lod(self, near, far, delay):
+        self.actor_manager.set_animation_lod(near, far, delay)
+
+    def get_actor_statistics(self):
+        return self.actor_manager.get_statistics()
+
+    def add_object(self, node_path):
+        """Add a node to the scene objects and to the spatial index."""
+        node_path.reparentTo(self.scene_objects)
+        self.spatial_index.add(node_path)
+
+    def add_geometry(
+        self,
+        vertices,
+        indices=None,
+        normals=None,
+        colors=None,
+        primitive="triangles",
+        thickness=None,
+        chunk_size=DEFAULT_CHUNK_SIZE,
+        name="geometry",
+    ):
+        """
+        Add a mesh, line set or point cloud built from NumPy arrays, see
+        ``make_geometry``. ``thickness`` is the point size or line width in
+        pixels. Geometry without normals is drawn unlit.
+        """
+        node_path = make_geometry(
+            vertices, indices, normals, colors, primitive, chunk_size, name
+        )
+        if thickness is not None:
+            node_path.setRenderModeThickness(thickness)
+        if normals is None:
+            node_path.setLightOff()
+        self.add_object(node_path)
+        logger.info(
+            "Added %s with %i vertices in %i chunks.",
+            name,
+            len(vertices),
+            node_path.getNumChildren(),
+        )
+        return node_path
+
+    def update_object(self, node_path):
+        """
+        Report that a scene object or instanced set root moved or changed
+        shape. Objects tagged dynamic are picked up automatically.
+        """
+        self.spatial_index.update(node_path)
+
+    def optimize_scene(self):
+        """
+        Replace the scene objects with a flattened, state-batched copy. The
+        originals are kept for editing and brought back by ``restore_scene``;
+        optimizing again rebuilds the copy from them. With managed lights, the
+        copy is merged in cells no larger than the smallest light radius, as
+        those lights are set per object.
+        Returns the scene statistics before and after.
+        """
+        self.restore_scene()
+        # Objects hidden by coarse culling must not be flattened hidden.
+        self.spatial_index.rebuild([])
+        before = analyze_scene(self.scene_objects)
+
+        self._original_objects = list(self.scene_objects.getChildren())
+        self.scene_objects.getChildren().detach()
+        cell_size = self.engine.lighting_system.light_manager.get_min_radius()
+        build_optimized_scene(self._original_objects, self.scene_objects, cell_size)
+        self._index_scene()
+
+        after = analyze_scene(self.scene_objects)
+        logger.info(
+            "Scene optimized: %s",
+            ", ".join(
+                f"{before[key]} -> {after[key]} {key.replace('_', ' ')}"
+                for key in OPTIMIZATION_STATISTICS
+            ),
+        )
+        return {"before": before, "after": after}
+
+    def restore_scene(self):
+        """Bring back the original scene objects after ``optimize_scene``."""
+        if self._original_objects is None:
+            return
+        for optimized_object in self.scene_objects.getChildren():
+            optimized_object.removeNode()
+        for original_object in self._original_objects:
+            original_object.reparentTo(self.scene_objects)
+        self._original_objects = None
+        self._index_scene()
+        logger.info("Original scene objects restored.")
+
+    def is_scene_optimized(self):
+        return self._original_objects is not None
+
+    def get_scene_statistics(self):
+        return analyze_scene(self.scene_objects)
+
+    def set_coarse_culling(self, enabled):
+        self.spatial_index.set_culling_enabled(enabled)
+
+    def get_spatial_index_statistics(self):
+        return self.spatial_index.get_statistics()
 
     def show_grid(self):
         self.grid.show()
-        self.is_grid_visible = True
+        self._grid_visible = True
         logger.info("Scene grid shown.")
 
     def hide_grid(self):
-        self.is_grid_visible = False
+        self._grid_visible = False
         self.grid.hide()
         logger.info("Scene grid hidden.")
 
     def is_grid_visible(self):
-        return self.is_grid_visible
+        return self._grid_visible
 
     def show_axis_indicator(self):
-        self.axis_indicator.show()
-        self.is_axis_indicator_visible = True
+        self.axis_gizmo.show()
+        self._axis_indicator_visible = True
         logger.info("Axis indicator shown.")
 
     def hide_axis_indicator(self):
-        self.is_axis_indicator_visible = False
-        self.axis_indicator.hide()
+        self._axis_indicator_visible = False
+        self.axis_gizmo.hide()
         logger.info("Axis indicator hidden.")
 
     def is_axis_indicator_visible(self):
-        return self.is_axis_indicator_visible
+        return self._axis_indicator_visible
@@ -0,0 +1,92 @@
+import json
+import logging
+import os
+import time
+
+from panda3d.core import Filename, Loader, LoaderOptions, NodePath
+from platformdirs import user_cache_dir
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(user_cache_dir("PandaQt"), "snapshot", "scene.bam")
+# Bumped whenever the snapshot layout changes, older snapshots are ignored.
+SNAPSHOT_VERSION = 3
+
+
+def _metadata_path(path):
+    return f"{os.path.splitext(path)[0]}.json"
+
+
+class SceneSnapshot:
+    """
+    A saved scene: one BAM file holding the scene graph, the axis indicator
+    and the lights, and next to it a JSON file with the state that is not
+    part of the scene graph, such as the camera pose.
+
+    The BAM file refers to textures by the path of their cached variants,
+    which the texture manager takes over once they are read.
+    """
+
+    def __init__(self, root, metadata):
+        self.root = root
+        self.metadata = metadata
+
+    def take(self, name):
+        """Detach a saved node from the snapshot, None if it was not saved."""
+        node_path = self.root.find(name)
+        if node_path.isEmpty():
+            return None
+        node_path.detachNode()
+        return node_path
+
+    def write(self, path):
+        """Write the BAM file, then the metadata, which marks it complete."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        metadata_path = _metadata_path(path)
+        if os.path.exists(metadata_path):
+            os.remove(metadata_path)
+
+        # Panda3D picks the format by extension, so it has to stay last.
+        temp_path = f"{os.path.splitext(path)[0]}.tmp.bam"
+        if not self.root.writeBamFile(Filename.fromOsSpecific(temp_path)):
+            raise OSError(f"Could not write scene snapshot: {path}")
+        os.replace(temp_path, path)
+        with open(metadata_path, "w", encoding="utf-8") as file:
+            json.dump(dict(self.metadata, version=SNAPSHOT_VERSION), file, indent=2)
+
+    @classmethod
+    def read(cls, path, texture_manager):
+        """
+        Read a snapshot in one load of its BAM file. Returns None if there is
+        none, or it is incomplete or from another version.
+        """
+        start = time.perf_counter()
+        try:
+            with open(_metadata_path(path), encoding="utf-8") as file:
+                metadata = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if metadata.get("version") != SNAPSHOT_VERSION:
+            logger.info("Scene snapshot is outdated, ignored: %s", path)
+            return None
+
+        options = LoaderOptions(
+            LoaderOptions.LF_report_errors | LoaderOptions.LF_no_cache
+        )
+        node = Loader.getGlobalPtr().loadSync(Filename.fromOsSpecific(path), options)
+        if node is None:
+            logger.error("Could not read scene snapshot: %s", path)
+            return None
+        root = NodePath(node)
+
+        sources = metadata["textures"]
+        for texture in root.findAllTextures():
+            source = sources.get(texture.getFullpath().getFullpath())
+            if source is not None:
+                texture_manager.add_texture(texture, *source)
+        logger.info(
+            "Scene snapshot read in %.1f ms: %s",
+            (time.perf_counter() - start) * 1000,
+            path,
+        )
+        return cls(root, metadata)
@@ -0,0 +1,109 @@
+import logging
+
+from .spatial_index import CULL_CAMERA_MASK
+
+logger = logging.getLogger(__name__)
+
+
+class _ShadowMap:
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.transform = None
+        self.projection = None
+
+
+class ShadowCache:
+    """
+    Keeps shadow maps as cached render targets. Panda3D renders the shadow
+    buffer of every shadow-casting light each frame; here a buffer renders
+    only in frames where its light moved or its lens changed, or where the
+    shadow casters may have changed, and otherwise keeps its last map.
+
+    The casters are the scene objects, which changed when the spatial index
+    reports objects added, moved or removed, or while actors animate, whose
+    skinning leaves their bounds alone. The index's coarse culling doesn't
+    count, the shadow cameras ignore it.
+    """
+
+    def __init__(self, engine, light_nps):
+        self.engine = engine
+        # The lights that can cast shadows, whether they do is checked per frame.
+        self.light_nps = [
+            light_np
+            for light_np in light_nps
+            if hasattr(light_np.node(), "isShadowCaster")
+        ]
+        self.rendered = 0
+        self.skipped = 0
+        self.last_frame = {"rendered": 0, "skipped": 0}
+        self._shadow_maps = {}
+        self._casters_changed = True
+
+        for light_np in self.light_nps:
+            # Casters culled from the main view still cast shadows into it.
+            light = light_np.node()
+            light.setCameraMask(light.getCameraMask() & ~CULL_CAMERA_MASK)
+
+        self.engine.scene_manager.spatial_index.add_listener(self._on_objects_changed)
+        # After the spatial index has reported the objects that moved.
+        self.engine.taskMgr.add(
+            self._update_task, "_shadow_cache_update", sort=49, priority=-5
+        )
+
+    def set_shadow_map_size(self, light_np, size):
+        """Set the resolution of a light's shadow map, which is then rendered anew."""
+        light_np.node().setShadowBufferSize((size, size))
+        self._shadow_maps.pop(light_np, None)
+
+    def invalidate(self):
+        """Render all shadow maps again, after changes the cache can't detect."""
+        for shadow_map in self._shadow_maps.values():
+            shadow_map.transform = None
+
+    def _on_objects_changed(self, changed, removed):
+        self._casters_changed = True
+
+    def _update_task(self, task):
+        gsg = self.engine.win.getGsg()
+        casters_changed = (
+            self._casters_changed
+            or self.engine.scene_manager.actor_manager.is_animating()
+        )
+        self._casters_changed = False
+        rendered = skipped = 0
+        for light_np in self.light_nps:
+            light = light_np.node()
+            # Made by the GSG once a shader first samples the shadow map.
+            buffer = light.getShadowBuffer(gsg) if light.isShadowCaster() else None
+            if buffer is None:
+                continue
+
+            shadow_map = self._shadow_maps.get(light_np)
+            if shadow_map is None or shadow_map.buffer != buffer:
+                shadow_map = self._shadow_maps[light_np] = _ShadowMap(buffer)
+            transform = light_np.getNetTransform()
+            projection = light.getLens().getProjectionMat()
+            if (
+                casters_changed
+                or transform != shadow_map.transform
+                or projection != shadow_map.projection
+            ):
+                shadow_map.transform = transform
+                shadow_map.projection = projection
+                buffer.setOneShot(True)
+                rendered += 1
+            else:
+                skipped += 1
+
+        self.rendered += rendered
+        self.skipped += skipped
+        self.last_frame = {"rendered": rendered, "skipped": skipped}
+        return task.cont
+
+    def get_statistics(self):
+        return {
+            "shadow_maps": len(self._shadow_maps),
+            "rendered": self.rendered,
+            "skipped": self.skipped,
+            "last_frame": dict(self.last_frame),
+        }
@@ -0,0 +1,239 @@
+import logging
+
+import numpy as np
+from panda3d.core import BitMask32, BoundingBox, BoundingSphere
+
+from ..utils.bvh import BoundingVolumeHierarchy
+from ..utils.scene_optimizer import DYNAMIC_TAG
+
+logger = logging.getLogger(__name__)
+
+# Objects culled by the index are hidden from cameras with this bit in their
+# camera mask, which the main camera has. Offscreen cameras that must still
+# see them clear the bit from their own mask.
+CULL_CAMERA_MASK = BitMask32.bit(20)
+
+
+class SpatialIndex:
+    """
+    BVH over the world-space bounds of scene objects, for box, ray and view
+    queries, and for hiding whole off-screen objects before Panda3D's cull.
+
+    Objects tagged dynamic are checked for movement every frame; other objects
+    must be reported with ``update`` after they move. Listeners are told
+    about every change, see ``add_listener``.
+    """
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.bvh = BoundingVolumeHierarchy()
+        self.node_paths = []
+        self.culling_enabled = True
+        # Bumped whenever objects are added or removed.
+        self.version = 0
+        self._slots = {}
+        self._dynamic_slots = {}
+        self._culled = np.zeros(0, dtype=bool)
+        self._listeners = []
+
+        # After the camera tasks and the geometry streamer, which have the
+        # same sort, and before igLoop renders.
+        self.engine.taskMgr.add(
+            self._update_task, "_spatial_index_update", sort=49, priority=-3
+        )
+
+    def __len__(self):
+        return len(self._slots)
+
+    def add_listener(self, listener):
+        """
+        Call ``listener(changed, removed)`` whenever objects change, with the
+        objects added or moved and the objects removed.
+        """
+        self._listeners.append(listener)
+
+    def _notify(self, changed, removed=()):
+        if changed or removed:
+            for listener in self._listeners:
+                listener(changed, removed)
+
+    def _world_box(self, node_path):
+        """World-space box of the node and everything below it, or None if empty."""
+        bounds = node_path.getBounds()
+        if bounds.isEmpty():
+            return None
+        if bounds.isInfinite():
+            return np.full(3, -np.inf), np.full(3, np.inf)
+
+        parent = node_path.getParent()
+        if not parent.isEmpty():
+            bounds.xform(parent.getMat(self.engine.render))
+        if isinstance(bounds, BoundingSphere):
+            center, radius = np.array(bounds.getCenter()), bounds.getRadius()
+            return center - radius, center + radius
+        if isinstance(bounds, BoundingBox):
+            return np.array(bounds.getMin()), np.array(bounds.getMax())
+
+        low, high = node_path.getTightBounds(self.engine.render)
+        return np.array(low), np.array(high)
+
+    def rebuild(self, node_paths):
+        """Index exactly these objects, replacing the current contents."""
+        self._show_culled()
+        previous = list(self._slots)
+        self.node_paths = []
+        self._slots.clear()
+        self._dynamic_slots.clear()
+        self.version += 1
+
+        lows, highs = [], []
+        for node_path in node_paths:
+            box = self._world_box(node_path)
+            if box is None:
+                continue
+            self._register(node_path, len(self.node_paths))
+            lows.append(box[0])
+            highs.append(box[1])
+        self.bvh.build(np.reshape(lows, (-1, 3)), np.reshape(highs, (-1, 3)))
+        self._culled = np.zeros(len(self.node_paths), dtype=bool)
+        logger.debug("Spatial index rebuilt with %i objects.", len(self.node_paths))
+        self._notify(
+            list(self.node_paths),
+            [node_path for node_path in previous if node_path not in self._slots],
+        )
+
+    def _register(self, node_path, slot):
+        self.node_paths.append(node_path)
+        self._slots[node_path] = slot
+        if node_path.hasTag(DYNAMIC_TAG):
+            self._dynamic_slots[slot] = node_path.getNetTransform()
+
+    def add(self, node_path):
+        box = self._world_box(node_path)
+        if box is None or node_path in self._slots:
+            return
+        slot = self.bvh.add(*box)
+        self._register(node_path, slot)
+        self.version += 1
+        self._culled = np.append(self._culled, False)
+        self._notify([node_path])
+
+    def remove(self, node_path):
+        slot = self._slots.pop(node_path, None)
+        if slot is None:
+            return
+        if self._culled[slot]:
+            node_path.show(CULL_CAMERA_MASK)
+            self._culled[slot] = False
+        self._dynamic_slots.pop(slot, None)
+        self.node_paths[slot] = None
+        self.bvh.remove(slot)
+        self.version += 1
+        self._notify([], [node_path])
+
+    def update(self, *node_paths):
+        """Refresh the bounds of objects that moved or changed."""
+        slots, lows, highs = [], [], []
+        for node_path in node_paths:
+            slot = self._slots.get(node_path)
+            box = self._world_box(node_path) if slot is not None else None
+            if box is None:
+                continue
+            slots.append(slot)
+            lows.append(box[0])
+            highs.append(box[1])
+        if slots:
+            self.bvh.update(slots, lows, highs)
+            self._notify([self.node_paths[slot] for slot in slots])
+
+    def get_boxes(self, node_paths):
+        """
+        The indexed world-space boxes of objects, as the objects that are
+        indexed and arrays of their lows and highs.
+        """
+        indexed = [node_path for node_path in node_paths if node_path in self._slots]
+        slots = np.array([self._slots[node_path] for node_path in indexed], dtype=int)
+        return indexed, self.bvh.lows[slots], self.bvh.highs[slots]
+
+    def _objects(self, slots):
+        return [self.node_paths[slot] for slot in slots]
+
+    def objects_in_box(self, low, high):
+        """Objects whose bounds intersect the world-space box."""
+        return self._objects(self.bvh.query_box(low, high))
+
+    def objects_on_ray(self, origin, direction, max_distance=np.inf):
+        """
+        Objects whose bounds the world-space ray hits, nearest first, as
+        (node path, distance to the bounds) pairs.
+        """
+        slots, distances = self.bvh.query_ray(origin, direction, max_distance)
+        return list(zip(self._objects(slots), distances.tolist()))
+
+    def nearest_on_ray(self, origin, direction, max_distance=np.inf):
+        """The object whose bounds the ray enters first, or None."""
+        hits = self.objects_on_ray(origin, direction, max_distance)
+        return hits[0] if hits else None
+
+    def objects_in_view(self, camera=None):
+        """Objects whose bounds intersect the view frustum of a camera."""
+        return self._objects(self._visible_slots(camera))
+
+    def _visible_slots(self, camera=None):
+        if camera is None:
+            camera = self.engine.camera_controller.camera
+        frustum = camera.node().getLens().makeBounds()
+        frustum.xform(camera.getMat(self.engine.render))
+        planes = [list(frustum.getPlane(index)) for index in range(6)]
+        return self.bvh.query_planes(planes)
+
+    def _update_task(self, task):
+        """Runs after the camera and scene changes for the frame, before it renders."""
+        if self._dynamic_slots:
+            moved = []
+            for slot, transform in self._dynamic_slots.items():
+                node_path = self.node_paths[slot]
+                net_transform = node_path.getNetTransform()
+                if net_transform != transform:
+                    self._dynamic_slots[slot] = net_transform
+                    moved.append(node_path)
+            self.update(*moved)
+
+        if (
+            self.culling_enabled
+            and self._slots
+            and hasattr(self.engine, "camera_controller")
+        ):
+            self._cull()
+        return task.cont
+
+    def _cull(self):
+        """Hide the objects outside the view, touching only those that changed."""
+        culled = self.bvh.active.copy()
+        culled[self._visible_slots()] = False
+        for slot in np.flatnonzero(culled & ~self._culled):
+            self.node_paths[slot].hide(CULL_CAMERA_MASK)
+        for slot in np.flatnonzero(~culled & self._culled):
+            self.node_paths[slot].show(CULL_CAMERA_MASK)
+        self._culled = culled
+
+    def _show_culled(self):
+        for slot in np.flatnonzero(self._culled):
+            node_path = self.node_paths[slot]
+            if node_path is not None and not node_path.isEmpty():
+                node_path.show(CULL_CAMERA_MASK)
+        self._culled[:] = False
+
+    def set_culling_enabled(self, enabled):
+        self.culling_enabled = enabled
+        if not enabled:
+            self._show_culled()
+        logger.info("Coarse culling %s.", "enabled" if enabled else "disabled")
+
+    def get_statistics(self):
+        return {
+            "objects": len(self._slots),
+            "dynamic_objects": len(self._dynamic_slots),
+            "culled_objects": int(self._culled.sum()),
+            "tree_nodes": len(self.bvh.left),
+        }
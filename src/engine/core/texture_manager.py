@@ -0,0 +1,380 @@
+import hashlib
+import logging
+import os
+
+from panda3d.core import (
+    Filename,
+    Texture,
+    TexturePool,
+    VirtualFileSystem,
+    getModelPath,
+)
+from platformdirs import user_cache_dir
+
+from ..utils.asset_packs import prepare_texture
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TEXTURE_BUDGET = 512 * 1024 * 1024
+DEFAULT_TEXTURE_CACHE_DIR = os.path.join(user_cache_dir("PandaQt"), "textures")
+# Textures are not downscaled below this size under memory pressure.
+MIN_TEXTURE_SIZE = 64
+# Bumped whenever the cached variants change, to invalidate them.
+TEXTURE_CACHE_VERSION = 1
+
+
+class _ManagedTexture:
+    def __init__(self, texture, source, priority):
+        self.texture = texture
+        # The file it was converted from, None for textures embedded in models.
+        self.source = source
+        self.cache_path = None
+        self.priority = priority
+        self.levels_dropped = 0
+        self.memory = 0
+        self.compressed = False
+        # Managed models using it, released with the last of them.
+        self.users = 0
+
+
+class TextureManager:
+    """
+    Loads textures through a disk cache of mipmapped, compressed variants and
+    keeps their total memory within a budget. RAM images are dropped once a
+    texture is on the GPU; Panda3D reads them back from the cached variant
+    when needed. Under pressure the lowest-priority textures lose their top
+    mipmap level, halving their size, until the budget is met again.
+
+    Textures of managed models are counted per model and stop counting
+    against the budget once every model using them is released.
+    """
+
+    def __init__(
+        self,
+        engine,
+        memory_budget=DEFAULT_TEXTURE_BUDGET,
+        cache_dir=DEFAULT_TEXTURE_CACHE_DIR,
+        keep_ram_images=False,
+    ):
+        self.engine = engine
+        self.memory_budget = memory_budget
+        self.cache_dir = cache_dir
+        self.keep_ram_images = keep_ram_images
+        self.memory_used = 0
+        self.cache_hits = 0
+        self.conversions = 0
+
+        # Texture -> entry, and source fullpath -> texture.
+        self._entries = {}
+        self._sources = {}
+        # Managed model -> the textures it uses.
+        self._models = {}
+
+    def _supports_compression(self):
+        gsg = self.engine.win.getGsg() if self.engine.win is not None else None
+        return gsg is None or gsg.getSupportsCompressedTextureFormat(Texture.CM_dxt5)
+
+    def _cache_path(self, source, compress):
+        file = VirtualFileSystem.getGlobalPtr().getFile(source)
+        if file is None:
+            raise OSError(f"Texture not found: {source}")
+        timestamp = file.getTimestamp()
+        key = (source.getFullpath(), timestamp, compress, TEXTURE_CACHE_VERSION)
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()
+        return os.path.join(self.cache_dir, f"{digest}.txo")
+
+    def _convert(self, source, cache_path, compress):
+        texture = Texture()
+        if not texture.read(source):
+            raise OSError(f"Could not load texture: {source}")
+        prepare_texture(texture, compress)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        # Panda3D picks the format by extension, so it has to stay last.
+        temp_path = f"{cache_path[: -len('.txo')]}.tmp.txo"
+        if texture.write(Filename.fromOsSpecific(temp_path)):
+            os.replace(temp_path, cache_path)
+        else:
+            logger.warning("Could not write texture cache file: %s", cache_path)
+        self.conversions += 1
+
+    def load_texture(self, texture_path, priority=0):
+        """
+        Load a texture through the cache. Loading the same file again returns
+        the same texture. Higher priorities are downscaled last.
+        """
+        source = Filename(texture_path)
+        VirtualFileSystem.getGlobalPtr().resolveFilename(
+            source, getModelPath().getValue()
+        )
+        texture = self._sources.get(source.getFullpath())
+        if texture is not None:
+            entry = self._entries[texture]
+            entry.priority = max(entry.priority, priority)
+            return texture
+
+        if source.getExtension() == "txo":
+            # Converted already, such as the textures in asset packs.
+            cache_path = source
+        else:
+            cache_path = self._update_cache(source)
+        texture = TexturePool.loadTexture(cache_path)
+        if texture is None:
+            raise OSError(f"Could not load texture: {cache_path}")
+        texture.setName(source.getBasenameWoExtension())
+
+        entry = _ManagedTexture(texture, source, priority)
+        entry.cache_path = cache_path
+        self._sources[source.getFullpath()] = texture
+        self._add(entry)
+        return texture
+
+    def _update_cache(self, source):
+        """Convert a texture unless its cached variant is current. Returns its path."""
+        compress = self._supports_compression()
+        cache_path = self._cache_path(source, compress)
+        if os.path.exists(cache_path):
+            self.cache_hits += 1
+        else:
+            self._convert(source, cache_path, compress)
+        return Filename.fromOsSpecific(cache_path)
+
+    def manage_model(self, model, priority=0):
+        """
+        Put the textures of a model under management, swapping textures read
+        from files for their cached variants. Embedded textures are kept and
+        only accounted for. ``release_model`` hands the textures back.
+        """
+        if model in self._models:
+            return
+        textures = []
+        for texture in model.findAllTextures():
+            if texture not in self._entries:
+                if texture.hasFullpath() and texture.getFullpath().exists():
+                    managed = self.load_texture(texture.getFullpath(), priority)
+                    model.replaceTexture(texture, managed)
+                    texture = managed
+                else:
+                    self._add(_ManagedTexture(texture, None, priority))
+            if texture not in textures:
+                textures.append(texture)
+                self._entries[texture].users += 1
+        self._models[model] = textures
+
+    def release_model(self, model):
+        """
+        Stop managing a model, after it was removed from the scene. Textures
+        no other managed model uses are released.
+        """
+        for texture in self._models.pop(model, ()):
+            entry = self._entries.get(texture)
+            if entry is None:
+                continue
+            entry.users -= 1
+            if entry.users <= 0:
+                self._remove(entry)
+
+    def _remove(self, entry):
+        del self._entries[entry.texture]
+        if entry.source is not None:
+            fullpath = entry.source.getFullpath()
+            if self._sources.get(fullpath) == entry.texture:
+                del self._sources[fullpath]
+        self.memory_used -= entry.memory
+
+    def _add(self, entry):
+        entry.texture.setKeepRamImage(self.keep_ram_images)
+        entry.memory = self._texture_memory(entry.texture)
+        entry.compressed = entry.texture.getRamImageCompression() != Texture.CM_off
+        self._entries[entry.texture] = entry
+        self.memory_used += entry.memory
+        self._enforce_budget()
+
+    @staticmethod
+    def _texture_memory(texture):
+        if texture.hasRamImage():
+            return sum(
+                texture.getRamMipmapImageSize(level)
+                for level in range(texture.getNumRamMipmapImages())
+            )
+        return texture.estimateTextureMemory()
+
+    def _drop_level(self, entry):
+        """Halve a texture by making its second mipmap level the first."""
+        texture = entry.texture
+        if not texture.hasRamImage():
+            texture.reload()
+        if texture.getNumRamMipmapImages() < 2:
+            texture.generateRamMipmapImages()
+        levels = [
+            texture.getRamMipmapImage(level)
+            for level in range(1, texture.getNumRamMipmapImages())
+        ]
+        compression = texture.getRamImageCompression()
+
+        texture.setXSize(max(1, texture.getXSize() // 2))
+        texture.setYSize(max(1, texture.getYSize() // 2))
+        texture.setRamImage(levels[0], compression)
+        for level, image in enumerate(levels[1:], 1):
+            texture.setRamMipmapImage(level, image)
+
+        memory = self._texture_memory(texture)
+        self.memory_used += memory - entry.memory
+        entry.memory = memory
+        entry.levels_dropped += 1
+        self._store_downscaled(entry)
+
+    def _store_downscaled(self, entry):
+        """
+        Point a downscaled texture at a cached variant of its size, so that
+        reading the RAM image back after it was dropped keeps it downscaled.
+        Embedded textures keep their RAM image instead.
+        """
+        texture = entry.texture
+        if entry.cache_path is None:
+            texture.setKeepRamImage(True)
+            return
+
+        # Named after the source and its timestamp, like the full-size variant.
+        full_size_path = self._cache_path(entry.source, entry.compressed)
+        variant_path = Filename.fromOsSpecific(
+            f"{full_size_path[: -len('.txo')]}_{entry.levels_dropped}.txo"
+        )
+        if not variant_path.exists():
+            os.makedirs(self.cache_dir, exist_ok=True)
+            if not texture.write(variant_path):
+                logger.warning("Could not write texture cache file: %s", variant_path)
+                texture.setKeepRamImage(True)
+                return
+        texture.setFilename(variant_path)
+        texture.setFullpath(variant_path)
+
+    def _enforce_budget(self):
+        while self.memory_used > self.memory_budget:
+            candidates = [
+                entry
+                for entry in self._entries.values()
+                if min(entry.texture.getXSize(), entry.texture.getYSize())
+                >= MIN_TEXTURE_SIZE * 2
+            ]
+            if not candidates:
+                logger.warning(
+                    "Textures exceed the memory budget: %i of %i bytes.",
+                    self.memory_used,
+                    self.memory_budget,
+                )
+                return
+            # Lowest priority first, then the largest, which frees the most.
+            entry = min(candidates, key=lambda entry: (entry.priority, -entry.memory))
+            self._drop_level(entry)
+            logger.debug(
+                "Texture downscaled: %s to %i x %i",
+                entry.texture.getName(),
+                entry.texture.getXSize(),
+                entry.texture.getYSize(),
+            )
+
+    def set_priority(self, texture, priority):
+        entry = self._entries.get(texture)
+        if entry is not None:
+            entry.priority = priority
+
+    def set_memory_budget(self, memory_budget):
+        self.memory_budget = memory_budget
+        self._enforce_budget()
+
+    def get_source_path(self, texture):
+        """The file a texture was loaded from, rather than its cached variant."""
+        entry = self._entries.get(texture)
+        if entry is not None and entry.source is not None:
+            return entry.source
+        return texture.getFullpath()
+
+    def get_sources(self, textures):
+        """
+        Cached variant path -> source path and priority, for those of the
+        textures that were loaded from a file.
+        """
+        sources = {}
+        for texture in textures:
+            entry = self._entries.get(texture)
+            if entry is not None and entry.source is not None:
+                sources[texture.getFullpath().getFullpath()] = (
+                    entry.source.getFullpath(),
+                    entry.priority,
+                )
+        return sources
+
+    def add_texture(self, texture, source, priority=0):
+        """
+        Manage a texture that was read from a cached variant of ``source``
+        by other means, such as a BAM file referring to the variant.
+        """
+        if texture in self._entries:
+            return
+        source = Filename(source)
+        entry = _ManagedTexture(texture, source, priority)
+        entry.cache_path = texture.getFullpath()
+        self._sources[source.getFullpath()] = texture
+        self._add(entry)
+
+    def reload_texture(self, texture):
+        """Convert a texture again after its source file changed."""
+        entry = self._entries.get(texture)
+        if entry is None or entry.source is None:
+            texture.reload()
+            return
+
+        if entry.source.getExtension() != "txo":
+            entry.cache_path = self._update_cache(entry.source)
+        texture.setFilename(entry.cache_path)
+        texture.setFullpath(entry.cache_path)
+        texture.reload()
+
+        # Downscaled textures stay downscaled.
+        levels_dropped, entry.levels_dropped = entry.levels_dropped, 0
+        self.memory_used -= entry.memory
+        entry.memory = self._texture_memory(texture)
+        self.memory_used += entry.memory
+        for _level in range(levels_dropped):
+            self._drop_level(entry)
+        self._enforce_budget()
+
+    def clear(self):
+        """Stop managing every texture."""
+        self._entries.clear()
+        self._sources.clear()
+        self._models.clear()
+        self.memory_used = 0
+
+    def get_statistics(self):
+        return {
+            "textures": len(self._entries),
+            "memory_used": self.memory_used,
+            "memory_budget": self.memory_budget,
+            "downscaled": sum(
+                1 for entry in self._entries.values() if entry.levels_dropped
+            ),
+            "cache_hits": self.cache_hits,
+            "conversions": self.conversions,
+        }
+
+    def get_texture_report(self):
+        """Size and residency of every managed texture."""
+        gsg = self.engine.win.getGsg() if self.engine.win is not None else None
+        prepared_objects = gsg.getPreparedObjects() if gsg is not None else None
+        return [
+            {
+                "name": entry.texture.getName(),
+                "source": entry.source.getFullpath() if entry.source else None,
+                "size": (entry.texture.getXSize(), entry.texture.getYSize()),
+                "compressed": entry.compressed,
+                "memory": entry.memory,
+                "priority": entry.priority,
+                "levels_dropped": entry.levels_dropped,
+                "in_ram": entry.texture.hasRamImage(),
+                "on_gpu": prepared_objects is not None
+                and entry.texture.isPrepared(prepared_objects),
+            }
+            for entry in self._entries.values()
+        ]
@@ -0,0 +1,353 @@
+import hashlib
+import json
+import logging
+import os
+from collections import deque
+
+from panda3d.core import (
+    Camera,
+    Filename,
+    FrameBufferProperties,
+    GraphicsOutput,
+    GraphicsPipe,
+    NodePath,
+    PerspectiveLens,
+    Point3,
+    Texture,
+    VirtualFileSystem,
+    WindowProperties,
+)
+from platformdirs import user_cache_dir
+from PySide6.QtCore import QObject, QTimer, Signal
+from PySide6.QtGui import QImage
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_SIZE = 128
+# The buffer holds this many tiles across and down, one model per tile, so
+# a batch of up to BATCH_COLUMNS squared models renders in a single frame.
+BATCH_COLUMNS = 4
+DEFAULT_THUMBNAIL_DIR = os.path.join(user_cache_dir("PandaQt"), "thumbnails")
+# Bumped whenever the camera, lighting or size change, to invalidate thumbnails.
+THUMBNAIL_VERSION = 1
+# Maps model files, by path, timestamp and size, to their thumbnails.
+INDEX_NAME = "index.json"
+CAMERA_FOV = 30
+# Models are scaled to a unit bounding sphere and viewed from front right.
+CAMERA_POSITION = Point3(2.2, -3.3, 1.8)
+
+
+class ThumbnailServiceNotifier(QObject):
+    thumbnail_ready = Signal(str, str)
+    thumbnail_failed = Signal(str)
+
+
+class _ThumbnailJob:
+    def __init__(self, model_path, cache_path):
+        self.model_path = model_path
+        self.cache_path = cache_path
+        self.model = None
+        self.loaded = False
+
+
+class _Tile:
+    """One model's region of the buffer, with its own scene and camera."""
+
+    def __init__(self, buffer, lights, column, row, columns):
+        self.root = NodePath("thumbnail_tile")
+        for light_np in lights:
+            self.root.setLight(light_np)
+
+        lens = PerspectiveLens()
+        lens.setFov(CAMERA_FOV)
+        lens.setNearFar(0.1, 20)
+        self.camera = self.root.attachNewNode(Camera("thumbnail_camera", lens))
+        self.camera.setPos(CAMERA_POSITION)
+        self.camera.lookAt(0, 0, 0)
+
+        display_region = buffer.makeDisplayRegion(
+            column / columns,
+            (column + 1) / columns,
+            1 - (row + 1) / columns,
+            1 - row / columns,
+        )
+        display_region.setCamera(self.camera)
+
+    def place(self, model):
+        """Center a model and scale it to a unit bounding sphere."""
+        holder = self.root.attachNewNode("thumbnail_model")
+        centered = holder.attachNewNode("centered")
+        model.reparentTo(centered)
+        bounds = centered.getTightBounds(holder)
+        if bounds is None:
+            return
+        low, high = bounds
+        radius = max((high - low).length() / 2, 1e-6)
+        centered.setPos(-(low + high) / 2)
+        holder.setScale(1 / radius)
+
+    def clear(self):
+        for child in self.root.findAllMatches("thumbnail_model"):
+            child.removeNode()
+
+
+class ThumbnailService:
+    """
+    Renders small preview images of models in a dedicated offscreen buffer,
+    next to the viewport and with a fixed camera and a copy of the
+    ``LightingSystem`` lights. Models are loaded on the loader thread and
+    rendered in batches, one per tile of the buffer, so a batch costs one
+    frame. Thumbnails are cached as PNG files named after a hash of the
+    model file's contents and delivered through the notifier's signals.
+
+    Files are hashed on the background worker, once: an index remembers
+    the thumbnail of each file by its path, timestamp and size.
+    """
+
+    def __init__(
+        self,
+        engine,
+        size=THUMBNAIL_SIZE,
+        cache_dir=DEFAULT_THUMBNAIL_DIR,
+        columns=BATCH_COLUMNS,
+    ):
+        self.engine = engine
+        self.size = size
+        self.cache_dir = cache_dir
+        self.columns = columns
+        self.notifier = ThumbnailServiceNotifier()
+        self.rendered = 0
+        self.cache_hits = 0
+
+        # Model path -> the hashing job of a requested model.
+        self._hashing = {}
+        self._index = None
+        self._queue = deque()
+        self._batch = []
+        self._queued_paths = set()
+        self._buffer = None
+        self._texture = None
+        self._tiles = []
+        self._image_modified = None
+
+    def _setup_buffer(self):
+        fb_props = FrameBufferProperties()
+        fb_props.setRgbColor(True)
+        fb_props.setRgbaBits(8, 8, 8, 8)
+        fb_props.setDepthBits(16)
+
+        buffer_size = self.size * self.columns
+        self._buffer = self.engine.graphicsEngine.makeOutput(
+            self.engine.pipe,
+            "thumbnail_buffer",
+            -20,
+            fb_props,
+            WindowProperties.size(buffer_size, buffer_size),
+            GraphicsPipe.BFRefuseWindow,
+            self.engine.win.getGsg(),
+            self.engine.win,
+        )
+        self._texture = Texture("thumbnails")
+        self._buffer.addRenderTexture(
+            self._texture, GraphicsOutput.RTM_copy_ram, GraphicsOutput.RTP_color
+        )
+        self._buffer.setClearColor((0, 0, 0, 0))
+        self._buffer.setActive(False)
+
+        # Copies, so toggling the viewport's lighting leaves thumbnails alone.
+        rig = NodePath("thumbnail_lights")
+        lights = [
+            light_np.copyTo(rig) for light_np in self.engine.lighting_system.light_nps
+        ]
+        self._tiles = [
+            _Tile(
+                self._buffer,
+                lights,
+                index % self.columns,
+                index // self.columns,
+                self.columns,
+            )
+            for index in range(self.columns * self.columns)
+        ]
+
+    def _signature(self, model_path):
+        """The file a model loads from, as (full path, timestamp, size), or None."""
+        fullpath = self.engine.model_cache.make_key(model_path)[0]
+        file = VirtualFileSystem.getGlobalPtr().getFile(Filename(fullpath))
+        if file is None:
+            return None
+        return fullpath, file.getTimestamp(), file.getFileSize()
+
+    def _hash_file(self, fullpath):
+        """The thumbnail's path, named after the file's contents. Runs on a worker."""
+        data = VirtualFileSystem.getGlobalPtr().readFile(Filename(fullpath), True)
+        key = hashlib.sha1(data)
+        key.update(repr((self.size, THUMBNAIL_VERSION)).encode())
+        return os.path.join(self.cache_dir, f"{key.hexdigest()}.png")
+
+    def _load_index(self):
+        if self._index is None:
+            try:
+                with open(os.path.join(self.cache_dir, INDEX_NAME)) as index_file:
+                    self._index = json.load(index_file)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _save_index(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        index_path = os.path.join(self.cache_dir, INDEX_NAME)
+        temp_path = f"{index_path}.tmp"
+        with open(temp_path, "w") as index_file:
+            json.dump(self._index, index_file)
+        os.replace(temp_path, index_path)
+
+    def request_thumbnail(self, model_path):
+        """
+        Ask for a model's thumbnail. ``thumbnail_ready`` is emitted with the
+        model path and the image path once it is available, right after
+        returning for cached ones, or ``thumbnail_failed`` with the model path.
+        """
+        model_path = str(model_path)
+        if model_path in self._queued_paths:
+            return
+        signature = self._signature(model_path)
+        if signature is None:
+            QTimer.singleShot(
+                0, lambda: self.notifier.thumbnail_failed.emit(model_path)
+            )
+            return
+
+        fullpath, timestamp, size = signature
+        entry = self._load_index().get(fullpath)
+        if entry is not None and entry[:2] == [timestamp, size]:
+            self._request_cached(model_path, os.path.join(self.cache_dir, entry[2]))
+            return
+
+        self._queued_paths.add(model_path)
+        self._hashing[model_path] = self.engine.background_worker.submit(
+            self._hash_file,
+            fullpath,
+            callback=self._on_file_hashed,
+            extraArgs=[model_path, signature],
+        )
+
+    def _on_file_hashed(self, future, model_path, signature):
+        del self._hashing[model_path]
+        self._queued_paths.discard(model_path)
+        try:
+            cache_path = future.result()
+        except OSError:
+            logger.warning("Could not read model for thumbnail: %s", model_path)
+            self.notifier.thumbnail_failed.emit(model_path)
+            return
+
+        fullpath, timestamp, size = signature
+        self._index[fullpath] = [timestamp, size, os.path.basename(cache_path)]
+        if not self._hashing:
+            self._save_index()
+        self._request_cached(model_path, cache_path)
+
+    def _request_cached(self, model_path, cache_path):
+        """Deliver a thumbnail from the cache, rendering it first if it isn't there."""
+        if os.path.exists(cache_path):
+            self.cache_hits += 1
+            QTimer.singleShot(
+                0, lambda: self.notifier.thumbnail_ready.emit(model_path, cache_path)
+            )
+            return
+
+        self._queue.append(_ThumbnailJob(model_path, cache_path))
+        self._queued_paths.add(model_path)
+        if not self.engine.taskMgr.hasTaskNamed("_thumbnail_task"):
+            self.engine.taskMgr.add(self._thumbnail_task, "_thumbnail_task", sort=48)
+
+    def cancel_all(self):
+        """Drop the queued requests; the batch in progress still completes."""
+        for model_path, job in self._hashing.items():
+            job.cancel()
+            self._queued_paths.discard(model_path)
+        self._hashing.clear()
+        for job in self._queue:
+            self._queued_paths.discard(job.model_path)
+        self._queue.clear()
+
+    def _thumbnail_task(self, task):
+        if not self._batch:
+            if not self._queue:
+                return task.done
+            self._start_batch()
+            return task.cont
+
+        if not all(job.loaded for job in self._batch):
+            return task.cont
+
+        if self._image_modified is None:
+            self._render_batch()
+        elif self._texture.getImageModified().getSeq() != self._image_modified:
+            self._finish_batch()
+        return task.cont
+
+    def _start_batch(self):
+        if self._buffer is None:
+            self._setup_buffer()
+        while self._queue and len(self._batch) < len(self._tiles):
+            job = self._queue.popleft()
+            self._batch.append(job)
+            self.engine.model_cache.load_model_async(
+                job.model_path, callback=self._on_model_loaded, extraArgs=[job]
+            )
+
+    def _on_model_loaded(self, model, job):
+        job.model = model
+        job.loaded = True
+
+    def _render_batch(self):
+        """Place the batch in the tiles, rendered with the next frame."""
+        for job, tile in zip(self._batch, self._tiles):
+            if job.model is not None:
+                tile.place(job.model)
+        self._image_modified = self._texture.getImageModified().getSeq()
+        self._buffer.setActive(True)
+
+    def _finish_batch(self):
+        self._buffer.setActive(False)
+        width, height = self._texture.getXSize(), self._texture.getYSize()
+        image_data = self._texture.getRamImage().getData()
+        image = QImage(image_data, width, height, width * 4, QImage.Format_ARGB32)
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        for index, (job, tile) in enumerate(zip(self._batch, self._tiles)):
+            tile.clear()
+            self._queued_paths.discard(job.model_path)
+            if job.model is None:
+                logger.warning("Could not load model for thumbnail: %s", job.model_path)
+                self.notifier.thumbnail_failed.emit(job.model_path)
+                continue
+
+            column, row = index % self.columns, index // self.columns
+            thumbnail = image.copy(
+                column * self.size, row * self.size, self.size, self.size
+            )
+            # Qt picks the format by extension, so it has to stay last.
+            temp_path = f"{job.cache_path[: -len('.png')]}.tmp.png"
+            if not thumbnail.save(temp_path):
+                logger.warning("Could not write thumbnail: %s", job.cache_path)
+                self.notifier.thumbnail_failed.emit(job.model_path)
+                continue
+            os.replace(temp_path, job.cache_path)
+            self.rendered += 1
+            self.notifier.thumbnail_ready.emit(job.model_path, job.cache_path)
+
+        logger.debug("Rendered %i thumbnails.", len(self._batch))
+        self._batch = []
+        self._image_modified = None
+
+    def get_statistics(self):
+        return {
+            "hashing": len(self._hashing),
+            "queued": len(self._queue),
+            "in_progress": len(self._batch),
+            "rendered": self.rendered,
+            "cache_hits": self.cache_hits,
+        }
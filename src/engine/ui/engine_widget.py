@@ -1,11 +1,19 @@
 import logging
 import time
 
-from PySide6.QtCore import Qt, QTimer, Signal, Slot
-from PySide6.QtGui import QImage, QMouseEvent, QPainter, QPixmap, QWheelEvent
+from PySide6.QtCore import QPoint, QRect, Qt, QTimer, Signal, Slot
+from PySide6.QtGui import (
+    QImage,
+    QMouseEvent,
+    QPainter,
+    QPixmap,
+    QRegion,
+    QWheelEvent,
+)
 from PySide6.QtWidgets import QWidget
 
 from ..core.engine_base import EngineBase
+from ..core.render_process import RemoteEngine
 from .input_handler import InputHandler
 
 logger = logging.getLogger(__name__)
@@ -15,7 +23,14 @@ class EngineWidget(QWidget):
     size_changed = Signal(int, int)
 
     def __init__(
-        self, fps_cap, min_width=250, status_bar=None, enable_hd_renderer=False
+        self,
+        fps_cap,
+        min_width=250,
+        status_bar=None,
+        enable_hd_renderer=False,
+        out_of_process=False,
+        threading_model="single",
+        snapshot_path=None,
     ):
         super().__init__()
         palette = self.palette()
@@ -25,7 +40,20 @@ class EngineWidget(QWidget):
         self.setMinimumWidth(min_width)
 
         self._width, self._height = self.size().width(), self.size().height()
-        self.engine = EngineBase(fps_cap, enable_hd_renderer)
+        if out_of_process:
+            self.engine = RemoteEngine(
+                fps_cap,
+                enable_hd_renderer,
+                threading_model,
+                snapshot_path=snapshot_path,
+            )
+        else:
+            self.engine = EngineBase(
+                fps_cap,
+                enable_hd_renderer,
+                threading_model,
+                snapshot_path=snapshot_path,
+            )
         self.pixmap = QPixmap()
         self.status_bar = status_bar
 
@@ -40,7 +68,7 @@ class EngineWidget(QWidget):
         self.engine.update_window_size(self._width, self._height)
         self.engine.start_frame_capture()
 
-        self.engine.notifier.frame_captured.connect(self._on_frame_captured)
+        self.engine.notifier.frame_updated.connect(self._on_frame_updated)
         self.size_changed.connect(self.engine.update_window_size)
 
         self.input_handler = InputHandler(self)
@@ -49,7 +77,11 @@ class EngineWidget(QWidget):
         if self.pixmap.isNull():
             return
         painter = QPainter(self)
-        self._draw_pixmap(painter, self.pixmap)
+        if self.pixmap.size() == self.size():
+            # Unscaled, so only the exposed part needs to be copied.
+            painter.drawPixmap(event.rect(), self.pixmap, event.rect())
+        else:
+            self._draw_pixmap(painter, self.pixmap)
         painter.end()
         self._update_timestamps()
 
@@ -73,11 +105,28 @@ class EngineWidget(QWidget):
     def wheelEvent(self, event: QWheelEvent):
         self.input_handler.handle_wheel(event)
 
-    @Slot(QImage)
-    def _on_frame_captured(self, q_image: QImage):
+    @Slot(QImage, list)
+    def _on_frame_updated(self, q_image: QImage, dirty_tiles: list):
         self.frame_captured_timestamp = time.time() * 1000
-        self.pixmap = QPixmap.fromImage(q_image)
-        self.update()
+
+        if self.pixmap.size() != q_image.size():
+            self.pixmap = QPixmap.fromImage(q_image)
+            self.update()
+            return
+
+        region = QRegion()
+        painter = QPainter(self.pixmap)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        for x, y, width, height in dirty_tiles:
+            tile = QRect(x, y, width, height)
+            painter.drawImage(QPoint(x, y), q_image, tile)
+            region += tile
+        painter.end()
+
+        if self.pixmap.size() == self.size():
+            self.update(region)
+        else:
+            self.update()
 
     def _emit_resize_event(self):
         if self.is_resizing:
@@ -96,24 +145,29 @@ class EngineWidget(QWidget):
             duration = self.frame_displayed_timestamp - self.frame_captured_timestamp
             logger.debug("Time taken to display frame: %.2f ms", duration)
 
-    def _draw_pixmap(self, painter, pixmap):
-        widget_width, widget_height = self.width(), self.height()
-        pixmap_rect = pixmap.rect()
-        pixmap_width, pixmap_height = pixmap_rect.width(), pixmap_rect.height()
-
-        scaled_pixmap = pixmap.scaled(
-            widget_width, widget_height, Qt.AspectRatioMode.KeepAspectRatioByExpanding
-        )
-        scaled_pixmap_width, scaled_pixmap_height = (
-            scaled_pixmap.width(),
-            scaled_pixmap.height(),
+    def _frame_rect(self, pixmap):
+        """Where ``_draw_pixmap`` draws the frame: scaled to cover the widget, centred."""
+        size = pixmap.size()
+        if size != self.size():
+            size = size.scaled(
+                self.size(), Qt.AspectRatioMode.KeepAspectRatioByExpanding
+            )
+        x_offset = (self.width() - size.width()) / 2
+        y_offset = (self.height() - size.height()) / 2
+        return x_offset, y_offset, size.width(), size.height()
+
+    def map_to_frame(self, x, y):
+        """Map a widget position to a pixel of the rendered frame, for picking."""
+        if self.pixmap.isNull():
+            return x, y
+        x_offset, y_offset, width, height = self._frame_rect(self.pixmap)
+        return (
+            int((x - x_offset) * self.pixmap.width() / width),
+            int((y - y_offset) * self.pixmap.height() / height),
         )
 
-        if (pixmap_width, pixmap_height) != (widget_width, widget_height):
-            x_offset = (widget_width - scaled_pixmap_width) / 2
-            y_offset = (widget_height - scaled_pixmap_height) / 2
-            painter.drawPixmap(x_offset, y_offset, scaled_pixmap)
-        else:
-            x_offset = (widget_width - pixmap_width) / 2
-            y_offset = (widget_height - pixmap_height) / 2
-            painter.drawPixmap(x_offset, y_offset, pixmap)
+    def _draw_pixmap(self, painter, pixmap):
+        x_offset, y_offset, width, height = self._frame_rect(pixmap)
+        if (width, height) != (pixmap.width(), pixmap.height()):
+            pixmap = pixmap.scaled(width, height)
+        painter.drawPixmap(x_offset, y_offset, pixmap)
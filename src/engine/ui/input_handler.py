@@ -1,8 +1,8 @@
 from enum import Enum
 
-from PySide6.QtCore import Qt
+from PySide6.QtCore import QRect, Qt
 from PySide6.QtGui import QMouseEvent, QWheelEvent
-from PySide6.QtWidgets import QWidget
+from PySide6.QtWidgets import QApplication, QRubberBand, QWidget
 
 from ..core.camera_controller import CameraMode
 
@@ -11,6 +11,7 @@ class MouseState(Enum):
     NONE = 0
     MIDDLE = 1
     RIGHT = 2
+    LEFT = 3
 
 
 class InputHandler:
@@ -22,6 +23,8 @@ class InputHandler:
 
         self.mouse_state = MouseState.NONE
         self._last_mouse_pos = None
+        self._selection_origin = None
+        self._rubber_band = QRubberBand(QRubberBand.Shape.Rectangle, widget)
 
     def _update_cursor(self, state: MouseState):
         cursor_map = {
@@ -40,19 +43,49 @@ class InputHandler:
             pos = self.camera_controller.get_position()
             x, y, z = map(int, [pos.x, pos.y, pos.z])
 
-            if self.camera_controller.mode == CameraMode.ORBIT:
-                orientation = self.camera_controller.gimbal.getHpr()
-            else:
-                orientation = self.camera_controller.camera.getHpr()
-
+            orientation = self.camera_controller.get_orientation()
             h, p, r = map(int, map(self._normalize_angle, orientation))
 
             self.status_bar.showMessage(
                 f"X={x}, Y={y}, Z={z} | H={h}, P={p}, R={r}", 500
             )
 
+    def _select(self, event: QMouseEvent):
+        """Click selects the object under the cursor, drag the ones in the marquee."""
+        extend = bool(
+            event.modifiers()
+            & (Qt.KeyboardModifier.ShiftModifier | Qt.KeyboardModifier.ControlModifier)
+        )
+        object_picker = self.engine.object_picker
+        if self._rubber_band.isVisible():
+            rect = self._rubber_band.geometry()
+            self._rubber_band.hide()
+            # The frame may be scaled to the widget, e.g. while a resize settles.
+            left, top = self.widget.map_to_frame(rect.left(), rect.top())
+            right, bottom = self.widget.map_to_frame(rect.right(), rect.bottom())
+            object_picker.select_rect(
+                left, top, right, bottom, extend, callback=self._show_selection
+            )
+        else:
+            position = event.pos()
+            x, y = self.widget.map_to_frame(position.x(), position.y())
+            object_picker.select_at(x, y, extend, callback=self._show_selection)
+
+    def _show_selection(self, names):
+        if self.status_bar and names is not None:
+            if not names:
+                self.status_bar.showMessage("Nothing selected", 2000)
+            elif len(names) == 1:
+                self.status_bar.showMessage(f"Selected: {names[0]}", 2000)
+            else:
+                self.status_bar.showMessage(f"Selected {len(names)} objects", 2000)
+
     def handle_mouse_press(self, event: QMouseEvent):
-        if event.button() == Qt.MouseButton.MiddleButton:
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.mouse_state = MouseState.LEFT
+            self._selection_origin = event.pos()
+            event.accept()
+        elif event.button() == Qt.MouseButton.MiddleButton:
             self.mouse_state = MouseState.MIDDLE
             self._last_mouse_pos = event.pos()
             event.accept()
@@ -63,12 +96,30 @@ class InputHandler:
         self._update_cursor(self.mouse_state)
 
     def handle_mouse_release(self, event: QMouseEvent):
-        if event.button() in (Qt.MouseButton.MiddleButton, Qt.MouseButton.RightButton):
+        if event.button() == Qt.MouseButton.LeftButton and self._selection_origin:
+            self._select(event)
+            self._selection_origin = None
+            self.mouse_state = MouseState.NONE
+            event.accept()
+        elif event.button() in (
+            Qt.MouseButton.MiddleButton,
+            Qt.MouseButton.RightButton,
+        ):
             self.mouse_state = MouseState.NONE
             event.accept()
         self._update_cursor(self.mouse_state)
 
     def handle_mouse_move(self, event: QMouseEvent):
+        if self.mouse_state == MouseState.LEFT:
+            drag = event.pos() - self._selection_origin
+            if drag.manhattanLength() >= QApplication.startDragDistance():
+                self._rubber_band.setGeometry(
+                    QRect(self._selection_origin, event.pos()).normalized()
+                )
+                self._rubber_band.show()
+            event.accept()
+            return
+
         if self._last_mouse_pos is None:
             return
 
@@ -98,12 +149,8 @@ class InputHandler:
             delta_x *= -orientation_sensitivity
             delta_y *= -orientation_sensitivity
 
-            if self.camera_controller.mode == CameraMode.ORBIT:
-                h, p, r = self.camera_controller.gimbal.getHpr()
-                self.camera_controller.set_orientation(h=h + delta_x, p=p + delta_y)
-            else:
-                h, p, r = self.camera_controller.camera.getHpr()
-                self.camera_controller.set_orientation(h=h + delta_x, p=p + delta_y)
+            h, p, r = self.camera_controller.get_orientation()
+            self.camera_controller.set_orientation(h=h + delta_x, p=p + delta_y)
 
             self._update_status_bar()
 
@@ -0,0 +1,200 @@
+"""
+Asset packs: directories of assets bundled into Panda3D Multifiles.
+
+Models are stored converted to BAM and images as TXO textures with mipmaps
+and DXT compression, so loading them needs no converter or image decoder.
+A pack is mounted into the virtual file system over the directory it was
+built from, so one archive is opened instead of one file per asset and the
+loose files stay as the fallback when no pack was built.
+"""
+
+import logging
+import os
+import time
+
+from panda3d.core import (
+    BamFile,
+    BamWriter,
+    Filename,
+    Loader,
+    LoaderOptions,
+    Multifile,
+    StringStream,
+    Texture,
+    VirtualFileSystem,
+    getModelPath,
+)
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RESOURCES_DIR = os.path.join(SRC_DIR, "resources")
+PACKS_DIR = os.path.join(SRC_DIR, "packs")
+RESOURCES_PACK = "resources.mf"
+# Read by Qt, which can't see the virtual file system.
+RESOURCES_PACK_EXCLUDE = ("icon.png", "panda3d_icon.png")
+# Other packs are asset libraries, mounted here and added to the model path.
+LIBRARY_MOUNT_POINT = "/assets"
+
+MODEL_EXTENSIONS = {".bam", ".egg", ".glb", ".gltf", ".obj"}
+TEXTURE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".tga"}
+PACKED_EXTENSIONS = {
+    **{extension: "bam" for extension in MODEL_EXTENSIONS},
+    **{extension: "txo" for extension in TEXTURE_EXTENSIONS},
+}
+
+_mounted_packs = {}
+
+
+def _pack_model(source_path):
+    options = LoaderOptions(LoaderOptions.LF_report_errors | LoaderOptions.LF_no_cache)
+    node = Loader.getGlobalPtr().loadSync(Filename.fromOsSpecific(source_path), options)
+    if node is None:
+        raise OSError(f"Could not load model: {source_path}")
+
+    # Textures are embedded, paths relative to the source would not resolve.
+    stream = StringStream()
+    bam_file = BamFile()
+    bam_file.openWrite(stream)
+    bam_file.getWriter().setFileTextureMode(BamWriter.BTM_rawdata)
+    bam_file.writeObject(node)
+    bam_file.close()
+    return stream.getData()
+
+
+def prepare_texture(texture, compress=True):
+    """
+    Generate the mipmaps of a texture's RAM image and compress it with the
+    DXT format matching its channels, as it is stored in packs and caches.
+    """
+    texture.generateRamMipmapImages()
+    if compress:
+        if texture.getNumComponents() in (2, 4):
+            compression = Texture.CM_dxt5
+        else:
+            compression = Texture.CM_dxt1
+        texture.compressRamImage(compression, Texture.QL_best, None)
+
+
+def _pack_texture(source_path, compress):
+    texture = Texture()
+    if not texture.read(Filename.fromOsSpecific(source_path)):
+        raise OSError(f"Could not load texture: {source_path}")
+    prepare_texture(texture, compress)
+    # The fullpath would point at the loose file, not at the pack.
+    texture.clearFullpath()
+    stream = StringStream()
+    if not texture.writeTxo(stream, source_path):
+        raise OSError(f"Could not convert texture: {source_path}")
+    return stream.getData()
+
+
+def build_pack(source_dir, pack_path, compress_textures=True, exclude=()):
+    """
+    Bundle every file below ``source_dir`` into a Multifile at ``pack_path``.
+    Models and images are converted, other files are stored as they are.
+    ``exclude`` lists paths relative to ``source_dir`` to leave out.
+    Returns the number of files packed.
+    """
+    start = time.perf_counter()
+    multifile = Multifile()
+    temp_path = f"{pack_path}.tmp"
+    if not multifile.openWrite(Filename.fromOsSpecific(temp_path)):
+        raise OSError(f"Could not write asset pack: {pack_path}")
+
+    # The Multifile reads added streams when it is written, keep them alive.
+    streams = []
+    for directory, _directories, file_names in os.walk(source_dir):
+        for file_name in sorted(file_names):
+            source_path = os.path.join(directory, file_name)
+            name = os.path.relpath(source_path, source_dir).replace(os.sep, "/")
+            if name in exclude:
+                continue
+            stem, extension = os.path.splitext(name)
+            extension = extension.lower()
+
+            if extension in MODEL_EXTENSIONS:
+                data = _pack_model(source_path)
+            elif extension in TEXTURE_EXTENSIONS:
+                data = _pack_texture(source_path, compress_textures)
+            else:
+                multifile.addSubfile(name, Filename.fromOsSpecific(source_path), 0)
+                continue
+            streams.append(StringStream(data))
+            multifile.addSubfile(
+                f"{stem}.{PACKED_EXTENSIONS[extension]}", streams[-1], 0
+            )
+
+    count = multifile.getNumSubfiles()
+    multifile.close()
+    os.replace(temp_path, pack_path)
+    logger.info(
+        "Packed %i files from %s into %s in %.2f s.",
+        count,
+        source_dir,
+        pack_path,
+        time.perf_counter() - start,
+    )
+    return count
+
+
+def build_resources_pack(packs_dir=PACKS_DIR, compress_textures=True):
+    os.makedirs(packs_dir, exist_ok=True)
+    return build_pack(
+        RESOURCES_DIR,
+        os.path.join(packs_dir, RESOURCES_PACK),
+        compress_textures,
+        RESOURCES_PACK_EXCLUDE,
+    )
+
+
+def mount_asset_packs(packs_dir=PACKS_DIR):
+    """
+    Mount the packs found in ``packs_dir``: the resources pack over the
+    resources directory and every other pack as an asset library on the
+    model path, where converted models are found by their ``.bam`` name.
+    Packs mounted before are skipped. Returns the mount points.
+    """
+    if not os.path.isdir(packs_dir):
+        return []
+
+    vfs = VirtualFileSystem.getGlobalPtr()
+    mount_points = []
+    for file_name in sorted(os.listdir(packs_dir)):
+        pack_path = os.path.join(packs_dir, file_name)
+        if not file_name.endswith(".mf") or pack_path in _mounted_packs:
+            continue
+
+        if file_name == RESOURCES_PACK:
+            mount_point = Filename.fromOsSpecific(RESOURCES_DIR)
+        else:
+            mount_point = Filename(LIBRARY_MOUNT_POINT, file_name[: -len(".mf")])
+        if not vfs.mount(
+            Filename.fromOsSpecific(pack_path),
+            mount_point,
+            VirtualFileSystem.MFReadOnly,
+        ):
+            logger.warning("Could not mount asset pack: %s", pack_path)
+            continue
+        if file_name != RESOURCES_PACK:
+            getModelPath().appendDirectory(mount_point)
+
+        _mounted_packs[pack_path] = mount_point
+        mount_points.append(mount_point)
+        logger.info("Mounted asset pack %s at %s.", pack_path, mount_point)
+    return mount_points
+
+
+def resource_path(*parts):
+    """
+    Path of a file in the resources directory, as Panda3D should load it:
+    the converted copy if the resources pack is mounted, the file otherwise.
+    """
+    filename = Filename.fromOsSpecific(os.path.join(RESOURCES_DIR, *parts))
+    packed_extension = PACKED_EXTENSIONS.get(f".{filename.getExtension().lower()}")
+    if packed_extension is not None and _mounted_packs:
+        packed = Filename(filename)
+        packed.setExtension(packed_extension)
+        if VirtualFileSystem.getGlobalPtr().exists(packed):
+            return packed
+    return filename
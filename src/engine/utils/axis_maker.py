@@ -1,15 +1,23 @@
-import os
-
 from panda3d.core import (
     BillboardEffect,
     CardMaker,
-    Filename,
     LColor,
     LineSegs,
     NodePath,
+    PNMImage,
+    Point2,
+    SamplerState,
+    Texture,
     Vec3,
 )
 
+from .asset_packs import resource_path
+
+ATLAS_TEXTURES = ("circle.png", "circle_border.png", "X.png", "Y.png", "Z.png")
+# The markers are drawn a few dozen pixels wide, smaller tiles will do.
+ATLAS_TILE_SIZE = 128
+ATLAS_COLUMNS = 4
+
 
 class AxisIndicator:
     """
@@ -23,6 +31,10 @@ class AxisIndicator:
         self.root = NodePath("axis_indicator")
         self.loader = loader
         self.line_segs = LineSegs()
+        self.atlas = None
+        self.uv_ranges = {}
+        if self.loader:
+            self._create_atlas()
 
         self._create_axis(
             direction=Vec3(0.75, 0, 0),
@@ -40,6 +52,41 @@ class AxisIndicator:
             label="Z",
         )
 
+    def _create_atlas(self):
+        """
+        Packs the marker textures into one, so the markers share a texture
+        and render in one state.
+        """
+        rows = -(-len(ATLAS_TEXTURES) // ATLAS_COLUMNS)
+        width, height = ATLAS_COLUMNS * ATLAS_TILE_SIZE, rows * ATLAS_TILE_SIZE
+        atlas_image = PNMImage(width, height, 4)
+        atlas_image.fill_val(0, 0, 0)
+        atlas_image.alpha_fill_val(0)
+
+        for index, texture_file in enumerate(ATLAS_TEXTURES):
+            # Read directly, the textures only live on in the atlas.
+            texture, image = Texture(), PNMImage()
+            if not texture.read(resource_path("textures", texture_file)):
+                raise OSError(f"Could not load texture: {texture_file}")
+            if not texture.store(image):
+                raise OSError(f"Could not read texture: {texture_file}")
+            tile = PNMImage(ATLAS_TILE_SIZE, ATLAS_TILE_SIZE, 4)
+            tile.gaussian_filter_from(1.0, image)
+
+            column, row = index % ATLAS_COLUMNS, index // ATLAS_COLUMNS
+            atlas_image.copy_sub_image(
+                tile, column * ATLAS_TILE_SIZE, row * ATLAS_TILE_SIZE
+            )
+            # Image rows count down from the top, texture coordinates up.
+            self.uv_ranges[texture_file] = (
+                Point2(column / ATLAS_COLUMNS, 1 - (row + 1) / rows),
+                Point2((column + 1) / ATLAS_COLUMNS, 1 - row / rows),
+            )
+
+        self.atlas = Texture("axis_indicator_atlas")
+        self.atlas.load(atlas_image)
+        self.atlas.set_minfilter(SamplerState.FT_linear_mipmap_linear)
+
     def _create_axis(self, direction, color, label):
         """
         Creates an axis line, labels it, and adds visual markers at the ends.
@@ -104,19 +151,12 @@ class AxisIndicator:
         """
         card_maker = CardMaker("circle")
         card_maker.set_frame(-0.5, 0.5, -0.5, 0.5)
+        if self.atlas is not None:
+            card_maker.set_uv_range(*self.uv_ranges[texture_file])
         circle_node = self.root.attach_new_node(card_maker.generate())
 
-        if self.loader:
-            texture_path = os.path.join(
-                os.path.dirname(
-                    os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-                ),
-                "resources",
-                "textures",
-                texture_file,
-            )
-            texture = self.loader.load_texture(Filename.from_os_specific(texture_path))
-            circle_node.set_texture(texture)
+        if self.atlas is not None:
+            circle_node.set_texture(self.atlas)
 
         circle_node.set_scale(scale)
         circle_node.set_pos(position)
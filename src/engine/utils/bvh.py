@@ -0,0 +1,263 @@
+"""
+Bounding volume hierarchy over axis-aligned boxes, kept in NumPy arrays.
+
+Objects are integer slots with a (low, high) box. The tree is built by median
+splits along the longest axis. Moved objects only refit the boxes of their
+leaves and the ancestors of those, added objects are tested linearly until enough of them pile up to warrant a rebuild.
+Queries walk the tree breadth-first, one vectorized test per level.
+"""
+
+import numpy as np
+
+DEFAULT_LEAF_SIZE = 8
+# Added objects are tested linearly until they exceed this share of the tree.
+REBUILD_FRACTION = 0.1
+MIN_PENDING = 64
+
+
+class BoundingVolumeHierarchy:
+    def __init__(self, leaf_size=DEFAULT_LEAF_SIZE):
+        self.leaf_size = leaf_size
+        self.lows = np.empty((0, 3), dtype=np.float64)
+        self.highs = np.empty((0, 3), dtype=np.float64)
+        self.active = np.empty(0, dtype=bool)
+        self._pending = []
+        self._dirty_leaves = []
+        self._build_tree()
+
+    def __len__(self):
+        return int(self.active.sum())
+
+    def build(self, lows, highs):
+        """Replace every object. Slots are the row indices of ``lows``."""
+        self.lows = np.array(lows, dtype=np.float64).reshape(-1, 3)
+        self.highs = np.array(highs, dtype=np.float64).reshape(-1, 3)
+        self.active = np.ones(len(self.lows), dtype=bool)
+        self._pending = []
+        self._build_tree()
+
+    def rebuild(self):
+        """Rebuild the tree over the current boxes, including added objects."""
+        self._pending = []
+        self._build_tree()
+
+    def add(self, low, high):
+        """Add an object and return its slot."""
+        slot = len(self.lows)
+        self.lows = np.vstack([self.lows, np.asarray(low, dtype=np.float64)])
+        self.highs = np.vstack([self.highs, np.asarray(high, dtype=np.float64)])
+        self.active = np.append(self.active, True)
+        self._pending.append(slot)
+        if len(self._pending) > max(MIN_PENDING, REBUILD_FRACTION * len(self.lows)):
+            self.rebuild()
+        return slot
+
+    def remove(self, slot):
+        """Remove an object. Its slot is not reused until the next build."""
+        slot = np.array([slot], dtype=np.int64)
+        self.active[slot] = False
+        # An empty box never intersects anything and never grows a node box.
+        self.lows[slot] = np.inf
+        self.highs[slot] = -np.inf
+        self._mark_dirty(slot)
+
+    def update(self, slots, lows, highs):
+        """Set new boxes for moved objects; the tree is refit before the next query."""
+        slots = np.asarray(slots, dtype=np.int64).reshape(-1)
+        self.lows[slots] = np.asarray(lows, dtype=np.float64).reshape(-1, 3)
+        self.highs[slots] = np.asarray(highs, dtype=np.float64).reshape(-1, 3)
+        self._mark_dirty(slots)
+
+    def _mark_dirty(self, slots):
+        # Pending slots are not in the tree yet, so there is nothing to refit.
+        leaves = self.slot_leaves[slots[slots < len(self.slot_leaves)]]
+        self._dirty_leaves.append(leaves[leaves >= 0])
+
+    def _build_tree(self):
+        indexed = np.flatnonzero(self.active)
+        self.order = indexed.copy()
+        centers = (
+            (self.lows[indexed] + self.highs[indexed]) / 2 if len(indexed) else None
+        )
+
+        left, right, parents, start, count, depth = [], [], [], [], [], []
+        # (first index into order, object count, depth, parent, is right child)
+        stack = [(0, len(indexed), 0, -1, False)]
+        while stack:
+            first, size, node_depth, parent, is_right = stack.pop()
+            node = len(left)
+            left.append(-1)
+            right.append(-1)
+            parents.append(parent)
+            start.append(first)
+            count.append(size)
+            depth.append(node_depth)
+            if parent >= 0:
+                (right if is_right else left)[parent] = node
+            if size <= self.leaf_size:
+                continue
+
+            # Median split along the longest axis of the object centers.
+            span = slice(first, first + size)
+            node_centers = centers[span]
+            axis = np.argmax(node_centers.max(axis=0) - node_centers.min(axis=0))
+            half = size // 2
+            partition = np.argpartition(node_centers[:, axis], half)
+            self.order[span] = self.order[span][partition]
+            centers[span] = node_centers[partition]
+            stack.append((first + half, size - half, node_depth + 1, node, True))
+            stack.append((first, half, node_depth + 1, node, False))
+
+        self.left = np.array(left, dtype=np.int64)
+        self.right = np.array(right, dtype=np.int64)
+        self.parents = np.array(parents, dtype=np.int64)
+        self.start = np.array(start, dtype=np.int64)
+        self.count = np.array(count, dtype=np.int64)
+        self.depth = np.array(depth, dtype=np.int64)
+        self.is_leaf = self.left < 0
+        self._leaves = np.flatnonzero(self.is_leaf & (self.count > 0))
+        self._leaves = self._leaves[np.argsort(self.start[self._leaves])]
+        self.slot_leaves = np.full(len(self.lows), -1, dtype=np.int64)
+        self.slot_leaves[self.order] = np.repeat(self._leaves, self.count[self._leaves])
+        self._levels = [
+            np.flatnonzero((self.depth == level) & ~self.is_leaf)
+            for level in range(int(self.depth.max()) + 1 if len(self.depth) else 0)
+        ]
+        self.node_lows = np.full((len(left), 3), np.inf)
+        self.node_highs = np.full((len(left), 3), -np.inf)
+        self._refit()
+
+    def _refit(self):
+        """Recompute node boxes bottom-up: leaves from objects, then level by level."""
+        self._dirty_leaves = []
+        if len(self._leaves):
+            leaf_starts = self.start[self._leaves]
+            self.node_lows[self._leaves] = np.minimum.reduceat(
+                self.lows[self.order], leaf_starts
+            )
+            self.node_highs[self._leaves] = np.maximum.reduceat(
+                self.highs[self.order], leaf_starts
+            )
+        for nodes in reversed(self._levels):
+            self.node_lows[nodes] = np.minimum(
+                self.node_lows[self.left[nodes]], self.node_lows[self.right[nodes]]
+            )
+            self.node_highs[nodes] = np.maximum(
+                self.node_highs[self.left[nodes]], self.node_highs[self.right[nodes]]
+            )
+
+    def _refit_dirty(self):
+        """Recompute the boxes of the dirty leaves and of their ancestors only."""
+        leaves = np.unique(np.concatenate(self._dirty_leaves))
+        self._dirty_leaves = []
+        if len(leaves) > len(self._leaves) // 4:
+            self._refit()
+            return
+
+        counts = self.count[leaves]
+        slots = self.order[_expand_ranges(self.start[leaves], counts)]
+        first_rows = np.cumsum(counts) - counts
+        self.node_lows[leaves] = np.minimum.reduceat(self.lows[slots], first_rows)
+        self.node_highs[leaves] = np.maximum.reduceat(self.highs[slots], first_rows)
+
+        nodes = np.unique(self.parents[leaves])
+        nodes = nodes[nodes >= 0]
+        while len(nodes):
+            # Children are always deeper, so refit the deepest nodes first.
+            deepest = self.depth[nodes] == self.depth[nodes].max()
+            level, nodes = nodes[deepest], nodes[~deepest]
+            self.node_lows[level] = np.minimum(
+                self.node_lows[self.left[level]], self.node_lows[self.right[level]]
+            )
+            self.node_highs[level] = np.maximum(
+                self.node_highs[self.left[level]], self.node_highs[self.right[level]]
+            )
+            nodes = np.union1d(nodes, self.parents[level])
+            nodes = nodes[nodes >= 0]
+
+    def _query(self, test):
+        """
+        Returns the active slots whose boxes pass ``test(lows, highs)``, a
+        vectorized predicate that must also hold for any box enclosing them.
+        """
+        if self._dirty_leaves:
+            self._refit_dirty()
+
+        hit_leaves = []
+        frontier = np.zeros(1, dtype=np.int64) if len(self.left) else self.left
+        while len(frontier):
+            frontier = frontier[
+                test(self.node_lows[frontier], self.node_highs[frontier])
+            ]
+            leaves = self.is_leaf[frontier]
+            hit_leaves.append(frontier[leaves])
+            inner = frontier[~leaves]
+            frontier = np.concatenate([self.left[inner], self.right[inner]])
+
+        hit_leaves = np.concatenate(hit_leaves) if hit_leaves else self.left[:0]
+        candidates = self.order[
+            _expand_ranges(self.start[hit_leaves], self.count[hit_leaves])
+        ]
+        if self._pending:
+            candidates = np.concatenate([candidates, self._pending])
+        candidates = candidates[self.active[candidates]]
+        return candidates[test(self.lows[candidates], self.highs[candidates])]
+
+    def query_box(self, low, high):
+        """Slots whose boxes intersect the box from ``low`` to ``high``."""
+        low = np.asarray(low, dtype=np.float64)
+        high = np.asarray(high, dtype=np.float64)
+        return self._query(
+            lambda lows, highs: np.all((lows <= high) & (highs >= low), axis=1)
+        )
+
+    def query_planes(self, planes):
+        """
+        Slots whose boxes are not entirely outside any of the planes, given as
+        (a, b, c, d) rows with normals pointing outwards, e.g. a view frustum.
+        """
+        planes = np.asarray(planes, dtype=np.float64).reshape(-1, 4)
+        normals, offsets = planes[:, :3], planes[:, 3]
+        positive = normals > 0
+
+        def test(lows, highs):
+            # The corner of each box that lies furthest inside each plane.
+            nearest = np.where(positive[None], lows[:, None], highs[:, None])
+            distances = np.einsum("npk,pk->np", nearest, normals) + offsets
+            return np.all(distances <= 0, axis=1)
+
+        return self._query(test)
+
+    def query_ray(self, origin, direction, max_distance=np.inf):
+        """
+        Slots whose boxes the ray hits within ``max_distance``, sorted by the
+        distance at which the ray enters them. Returns (slots, distances).
+        """
+        origin = np.asarray(origin, dtype=np.float64)
+        direction = np.asarray(direction, dtype=np.float64)
+        with np.errstate(divide="ignore"):
+            inverse = 1 / direction
+
+        def entry_distances(lows, highs):
+            with np.errstate(invalid="ignore"):
+                first = (lows - origin) * inverse
+                second = (highs - origin) * inverse
+            near = np.nan_to_num(np.minimum(first, second), nan=-np.inf).max(axis=1)
+            far = np.nan_to_num(np.maximum(first, second), nan=np.inf).min(axis=1)
+            near = np.maximum(near, 0)
+            return np.where((near <= far) & (near <= max_distance), near, np.inf)
+
+        slots = self._query(
+            lambda lows, highs: np.isfinite(entry_distances(lows, highs))
+        )
+        distances = entry_distances(self.lows[slots], self.highs[slots])
+        sorted_hits = np.argsort(distances)
+        return slots[sorted_hits], distances[sorted_hits]
+
+
+def _expand_ranges(starts, counts):
+    """Concatenates ``arange(start, start + count)`` for every pair."""
+    if not len(counts):
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return offsets + np.arange(counts.sum())
@@ -0,0 +1,407 @@
+"""
+NumPy views of Panda3D geometry.
+
+Vertex columns and index arrays are read and written through the buffer
+protocol, without per-vertex Python calls, so whole meshes can be processed as
+arrays and built from them.
+"""
+
+import numpy as np
+from panda3d.core import (
+    Geom,
+    GeomEnums,
+    GeomLines,
+    GeomNode,
+    GeomPoints,
+    GeomTriangles,
+    GeomVertexArrayFormat,
+    GeomVertexData,
+    GeomVertexFormat,
+    InternalName,
+    NodePath,
+)
+
+NUMERIC_TYPES = {
+    GeomEnums.NT_uint8: np.uint8,
+    GeomEnums.NT_uint16: np.uint16,
+    GeomEnums.NT_uint32: np.uint32,
+    GeomEnums.NT_int8: np.int8,
+    GeomEnums.NT_int16: np.int16,
+    GeomEnums.NT_int32: np.int32,
+    GeomEnums.NT_float32: np.float32,
+    GeomEnums.NT_float64: np.float64,
+}
+
+PRIMITIVE_TYPES = {
+    "points": GeomPoints,
+    "lines": GeomLines,
+    "triangles": GeomTriangles,
+}
+VERTICES_PER_PRIMITIVE = {"points": 1, "lines": 2, "triangles": 3}
+# Primitives per Geom of generated geometry. Chunks are culled separately.
+DEFAULT_CHUNK_SIZE = 65536
+# Bits per axis of the grid used to sort primitives into compact chunks.
+SPATIAL_ORDER_BITS = 10
+
+
+def column_array(vertex_data, name=InternalName.getVertex(), writable=False):
+    """
+    Returns a (rows, components) view of one vertex column, or None if the
+    vertex data has no such column. A writable view modifies the vertex data
+    in place.
+    """
+    vertex_format = vertex_data.getFormat()
+    array_index = vertex_format.getArrayWith(name)
+    if array_index < 0:
+        return None
+
+    array_data = (
+        vertex_data.modifyArray(array_index)
+        if writable
+        else vertex_data.getArray(array_index)
+    )
+    column = vertex_format.getArray(array_index).getColumn(name)
+    return _column_view(array_data, column)
+
+
+def _column_view(array_data, column):
+    # Rows are exported as structs, padded rows as a strided buffer that can
+    # not be read as raw bytes, so the column is located by its field offset.
+    rows = np.asarray(memoryview(array_data))
+    if rows.dtype.fields is None:
+        first_component = rows.reshape(len(rows), -1)[:, 0]
+    else:
+        field = next(
+            field
+            for field, (_dtype, offset) in rows.dtype.fields.items()
+            if offset == column.getStart()
+        )
+        first_component = rows[field]
+        if first_component.ndim > 1:
+            first_component = first_component[:, 0]
+
+    dtype = np.dtype(NUMERIC_TYPES[column.getNumericType()])
+    return np.lib.stride_tricks.as_strided(
+        first_component.view(dtype),
+        shape=(len(rows), column.getNumComponents()),
+        strides=(rows.strides[0], dtype.itemsize),
+        writeable=rows.flags.writeable,
+    )
+
+
+def vertex_positions(vertex_data):
+    """Returns the (rows, 3) vertex positions of the vertex data."""
+    return column_array(vertex_data)[:, :3]
+
+
+def triangle_indices(geom):
+    """Returns the (triangles, 3) vertex indices of all polygon primitives."""
+    triangles = []
+    for index in range(geom.getNumPrimitives()):
+        primitive = geom.getPrimitive(index)
+        if primitive.getPrimitiveType() != Geom.PT_polygons:
+            continue
+        primitive = primitive.decompose()
+        if not primitive.isIndexed():
+            start = primitive.getFirstVertex()
+            triangles.append(
+                np.arange(start, start + primitive.getNumVertices()).reshape(-1, 3)
+            )
+            continue
+        indices = np.frombuffer(
+            memoryview(primitive.getVertices()),
+            dtype=NUMERIC_TYPES[primitive.getIndexType()],
+        )
+        triangles.append(indices.reshape(-1, 3))
+
+    if not triangles:
+        return np.empty((0, 3), dtype=np.int64)
+    return np.concatenate(triangles).astype(np.int64)
+
+
+def make_primitive(primitive, indices, usage_hint=Geom.UH_static):
+    """
+    Builds an indexed primitive of a PRIMITIVE_TYPES kind from an index array,
+    with 16-bit indices when they fit.
+    """
+    indices = np.asarray(indices).reshape(-1)
+    if len(indices) and indices.max() >= 0xFFFF:
+        index_type, dtype = GeomEnums.NT_uint32, np.uint32
+    else:
+        index_type, dtype = GeomEnums.NT_uint16, np.uint16
+
+    geom_primitive = PRIMITIVE_TYPES[primitive](usage_hint)
+    geom_primitive.setIndexType(index_type)
+    index_array = geom_primitive.modifyVertices()
+    index_array.uncleanSetNumRows(len(indices))
+    np.frombuffer(memoryview(index_array), dtype=dtype)[:] = indices
+    return geom_primitive
+
+
+def make_triangles(indices, usage_hint=Geom.UH_static):
+    """Builds an indexed GeomTriangles from a (triangles, 3) index array."""
+    return make_primitive("triangles", indices, usage_hint)
+
+
+def make_vertex_format(normals=False, colors=False):
+    """Registered single-array format with positions, and optionally normals and colors."""
+    array_format = GeomVertexArrayFormat()
+    array_format.addColumn(
+        InternalName.getVertex(), 3, GeomEnums.NT_float32, GeomEnums.C_point
+    )
+    if normals:
+        array_format.addColumn(
+            InternalName.getNormal(), 3, GeomEnums.NT_float32, GeomEnums.C_normal
+        )
+    if colors:
+        array_format.addColumn(
+            InternalName.getColor(), 4, GeomEnums.NT_uint8, GeomEnums.C_color
+        )
+    return GeomVertexFormat.registerFormat(GeomVertexFormat(array_format))
+
+
+def _row_dtype(array_format):
+    """NumPy structured dtype laid out exactly like a row of the array format."""
+    names, formats, offsets = [], [], []
+    for column in array_format.getColumns():
+        names.append(column.getName().getName())
+        formats.append(
+            (NUMERIC_TYPES[column.getNumericType()], (column.getNumComponents(),))
+        )
+        offsets.append(column.getStart())
+    return np.dtype(
+        {
+            "names": names,
+            "formats": formats,
+            "offsets": offsets,
+            "itemsize": array_format.getStride(),
+        }
+    )
+
+
+def _color_bytes(colors):
+    """RGB or RGBA colors, as floats in 0-1 or bytes, to (N, 4) bytes."""
+    colors = np.asarray(colors)
+    if colors.dtype != np.uint8:
+        colors = np.round(np.clip(colors, 0, 1) * 255).astype(np.uint8)
+    if colors.shape[1] == 3:
+        colors = np.concatenate(
+            [colors, np.full((len(colors), 1), 255, dtype=np.uint8)], axis=1
+        )
+    return colors
+
+
+def make_vertex_data(
+    vertices, normals=None, colors=None, usage_hint=Geom.UH_static, name="vertices"
+):
+    """
+    Builds vertex data from (N, 3) positions and optional (N, 3) normals and
+    (N, 3 or 4) colors. The rows are interleaved in NumPy and copied into the
+    vertex array in one go.
+    """
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    vertex_format = make_vertex_format(normals is not None, colors is not None)
+
+    rows = np.empty(len(vertices), dtype=_row_dtype(vertex_format.getArray(0)))
+    rows["vertex"] = vertices
+    if normals is not None:
+        rows["normal"] = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+    if colors is not None:
+        rows["color"] = _color_bytes(colors)
+
+    vertex_data = GeomVertexData(name, vertex_format, usage_hint)
+    array_data = vertex_data.modifyArray(0)
+    array_data.uncleanSetNumRows(len(rows))
+    np.frombuffer(memoryview(array_data).cast("B"), dtype=np.uint8)[:] = rows.view(
+        np.uint8
+    )
+    return vertex_data
+
+
+def subset_vertex_data(vertex_data, rows):
+    """Copy of the vertex data with only the given rows, in that order."""
+    subset = GeomVertexData(
+        vertex_data.getName(), vertex_data.getFormat(), vertex_data.getUsageHint()
+    )
+    subset.uncleanSetNumRows(len(rows))
+    for index in range(vertex_data.getNumArrays()):
+        stride = vertex_data.getFormat().getArray(index).getStride()
+        data = np.frombuffer(
+            vertex_data.getArray(index).getHandle().getData(), dtype=np.uint8
+        )
+        subset.modifyArray(index).modifyHandle().setData(
+            data.reshape(-1, stride)[rows].tobytes()
+        )
+    return subset
+
+
+def _spread_bits(values):
+    """Moves bit ``i`` of each value to bit ``3 * i``, for up to 21 bits."""
+    values = values.astype(np.uint64) & np.uint64(0x1FFFFF)
+    for shift, mask in (
+        (32, 0x1F00000000FFFF),
+        (16, 0x1F0000FF0000FF),
+        (8, 0x100F00F00F00F00F),
+        (4, 0x10C30C30C30C30C3),
+        (2, 0x1249249249249249),
+    ):
+        values = (values | values << np.uint64(shift)) & np.uint64(mask)
+    return values
+
+
+def spatial_order(points, bits=SPATIAL_ORDER_BITS):
+    """Order of the points along a Morton curve, so neighbors stay together."""
+    low = points.min(axis=0)
+    extent = np.maximum(points.max(axis=0) - low, 1e-9)
+    cells = ((points - low) / extent * ((1 << bits) - 1)).astype(np.uint32)
+    codes = (
+        _spread_bits(cells[:, 0])
+        | _spread_bits(cells[:, 1]) << np.uint64(1)
+        | _spread_bits(cells[:, 2]) << np.uint64(2)
+    )
+    return np.argsort(codes)
+
+
+def make_geometry(
+    vertices,
+    indices=None,
+    normals=None,
+    colors=None,
+    primitive="triangles",
+    chunk_size=DEFAULT_CHUNK_SIZE,
+    name="geometry",
+):
+    """
+    Builds a node with points, lines or triangles from NumPy arrays.
+
+    ``indices`` is an (N, 2) or (N, 3) array for lines and triangles, or None
+    for consecutive vertices; points take no indices. Inputs of more than
+    ``chunk_size`` primitives are sorted spatially and split into one GeomNode
+    per chunk, each with only the vertices it uses, so they cull separately.
+    """
+    if primitive not in PRIMITIVE_TYPES:
+        raise ValueError(
+            f"Invalid primitive: {primitive}. "
+            f"Valid values are {list(PRIMITIVE_TYPES)}."
+        )
+    vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, 3)
+    if normals is not None:
+        normals = np.asarray(normals, dtype=np.float32).reshape(-1, 3)
+    if colors is not None:
+        colors = _color_bytes(colors)
+    size = VERTICES_PER_PRIMITIVE[primitive]
+    if primitive == "points":
+        indices = None
+    elif indices is None:
+        indices = np.arange(len(vertices) - len(vertices) % size).reshape(-1, size)
+    else:
+        indices = np.asarray(indices, dtype=np.int64).reshape(-1, size)
+
+    root = NodePath(name)
+    count = len(vertices) if indices is None else len(indices)
+    if count <= chunk_size:
+        _attach_chunk(root, name, primitive, vertices, normals, colors, indices)
+        return root
+
+    if indices is None:
+        order = spatial_order(vertices)
+    else:
+        order = spatial_order(vertices[indices].mean(axis=1))
+    for chunk, start in enumerate(range(0, count, chunk_size)):
+        selected = order[start : start + chunk_size]
+        if indices is None:
+            used, chunk_indices = selected, None
+        else:
+            used, chunk_indices = np.unique(indices[selected], return_inverse=True)
+            chunk_indices = chunk_indices.reshape(-1, size)
+        _attach_chunk(
+            root,
+            f"{name}_{chunk}",
+            primitive,
+            vertices[used],
+            None if normals is None else normals[used],
+            None if colors is None else colors[used],
+            chunk_indices,
+        )
+    return root
+
+
+def _attach_chunk(root, name, primitive, vertices, normals, colors, indices):
+    vertex_data = make_vertex_data(vertices, normals, colors, name=name)
+    if indices is None:
+        geom_primitive = PRIMITIVE_TYPES[primitive](Geom.UH_static)
+        geom_primitive.addConsecutiveVertices(0, len(vertices))
+    else:
+        geom_primitive = make_primitive(primitive, indices)
+
+    geom = Geom(vertex_data)
+    geom.addPrimitive(geom_primitive)
+    geom_node = GeomNode(name)
+    geom_node.addGeom(geom)
+    root.attachNewNode(geom_node)
+
+
+def count_triangles(node_path):
+    """Counts the triangles of all polygon primitives under a node."""
+    geom_nodes = list(node_path.findAllMatches("**/+GeomNode"))
+    if isinstance(node_path.node(), GeomNode):
+        geom_nodes.insert(0, node_path)
+
+    triangles = 0
+    for geom_node_path in geom_nodes:
+        for geom in geom_node_path.node().getGeoms():
+            for index in range(geom.getNumPrimitives()):
+                primitive = geom.getPrimitive(index)
+                if primitive.getPrimitiveType() == Geom.PT_polygons:
+                    triangles += primitive.getNumFaces()
+    return triangles
+
+
+def cluster_vertices(positions, triangles, resolution):
+    """
+    Vertex clustering: snaps every vertex to the first vertex of its cell in a
+    ``resolution``-cubed grid over the mesh bounds, then drops the triangles
+    that collapsed. Returns the remaining (triangles, 3) index array.
+    """
+    used = np.unique(triangles)
+    low = positions[used].min(axis=0)
+    extent = np.maximum(positions[used].max(axis=0) - low, 1e-9)
+
+    cells = np.floor((positions[used] - low) / extent * resolution).astype(np.int64)
+    cells = np.minimum(cells, resolution - 1)
+    keys = cells[:, 0] + resolution * (cells[:, 1] + resolution * cells[:, 2])
+    _keys, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+
+    remap = np.arange(len(positions), dtype=np.int64)
+    remap[used] = used[first][inverse.reshape(-1)]
+    clustered = remap[triangles]
+
+    keep = (
+        (clustered[:, 0] != clustered[:, 1])
+        & (clustered[:, 1] != clustered[:, 2])
+        & (clustered[:, 0] != clustered[:, 2])
+    )
+    clustered = clustered[keep]
+    # Triangles that collapsed onto the same three vertices are drawn once.
+    _unique, first_triangles = np.unique(
+        np.sort(clustered, axis=1), axis=0, return_index=True
+    )
+    return clustered[np.sort(first_triangles)]
+
+
+def simplify_triangles(positions, triangles, target_ratio, max_resolution=1024):
+    """
+    Picks the finest clustering grid that keeps at most ``target_ratio`` of
+    the triangles, by bisection on the grid resolution.
+    """
+    target = max(1, int(len(triangles) * target_ratio))
+    low, high = 1, max_resolution
+    best = cluster_vertices(positions, triangles, low)
+    while low < high:
+        resolution = (low + high + 1) // 2
+        clustered = cluster_vertices(positions, triangles, resolution)
+        if len(clustered) <= target:
+            best, low = clustered, resolution
+        else:
+            high = resolution - 1
+    return best
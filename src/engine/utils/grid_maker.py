@@ -1,9 +1,116 @@
 """
 Adapted from Mathew Lloyd/'Forklift's 'Procedural Coordinate Grid' example
 https://discourse.panda3d.org/t/procedurally-generated-three-plane-coordinate-grid/4415
+
+The shader grid draws the same lines without geometry: a quad covering the
+view is intersected per pixel with the ground plane, and the lines are
+computed from the intersection. Its cost depends on the window size only.
 """
 
-from panda3d.core import LineSegs, NodePath, PandaNode, VBase4
+import math
+
+from panda3d.core import (
+    CardMaker,
+    LineSegs,
+    NodePath,
+    OmniBoundingVolume,
+    PandaNode,
+    Shader,
+    TransparencyAttrib,
+    VBase4,
+    Vec2,
+    Vec3,
+)
+
+SHADER_GRID_VERTEX_SHADER = """
+#version 140
+
+uniform mat4 p3d_ViewProjectionMatrixInverse;
+
+in vec4 p3d_Vertex;
+
+out vec3 near_point;
+out vec3 far_point;
+
+vec3 unproject(vec2 position, float depth) {
+    vec4 point = p3d_ViewProjectionMatrixInverse * vec4(position, depth, 1.0);
+    return point.xyz / point.w;
+}
+
+void main() {
+    // The card lies in the XZ plane, spread over the whole view.
+    vec2 position = p3d_Vertex.xz;
+    near_point = unproject(position, -1.0);
+    far_point = unproject(position, 1.0);
+    gl_Position = vec4(position, 0.0, 1.0);
+}
+"""
+
+SHADER_GRID_FRAGMENT_SHADER = """
+#version 140
+
+uniform mat4 p3d_ViewProjectionMatrix;
+uniform mat4 p3d_ViewMatrixInverse;
+uniform vec4 x_axis_color;
+uniform vec4 y_axis_color;
+uniform vec4 grid_color;
+uniform vec4 subdivision_color;
+// Line widths in pixels: axes, grid, subdivisions.
+uniform vec3 line_widths;
+// Grid step and subdivision step.
+uniform vec2 steps;
+// Lines fade out at this many camera heights away, but no closer than the
+// minimum distance.
+uniform vec2 fade;
+
+in vec3 near_point;
+in vec3 far_point;
+
+out vec4 fragment_color;
+
+// Coverage of the nearest line of a grid of unit cells in ``coord``.
+float grid_coverage(vec2 coord, float width) {
+    vec2 derivative = fwidth(coord);
+    vec2 distance = abs(fract(coord - 0.5) - 0.5) / derivative;
+    float coverage = clamp(width * 0.5 + 0.5 - min(distance.x, distance.y), 0.0, 1.0);
+    // Cells a few pixels wide would blend into a flat color, fade them out.
+    return coverage * (1.0 - smoothstep(0.15, 0.4, max(derivative.x, derivative.y)));
+}
+
+float axis_coverage(float coord, float width) {
+    return clamp(width * 0.5 + 0.5 - abs(coord) / fwidth(coord), 0.0, 1.0);
+}
+
+vec4 blend(vec4 below, vec4 color, float coverage) {
+    float alpha = color.a * coverage;
+    return vec4(mix(below.rgb, color.rgb, alpha), alpha + below.a * (1.0 - alpha));
+}
+
+void main() {
+    float t = -near_point.z / (far_point.z - near_point.z);
+    if (t <= 0.0) {
+        discard;
+    }
+    vec3 position = near_point + t * (far_point - near_point);
+    vec4 clip_position = p3d_ViewProjectionMatrix * vec4(position, 1.0);
+    gl_FragDepth = clip_position.z / clip_position.w * 0.5 + 0.5;
+
+    vec2 coord = position.xy;
+    vec4 color = vec4(subdivision_color.rgb, 0.0);
+    color = blend(color, subdivision_color, grid_coverage(coord / steps.y, line_widths.z));
+    color = blend(color, grid_color, grid_coverage(coord / steps.x, line_widths.y));
+    color = blend(color, x_axis_color, axis_coverage(coord.y, line_widths.x));
+    color = blend(color, y_axis_color, axis_coverage(coord.x, line_widths.x));
+
+    vec3 camera_position = p3d_ViewMatrixInverse[3].xyz;
+    float fade_distance = max(abs(camera_position.z) * fade.x, fade.y);
+    color.a *= 1.0 - smoothstep(0.5, 1.0, distance(coord, camera_position.xy) / fade_distance);
+    if (color.a < 0.004) {
+        discard;
+    }
+    fragment_color = color;
+}
+"""
 
 
 class SceneGridMaker:
@@ -36,6 +143,10 @@ class SceneGridMaker:
         self.grid_thickness = 0.5
         self.subdivision_thickness = 1
 
+        # Shader grid only: lines fade out at this many camera heights away.
+        self.fade_heights = 40
+        self.min_fade_distance = 20
+
     def create_grid(self):
         self.axis_lines.setThickness(self.axis_thickness)
         self.grid_lines.setThickness(self.grid_thickness)
@@ -47,6 +158,51 @@ class SceneGridMaker:
 
         return self._create_node_path()
 
+    def create_shader_grid(self):
+        """
+        The grid as a single quad with the lines computed in a fragment
+        shader, effectively infinite. Needs GLSL 1.40 support.
+        """
+        card_maker = CardMaker("grid_quad")
+        card_maker.setFrame(-1, 1, -1, 1)
+        grid_node_path = NodePath(PandaNode("grid"))
+        grid_node_path.attachNewNode(card_maker.generate())
+
+        grid_node_path.setShader(
+            Shader.make(
+                Shader.SL_GLSL,
+                SHADER_GRID_VERTEX_SHADER,
+                SHADER_GRID_FRAGMENT_SHADER,
+            )
+        )
+        # Lines left out are drawn fully transparent, like the grid without
+        # them, any step will do.
+        hidden = VBase4(0, 0, 0, 0)
+        grid_step = self.grid_step or 1
+        grid_node_path.setShaderInputs(
+            x_axis_color=self.x_axis_color if self.x_size else hidden,
+            y_axis_color=self.y_axis_color if self.y_size else hidden,
+            grid_color=self.grid_color if self.grid_step else hidden,
+            subdivision_color=(
+                self.subdivision_color
+                if self.grid_step and self.subdivisions
+                else hidden
+            ),
+            line_widths=Vec3(
+                self.axis_thickness, self.grid_thickness, self.subdivision_thickness
+            ),
+            steps=Vec2(grid_step, grid_step / (self.subdivisions or 1)),
+            fade=Vec2(self.fade_heights, self.min_fade_distance),
+        )
+        # The quad is placed in the vertex shader, it must never be culled.
+        grid_node_path.node().setBounds(OmniBoundingVolume())
+        grid_node_path.node().setFinal(True)
+        grid_node_path.setTwoSided(True)
+        grid_node_path.setTransparency(TransparencyAttrib.MAlpha)
+        grid_node_path.setDepthWrite(False)
+
+        return grid_node_path
+
     def _draw_axes(self):
         # Draw X axis line
         if self.x_size != 0:
@@ -136,7 +292,8 @@ class SceneGridMaker:
         return grid_node_path
 
     def _frange(self, start, stop, step):
-        current = start
-        while current <= stop:
-            yield current
-            current += step
+        # Multiplied rather than accumulated, so rounding errors don't add up
+        # and drop the last line.
+        count = math.floor((stop - start) / step + 1e-9)
+        for index in range(count + 1):
+            yield start + index * step
@@ -0,0 +1,139 @@
+import hashlib
+import math
+
+from panda3d.core import GeomNode, NodePath, RigidBodyCombiner
+
+# Objects tagged with this key (or containing a tagged node) keep their own
+# transforms after optimization, they are batched by a RigidBodyCombiner.
+DYNAMIC_TAG = "dynamic"
+
+
+def analyze_scene(root):
+    """
+    Counts nodes, GeomNodes, Geoms, unique render states, textures and the
+    draw calls the scene issues. Each Geom is one draw call; under a
+    RigidBodyCombiner the draw calls come from its combined internal scene.
+    """
+    stats = {"nodes": 0, "geom_nodes": 0, "geoms": 0, "draw_calls": 0}
+    states = set()
+    _analyze_node(root, stats, states, combined=False)
+    stats["render_states"] = len(states)
+    stats["textures"] = root.findAllTextures().getNumTextures()
+    return stats
+
+
+def _analyze_node(node_path, stats, states, combined):
+    node = node_path.node()
+    stats["nodes"] += 1
+    if isinstance(node, RigidBodyCombiner):
+        combined = True
+        for geom_node_path in node.getInternalScene().findAllMatches("**/+GeomNode"):
+            stats["draw_calls"] += geom_node_path.node().getNumGeoms()
+
+    if isinstance(node, GeomNode):
+        stats["geom_nodes"] += 1
+        stats["geoms"] += node.getNumGeoms()
+        if not combined:
+            stats["draw_calls"] += node.getNumGeoms()
+        net_state = node_path.getNetState()
+        for index in range(node.getNumGeoms()):
+            states.add(net_state.compose(node.getGeomState(index)))
+
+    for child in node_path.getChildren():
+        _analyze_node(child, stats, states, combined)
+
+
+def _texture_key(texture):
+    """Equal textures share a key: by source file, or by content if generated."""
+    layout = (
+        texture.getXSize(),
+        texture.getYSize(),
+        texture.getZSize(),
+        texture.getFormat(),
+        texture.getComponentType(),
+        texture.getDefaultSampler(),
+    )
+    if not texture.getFullpath().empty():
+        return (
+            texture.getFullpath().getFullpath(),
+            texture.getAlphaFullpath().getFullpath(),
+        ) + layout
+    if texture.hasRamImage():
+        return (hashlib.sha1(texture.getRamImage().getData()).hexdigest(),) + layout
+    return (texture.getName(), id(texture)) + layout
+
+
+def deduplicate_textures(root, unique_textures=None):
+    """
+    Points every use of equal textures at one of them. Returns the count
+    replaced. Passing the same ``unique_textures`` dict shares them across roots.
+    """
+    if unique_textures is None:
+        unique_textures = {}
+    replaced = 0
+    for texture in root.findAllTextures():
+        unique_texture = unique_textures.setdefault(_texture_key(texture), texture)
+        if unique_texture != texture:
+            root.replaceTexture(texture, unique_texture)
+            replaced += 1
+    return replaced
+
+
+def _is_dynamic(node_path):
+    return (
+        node_path.hasTag(DYNAMIC_TAG)
+        or not node_path.find(f"**/={DYNAMIC_TAG}").isEmpty()
+    )
+
+
+def _cell_key(scene_object, cell_size):
+    """The grid cell holding the center of an object's bounds, None if unbounded."""
+    bounds = scene_object.getBounds()
+    if bounds.isEmpty() or bounds.isInfinite():
+        return None
+    return tuple(math.floor(value / cell_size) for value in bounds.getApproxCenter())
+
+
+def build_optimized_scene(objects, parent, cell_size=None):
+    """
+    Builds an optimized copy of ``objects`` under ``parent``, leaving the
+    originals untouched. Static objects are merged into as few Geoms as their
+    states allow with ``flattenStrong``; dynamic ones keep their nodes under a
+    RigidBodyCombiner, which batches them while they move.
+
+    With a ``cell_size``, static objects are only merged with those whose
+    centers share a cell of a uniform grid, each cell becoming a child of
+    ``parent``, so state set per object, such as lights, stays local.
+    """
+    static_groups = {}
+    dynamic_objects = NodePath(RigidBodyCombiner("dynamic_objects"))
+    for scene_object in objects:
+        if _is_dynamic(scene_object):
+            scene_object.copyTo(dynamic_objects)
+            continue
+        key = _cell_key(scene_object, cell_size) if cell_size else None
+        group = static_groups.get(key)
+        if group is None:
+            name = (
+                "static_objects"
+                if key is None
+                else f"static_objects_{len(static_groups)}"
+            )
+            group = static_groups[key] = parent.attachNewNode(name)
+        scene_object.copyTo(group)
+
+    # Once equal textures are shared, equal render states are the same object
+    # and flattening can collect the Geoms that use them.
+    unique_textures = {}
+    for static_objects in static_groups.values():
+        deduplicate_textures(static_objects, unique_textures)
+    deduplicate_textures(dynamic_objects, unique_textures)
+
+    for static_objects in static_groups.values():
+        static_objects.clearModelNodes()
+        static_objects.flattenStrong()
+
+    if dynamic_objects.getNumChildren() > 0:
+        dynamic_objects.reparentTo(parent)
+        dynamic_objects.node().collect()
+    return list(static_groups.values()) + [dynamic_objects]
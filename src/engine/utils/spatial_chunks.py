@@ -0,0 +1,84 @@
+"""
+Splitting models into spatial chunks for streaming.
+
+The triangles of a model are binned by centroid into a uniform grid over its
+bounds. Every occupied cell becomes a self-contained node with only the
+vertices its triangles use, keeping the render state of each Geom.
+"""
+
+import numpy as np
+from panda3d.core import Geom, GeomNode, NodePath
+
+from .geom_arrays import (
+    make_triangles,
+    subset_vertex_data,
+    triangle_indices,
+    vertex_positions,
+)
+
+# Cells along the longest axis of the model.
+DEFAULT_CHUNK_DIVISIONS = 8
+
+
+def split_model(model, divisions=DEFAULT_CHUNK_DIVISIONS):
+    """
+    Returns ``(chunks, cell_size)``, where chunks is a list of
+    ``(node_path, low, high)`` with the bounds of each chunk in model space.
+    Primitives other than polygons are dropped.
+    """
+    flat = NodePath("flat")
+    model.copyTo(flat)
+    flat.clearModelNodes()
+    flat.flattenStrong()
+
+    bounds = flat.getTightBounds()
+    if bounds is None:
+        return [], 0.0
+    low, high = (np.array(point, dtype=np.float64) for point in bounds)
+    cell_size = max(float((high - low).max()) / divisions, 1e-6)
+    cells_per_axis = np.maximum(np.ceil((high - low) / cell_size), 1).astype(np.int64)
+
+    cells = {}
+    for geom_node_path in flat.findAllMatches("**/+GeomNode"):
+        geom_node = geom_node_path.node()
+        # Whatever flattening could not bake in, such as a billboard.
+        matrix = np.array(geom_node_path.getMat(flat), dtype=np.float64)
+        net_state = geom_node_path.getNetState()
+
+        for index, geom in enumerate(geom_node.getGeoms()):
+            triangles = triangle_indices(geom)
+            if not len(triangles):
+                continue
+            vertex_data = geom.getVertexData()
+            positions = vertex_positions(vertex_data).astype(np.float64)
+            positions = positions @ matrix[:3, :3] + matrix[3, :3]
+
+            centroids = positions[triangles].mean(axis=1)
+            coordinates = np.clip(
+                ((centroids - low) / cell_size).astype(np.int64), 0, cells_per_axis - 1
+            )
+            keys = coordinates[:, 0] + cells_per_axis[0] * (
+                coordinates[:, 1] + cells_per_axis[1] * coordinates[:, 2]
+            )
+            geom_state = net_state.compose(geom_node.getGeomState(index))
+            for key in np.unique(keys):
+                cell_triangles = triangles[keys == key]
+                rows, remapped = np.unique(cell_triangles, return_inverse=True)
+                cell_geom = Geom(subset_vertex_data(vertex_data, rows))
+                cell_geom.addPrimitive(make_triangles(remapped.reshape(-1, 3)))
+
+                cell = cells.setdefault(int(key), {})
+                cell_node = cell.get(geom_node_path)
+                if cell_node is None:
+                    cell_node = cell[geom_node_path] = GeomNode(geom_node.getName())
+                    cell_node.setTransform(geom_node_path.getTransform(flat))
+                cell_node.addGeom(cell_geom, geom_state)
+
+    chunks = []
+    for key, cell in sorted(cells.items()):
+        chunk = NodePath(f"chunk_{key}")
+        for cell_node in cell.values():
+            chunk.attachNewNode(cell_node)
+        chunk_low, chunk_high = chunk.getTightBounds()
+        chunks.append((chunk, np.array(chunk_low), np.array(chunk_high)))
+    return chunks, cell_size
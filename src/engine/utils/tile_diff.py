@@ -0,0 +1,54 @@
+import numpy as np
+
+DEFAULT_TILE_SIZE = 64
+
+
+def compute_dirty_tiles(current, previous, width, height, tile_size=DEFAULT_TILE_SIZE):
+    """
+    Compares two frames of 32-bit pixels tile by tile.
+
+    Returns the changed tiles as (x, y, width, height) rectangles in image
+    coordinates, with horizontally adjacent tiles merged into one rectangle.
+    Without a previous frame of the same size the whole frame is dirty.
+    """
+    if previous is None or len(previous) != len(current):
+        return [(0, 0, width, height)]
+
+    current_pixels = np.frombuffer(current, dtype=np.uint32).reshape(height, width)
+    previous_pixels = np.frombuffer(previous, dtype=np.uint32).reshape(height, width)
+    changed = current_pixels != previous_pixels
+
+    # Collapse pixel rows into tile rows through a reshaped view, with the
+    # partial tile row at the bottom reduced on its own.
+    full_rows = height - height % tile_size
+    dirty = [changed[:full_rows].reshape(-1, tile_size, width).any(axis=1)]
+    if full_rows < height:
+        dirty.append(changed[full_rows:].any(axis=0, keepdims=True))
+    dirty = np.concatenate(dirty)
+
+    # The tile-row grid is small, reduceat handles the partial right column.
+    dirty = np.logical_or.reduceat(dirty, np.arange(0, width, tile_size), axis=1)
+
+    return _merge_tile_runs(dirty, width, height, tile_size)
+
+
+def _merge_tile_runs(dirty, width, height, tile_size):
+    """Turns a grid of dirty tiles into rectangles, one per horizontal run."""
+    rects = []
+    padded = np.zeros((dirty.shape[0], dirty.shape[1] + 2), dtype=np.int8)
+    padded[:, 1:-1] = dirty
+    edges = np.diff(padded, axis=1)
+
+    for tile_row, tile_column in zip(*np.nonzero(edges == 1)):
+        run_end = tile_column + np.argmax(edges[tile_row, tile_column:] == -1)
+        x = int(tile_column) * tile_size
+        y = int(tile_row) * tile_size
+        rects.append(
+            (
+                x,
+                y,
+                min(int(run_end) * tile_size, width) - x,
+                min(y + tile_size, height) - y,
+            )
+        )
+    return rects
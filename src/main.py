@@ -6,6 +6,9 @@ import sys
 from PySide6.QtGui import QIcon
 from PySide6.QtWidgets import QApplication
 
+from engine.core.control_server import DEFAULT_SERVER_NAME, ControlServer
+from engine.core.engine_base import THREADING_MODELS
+from engine.core.scene_snapshot import DEFAULT_SNAPSHOT_PATH
 from ui.main_window import MainWindow
 
 logger = logging.getLogger(__name__)
@@ -26,9 +29,17 @@ def _get_fps_cap(screen):
         return 45
 
 
-def _create_main_window(fps_cap, enable_hd_renderer):
+def _create_main_window(
+    fps_cap, enable_hd_renderer, out_of_process, threading_model, snapshot_path
+):
     """Creates and configures the main window."""
-    window = MainWindow(fps_cap, enable_hd_renderer=enable_hd_renderer)
+    window = MainWindow(
+        fps_cap,
+        enable_hd_renderer=enable_hd_renderer,
+        out_of_process=out_of_process,
+        threading_model=threading_model,
+        snapshot_path=snapshot_path,
+    )
 
     app_icon = QIcon(os.path.join(os.path.dirname(__file__), "resources", "icon.png"))
     window.setWindowIcon(app_icon)
@@ -52,6 +63,31 @@ def _main():
         action="store_true",
         help="Enable experimental HD renderer",
     )
+    parser.add_argument(
+        "--out-of-process",
+        action="store_true",
+        help="Run the renderer in a separate process",
+    )
+    parser.add_argument(
+        "--threading-model",
+        choices=list(THREADING_MODELS),
+        default="single",
+        help="Run the Cull and Draw stages on their own threads",
+    )
+    parser.add_argument(
+        "--control-socket",
+        nargs="?",
+        const=DEFAULT_SERVER_NAME,
+        metavar="NAME",
+        help="Accept JSON-RPC commands on a local socket",
+    )
+    parser.add_argument(
+        "--snapshot",
+        nargs="?",
+        const=DEFAULT_SNAPSHOT_PATH,
+        metavar="PATH",
+        help="Restore the scene from a snapshot at startup and save it on exit",
+    )
     args = parser.parse_args()
 
     _setup_logging()
@@ -60,13 +96,32 @@ def _main():
     screen = app.primaryScreen()
     fps_cap = _get_fps_cap(screen)
 
-    window = _create_main_window(fps_cap, enable_hd_renderer=args.hd_renderer)
+    window = _create_main_window(
+        fps_cap,
+        enable_hd_renderer=args.hd_renderer,
+        out_of_process=args.out_of_process,
+        threading_model=args.threading_model,
+        snapshot_path=args.snapshot,
+    )
     window.show()
 
-    # Start engine after creating main window
+    control_server = None
+    if args.control_socket:
+        if args.out_of_process:
+            logger.warning("The control socket is not available out of process.")
+        else:
+            control_server = ControlServer(
+                window.viewport_widget.engine, args.control_socket
+            )
+
+    # Start engine after creating main window, an out-of-process
+    # renderer drives its own loop and returns immediately.
     window.viewport_widget.engine.run()
 
-    sys.exit(app.exec())
+    exit_code = app.exec()
+    if control_server is not None:
+        control_server.close()
+    sys.exit(exit_code)
 
 
 if __name__ == "__main__":
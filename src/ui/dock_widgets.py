@@ -5,6 +5,7 @@ from PySide6.QtWidgets import QDockWidget
 
 from .panels.camera_tool import CameraControlsWidget
 from .panels.export_tool import ImageExportWidget
+from .panels.model_library import ModelLibraryWidget
 
 logger = logging.getLogger(__name__)
 
@@ -13,6 +14,9 @@ def setup_docks(main_window):
     """Set up dock widgets for the main window."""
     _create_camera_tool_dock(main_window)
     _create_export_tool_dock(main_window)
+    # Thumbnails are rendered by the engine, which runs elsewhere out of process.
+    if not main_window.out_of_process:
+        _create_model_library_dock(main_window)
 
 
 def _create_camera_tool_dock(main_window):
@@ -41,3 +45,25 @@ def _create_export_tool_dock(main_window):
         Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea
     )
     main_window.addDockWidget(Qt.RightDockWidgetArea, main_window.export_tool_panel)
+
+
+def _create_model_library_dock(main_window):
+    main_window.model_library_panel = QDockWidget("Model Library", main_window)
+    main_window.model_library_panel.setFeatures(
+        QDockWidget.DockWidgetFloatable | QDockWidget.DockWidgetMovable
+    )
+    model_library = ModelLibraryWidget(
+        main_window.viewport_widget.engine, main_window.status_bar
+    )
+    model_library.model_activated.connect(
+        lambda model_path: main_window.load_models([model_path])
+    )
+    main_window.model_library_panel.setWidget(model_library)
+    main_window.model_library_panel.setAllowedAreas(
+        Qt.LeftDockWidgetArea | Qt.RightDockWidgetArea
+    )
+    main_window.addDockWidget(Qt.RightDockWidgetArea, main_window.model_library_panel)
+    main_window.tabifyDockWidget(
+        main_window.export_tool_panel, main_window.model_library_panel
+    )
+    main_window.export_tool_panel.raise_()
@@ -4,9 +4,16 @@ Main application window for the Panda3D + PySide6 application.
 
 import logging
 
-from PySide6.QtCore import Slot
+from panda3d.core import Filename
+from PySide6.QtCore import QTimer, Slot
 from PySide6.QtGui import QAction, QIcon
-from PySide6.QtWidgets import QApplication, QLabel, QMainWindow, QStatusBar
+from PySide6.QtWidgets import (
+    QApplication,
+    QFileDialog,
+    QLabel,
+    QMainWindow,
+    QStatusBar,
+)
 
 from engine.ui.engine_widget import EngineWidget
 
@@ -16,13 +23,23 @@ from .dock_widgets import setup_docks
 
 logger = logging.getLogger(__name__)
 
+STREAMING_LABEL_INTERVAL = 500
+MODEL_FILE_FILTER = "Models (*.bam *.egg *.egg.pz *.gltf *.glb *.obj)"
+
 
 class MainWindow(QMainWindow):
     """
     Main window class for the Panda3D + PySide6 application.
     """
 
-    def __init__(self, fps_cap, enable_hd_renderer=False):
+    def __init__(
+        self,
+        fps_cap,
+        enable_hd_renderer=False,
+        out_of_process=False,
+        threading_model="single",
+        snapshot_path=None,
+    ):
         """
         Initialize the main window.
         """
@@ -30,12 +47,17 @@ class MainWindow(QMainWindow):
 
         self.fps_cap = fps_cap
         self.enable_hd_renderer = enable_hd_renderer
+        self.out_of_process = out_of_process
+        self.threading_model = threading_model
+        self.snapshot_path = snapshot_path
         self._init_ui()
         self._setup_menu()
         setup_docks(self)
 
         self.viewport_widget.size_changed.connect(self._update_resolution_label)
         self.viewport_widget.engine.notifier.fps_updated.connect(self._update_fps_label)
+        if not self.out_of_process:
+            self._connect_scene_notifier()
 
     def _init_ui(self):
         """
@@ -49,6 +71,9 @@ class MainWindow(QMainWindow):
             self.fps_cap,
             status_bar=self.status_bar,
             enable_hd_renderer=self.enable_hd_renderer,
+            out_of_process=self.out_of_process,
+            threading_model=self.threading_model,
+            snapshot_path=self.snapshot_path,
         )
         self.setCentralWidget(self.viewport_widget)
 
@@ -57,6 +82,18 @@ class MainWindow(QMainWindow):
         Set up the menu bar actions.
         """
         self.menu_bar = self.menuBar()
+
+        file_menu = self.menu_bar.addMenu("&File")
+        open_models_action = QAction(
+            self, text="&Open Models...", icon=QIcon.fromTheme("document-open")
+        )
+        open_models_action.triggered.connect(self._open_models)
+        file_menu.addAction(open_models_action)
+
+        stream_model_action = QAction("&Stream Model...", self)
+        stream_model_action.triggered.connect(self._stream_model)
+        file_menu.addAction(stream_model_action)
+
         view_menu = self.menu_bar.addMenu("&View")
 
         self.toggle_lighting_indicator_action = QAction(
@@ -68,6 +105,10 @@ class MainWindow(QMainWindow):
             self.toggle_lighting_indicator_visibility
         )
 
+        self.optimize_scene_action = QAction("&Optimize Scene", self)
+        self.optimize_scene_action.setCheckable(True)
+        self.optimize_scene_action.triggered.connect(self.toggle_scene_optimization)
+
         self.toggle_camera_tool_panel_action = QAction("Show &Camera Tool", self)
         self.toggle_camera_tool_panel_action.setCheckable(True)
         self.toggle_camera_tool_panel_action.setChecked(True)
@@ -83,6 +124,7 @@ class MainWindow(QMainWindow):
         )
 
         view_menu.addAction(self.toggle_lighting_indicator_action)
+        view_menu.addAction(self.optimize_scene_action)
         view_menu.addSeparator()
         view_menu.addAction(self.toggle_camera_tool_panel_action)
         view_menu.addAction(self.toggle_export_tool_panel_action)
@@ -110,6 +152,120 @@ class MainWindow(QMainWindow):
         self.status_bar.addPermanentWidget(self.fps_label)
         self.status_bar.addPermanentWidget(self.resolution_label)
 
+        # Only shown once a model is streamed.
+        self.streaming_label = QLabel()
+        self.streaming_label.setMargin(2)
+        self.streaming_label.hide()
+        self.status_bar.insertPermanentWidget(0, self.streaming_label)
+        self.streaming_timer = QTimer(self)
+        self.streaming_timer.setInterval(STREAMING_LABEL_INTERVAL)
+        self.streaming_timer.timeout.connect(self._update_streaming_label)
+
+    def _connect_scene_notifier(self):
+        """
+        Report asynchronous scene loads in the status bar.
+        """
+        notifier = self.viewport_widget.engine.scene_manager.notifier
+        notifier.load_progress.connect(self._show_load_progress)
+        notifier.load_finished.connect(
+            lambda model_paths: self.status_bar.showMessage(
+                f"Loaded {len(model_paths)} model(s)", 5000
+            )
+        )
+        notifier.load_failed.connect(
+            lambda model_path: self.status_bar.showMessage(
+                f"Could not load {model_path}", 5000
+            )
+        )
+        notifier.stream_ready.connect(self._show_streaming)
+        notifier.stream_failed.connect(
+            lambda model_path, error: self.status_bar.showMessage(
+                f"Could not stream {model_path}: {error}", 5000
+            )
+        )
+
+    @Slot(int, int)
+    def _show_load_progress(self, loaded, total):
+        """
+        Show how many models of the current load have arrived.
+        """
+        self.status_bar.showMessage(f"Loading models: {loaded} / {total}")
+
+    def _open_models(self):
+        """
+        Replace the scene with models picked by the user, loaded in the background.
+        """
+        file_paths, _filter = QFileDialog.getOpenFileNames(
+            self,
+            "Open Models",
+            filter=MODEL_FILE_FILTER,
+        )
+        if not file_paths:
+            return
+
+        model_paths = [
+            Filename.fromOsSpecific(file_path).getFullpath() for file_path in file_paths
+        ]
+        self.load_models(model_paths)
+
+    def load_models(self, model_paths):
+        """
+        Replace the scene's loaded models with these, loaded in the background.
+        The new scene starts out unoptimized.
+        """
+        self.optimize_scene_action.setChecked(False)
+        self.status_bar.showMessage(f"Loading models: 0 / {len(model_paths)}")
+        self.viewport_widget.engine.scene_manager.load_objects_async(model_paths)
+
+    def _stream_model(self):
+        """
+        Add a model picked by the user to the scene, streamed in chunks around
+        the camera. The first time, the model is split into chunk files, in
+        the background.
+        """
+        file_path, _filter = QFileDialog.getOpenFileName(
+            self, "Stream Model", filter=MODEL_FILE_FILTER
+        )
+        if not file_path:
+            return
+
+        model_path = Filename.fromOsSpecific(file_path).getFullpath()
+        self.status_bar.showMessage(f"Preparing {model_path} for streaming...")
+        self.viewport_widget.engine.scene_manager.stream_model_async(model_path)
+        if self.out_of_process:
+            # The scene signals stay in the render process.
+            self._show_streaming(model_path)
+
+    @Slot(str)
+    def _show_streaming(self, model_path):
+        """
+        Show the streaming residency label once a model streams.
+        """
+        self.status_bar.showMessage(f"Streaming {model_path}", 3000)
+        self.streaming_label.show()
+        self.streaming_timer.start()
+
+    @Slot()
+    def _update_streaming_label(self):
+        """
+        Update the streaming residency label in the status bar.
+        """
+        statistics = self.viewport_widget.engine.geometry_streamer.get_statistics()
+        if statistics is None:
+            return
+        if not statistics["assets"]:
+            self.streaming_timer.stop()
+            self.streaming_label.hide()
+            return
+
+        mebibyte = 1024 * 1024
+        self.streaming_label.setText(
+            f"Streaming: {statistics['resident_chunks']} / {statistics['chunks']} "
+            f"chunks, {statistics['queued']} queued, "
+            f"{statistics['memory_used'] / mebibyte:.0f} / "
+            f"{statistics['memory_budget'] / mebibyte:.0f} MiB"
+        )
+
     @Slot(float)
     def _update_fps_label(self, current_fps):
         """
@@ -148,6 +304,21 @@ class MainWindow(QMainWindow):
         else:
             self.viewport_widget.engine.lighting_system.disable_indicators()
 
+    def toggle_scene_optimization(self):
+        scene_manager = self.viewport_widget.engine.scene_manager
+        if not self.optimize_scene_action.isChecked():
+            scene_manager.restore_scene()
+            self.status_bar.showMessage("Original scene restored", 5000)
+            return
+
+        statistics = scene_manager.optimize_scene()
+        before, after = statistics["before"], statistics["after"]
+        self.status_bar.showMessage(
+            f"Scene optimized: {before['draw_calls']} -> {after['draw_calls']} "
+            f"draw calls, {before['nodes']} -> {after['nodes']} nodes",
+            5000,
+        )
+
     def _show_about_panda3d(self):
         """
         Create and show the AboutPanda3DDialog dialog.
@@ -164,9 +335,14 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """
-        Make sure the engine shuts down before closing.
+        Make sure the engine shuts down before closing, saving the scene
+        snapshot first if the scene was restored from one.
         """
         if self.viewport_widget:
+            if self.snapshot_path:
+                self.viewport_widget.engine.scene_manager.save_snapshot(
+                    self.snapshot_path
+                )
             self.viewport_widget.close()
 
         super().closeEvent(event)
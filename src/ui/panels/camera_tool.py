@@ -80,6 +80,13 @@ class CameraControlsWidget(QWidget):
             reset_function=self.reset_rotation_speed,
         )
 
+        self.lod_bias_widget = self._create_slider_with_reset(
+            label="LOD Bias",
+            range=(10, 400),
+            default_value=100,
+            reset_function=self.reset_lod_bias,
+        )
+
         self.lighting_checkbox = QCheckBox()
         self.lighting_checkbox.setCheckable(True)
         self.lighting_checkbox.setChecked(True)
@@ -118,6 +125,7 @@ class CameraControlsWidget(QWidget):
         properties_layout = QFormLayout()
         properties_layout.addRow("FOV: ", self.fov_widget)
         properties_layout.addRow("Rotation Speed: ", self.rotation_speed_widget)
+        properties_layout.addRow("LOD Bias (%): ", self.lod_bias_widget)
         properties_layout.addRow("Free Cam: ", self.freecam_checkbox)
         properties_layout.addRow("3-Point Lighting: ", self.lighting_checkbox)
         properties_group.setLayout(properties_layout)
@@ -172,10 +180,7 @@ class CameraControlsWidget(QWidget):
         if self.status_bar:
             pos = self.camera_controller.get_position()
             x, y, z = map(int, [pos.x, pos.y, pos.z])
-            if self.camera_controller.mode == self.camera_mode.ORBIT:
-                orientation = self.camera_controller.gimbal.getHpr()
-            else:
-                orientation = self.camera_controller.camera.getHpr()
+            orientation = self.camera_controller.get_orientation()
             h, p, r = map(int, orientation)
             self.status_bar.showMessage(
                 f"X={x}, Y={y}, Z={z} | H={h}, P={p}, R={r}", 500
@@ -205,6 +210,8 @@ class CameraControlsWidget(QWidget):
             self._update_status_bar()
         elif label == "Rotation Speed":
             self._update_rotation_speed(value)
+        elif label == "LOD Bias":
+            self.engine.lod_manager.set_lod_bias(value / 100)
 
     def _update_rotation_speed(self, value):
         self.engine.camera_controller.update_rotation_speed(value)
@@ -267,3 +274,7 @@ class CameraControlsWidget(QWidget):
     def reset_rotation_speed(self):
         self.engine.camera_controller.update_rotation_speed(0)
         self.rotation_speed_widget.findChild(QSlider).setValue(0)
+
+    def reset_lod_bias(self):
+        self.engine.lod_manager.set_lod_bias(1.0)
+        self.lod_bias_widget.findChild(QSlider).setValue(100)
@@ -85,6 +85,7 @@ class ImageExportWidget(QWidget):
         main_layout.addLayout(form_layout)
         main_layout.addWidget(self._create_browse_button())
         main_layout.addWidget(self._create_save_button())
+        main_layout.addWidget(self._create_record_button())
         main_layout.addStretch()
         return main_layout
 
@@ -139,6 +140,16 @@ class ImageExportWidget(QWidget):
         save_button.setFixedHeight(50)
         return save_button
 
+    def _create_record_button(self):
+        """Create a button for recording raw frames."""
+        self.record_button = QPushButton(
+            QIcon.fromTheme("media-record"), "Record Raw Frames"
+        )
+        self.record_button.setCheckable(True)
+        self.record_button.toggled.connect(self._toggle_recording)
+        self.record_button.setFixedHeight(50)
+        return self.record_button
+
     def _update_aliasing_level(self):
         """Update the anti-aliasing level based on user selection."""
         _current_value = self.anti_aliasing_input.currentText()
@@ -160,6 +171,30 @@ class ImageExportWidget(QWidget):
         filename = f"image-{timestamp}.{format_extension}"
         return os.path.join(folder_path, filename)
 
+    def _toggle_recording(self, checked):
+        """Start or stop recording raw frames into the export folder."""
+        engine = self.viewport_widget.engine
+        if not checked:
+            frame_count = engine.stop_recording()
+            self.status_bar.showMessage(
+                f"Recording stopped after {frame_count} frames", 5000
+            )
+            return
+
+        timestamp = datetime.now().strftime("%Y-%m-%d-%H-%M-%S")
+        recording_path = os.path.join(
+            self.save_path_input.text(), f"recording-{timestamp}.pqraw"
+        )
+        try:
+            engine.start_recording(recording_path)
+        except OSError as error:
+            logger.error("Failed to start recording: %s", error)
+            QMessageBox.critical(self, "Recording Error", str(error))
+            self.record_button.setChecked(False)
+            return
+
+        self.status_bar.showMessage(f"Recording raw frames to {recording_path}", 5000)
+
     def _export_image(self):
         """Validate inputs, resize the viewport, and request the image to be captured."""
         width, height, folder_path = self._get_user_inputs()
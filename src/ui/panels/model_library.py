@@ -0,0 +1,102 @@
+import os
+
+from panda3d.core import Filename
+from PySide6.QtCore import QSize, Qt, Signal
+from PySide6.QtGui import QIcon
+from PySide6.QtWidgets import (
+    QFileDialog,
+    QListWidget,
+    QListWidgetItem,
+    QPushButton,
+    QVBoxLayout,
+    QWidget,
+)
+
+from engine.core.thumbnail_service import THUMBNAIL_SIZE
+from engine.utils.asset_packs import MODEL_EXTENSIONS
+
+# Thumbnails are shown at half their size, sharp on high-DPI screens.
+ICON_SIZE = THUMBNAIL_SIZE // 2
+
+
+class ModelLibraryWidget(QWidget):
+    """
+    Browses a folder of models by their thumbnails, which arrive from the
+    engine's thumbnail service as they are rendered. Double-clicking a model
+    emits ``model_activated`` with its path; the main window then loads it in
+    place of the current scene.
+    """
+
+    model_activated = Signal(str)
+
+    def __init__(self, engine, status_bar=None):
+        super().__init__()
+        self.setWindowTitle("Model Library")
+        self.engine = engine
+        self.status_bar = status_bar
+        self._items = {}
+        self._init_ui()
+
+        notifier = self.engine.thumbnail_service.notifier
+        notifier.thumbnail_ready.connect(self._on_thumbnail_ready)
+        notifier.thumbnail_failed.connect(self._on_thumbnail_failed)
+
+    def _init_ui(self):
+        open_button = QPushButton("Open Folder...")
+        open_button.clicked.connect(self._choose_folder)
+
+        self.model_list = QListWidget()
+        self.model_list.setViewMode(QListWidget.IconMode)
+        self.model_list.setIconSize(QSize(ICON_SIZE, ICON_SIZE))
+        self.model_list.setResizeMode(QListWidget.Adjust)
+        self.model_list.setMovement(QListWidget.Static)
+        self.model_list.setWordWrap(True)
+        self.model_list.setUniformItemSizes(True)
+        self.model_list.itemDoubleClicked.connect(
+            lambda item: self.model_activated.emit(item.data(Qt.UserRole))
+        )
+
+        layout = QVBoxLayout()
+        layout.addWidget(open_button)
+        layout.addWidget(self.model_list)
+        self.setLayout(layout)
+
+    def _choose_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Open Model Folder")
+        if folder:
+            self.set_folder(folder)
+
+    def set_folder(self, folder):
+        """List the models in a folder and request their thumbnails."""
+        thumbnail_service = self.engine.thumbnail_service
+        thumbnail_service.cancel_all()
+        self.model_list.clear()
+        self._items.clear()
+
+        for name in sorted(os.listdir(folder)):
+            # The virtual file system reads "model.egg" from "model.egg.pz".
+            model_name = name[: -len(".pz")] if name.endswith(".pz") else name
+            if os.path.splitext(model_name)[1].lower() not in MODEL_EXTENSIONS:
+                continue
+            model_path = Filename.fromOsSpecific(
+                os.path.join(folder, model_name)
+            ).getFullpath()
+            item = QListWidgetItem(os.path.splitext(model_name)[0])
+            item.setData(Qt.UserRole, model_path)
+            item.setToolTip(model_path)
+            self.model_list.addItem(item)
+            self._items[model_path] = item
+            thumbnail_service.request_thumbnail(model_path)
+
+        if self.status_bar:
+            self.status_bar.showMessage(f"{len(self._items)} models in {folder}", 3000)
+
+    def _on_thumbnail_ready(self, model_path, image_path):
+        item = self._items.get(model_path)
+        if item is not None:
+            item.setIcon(QIcon(image_path))
+
+    def _on_thumbnail_failed(self, model_path):
+        item = self._items.get(model_path)
+        if item is not None:
+            item.setFlags(item.flags() & ~Qt.ItemIsEnabled)